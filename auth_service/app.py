@@ -3,12 +3,20 @@ from flask import Flask
 from flask_cors import CORS
 from flask_restx import Api
 
-from auth_service.config import FRONTEND_SERVER
+from auth_service.config import FRONTEND_SERVER, AUTH_CODE_STORE, LOGIN_LIMIT_STORE
+from auth_service.code_store import create_code_store
+from auth_service.rate_limit import create_login_throttle
+from common.db import init_app_db
 from .routes import auth_api_ns
 
 def create_app(session_factory=None):
     app = Flask(__name__)
-    app.config["SESSION_FACTORY"] = session_factory
+    # One pooled engine and request-scoped session registry per process
+    init_app_db(app, session_factory)
+    # Authorization codes, shared by the workers with the "sqlite" store
+    app.config["AUTH_CODE_STORE"] = create_code_store(AUTH_CODE_STORE, app.config["SESSION_FACTORY"])
+    # /authorize attempts per client IP and username, shared by the workers with the "sqlite" store
+    app.config["LOGIN_THROTTLE"] = create_login_throttle(LOGIN_LIMIT_STORE, app.config["SESSION_FACTORY"])
     # Enable CORS
     CORS(app,
          supports_credentials=True,  # allow sending cookies or Authorization header
@@ -4,7 +4,7 @@ from functools import wraps
 import jwt
 from flask import request, jsonify, g
 
-from .token_utils import verify_token
+from .token_utils import token_cache
 
 
 def require_auth(optional=False):
@@ -21,7 +21,7 @@ def require_auth(optional=False):
 
             token = auth_header.split(' ')[1]
             try:
-                payload = verify_token(token)
+                payload = token_cache.verify(token)
             except jwt.ExpiredSignatureError:
                 if optional:
                     g.user = None
@@ -0,0 +1,125 @@
+## auth_service/code_store.py
+"""
+Authorization code stores
+
+A code issued by /authorize is redeemed once by /token, within AUTH_CODE_TTL seconds.
+    - MemoryCodeStore: codes of this process, for a single worker
+    - SQLiteCodeStore: codes in the shared database, so /token can land on any worker
+pop() is single-use: the lookup and the delete are one atomic step, a code is never redeemed twice.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from common.models import AuthCode
+from .config import AUTH_CODE_TTL
+
+SWEEP_BATCH = 500  # expired codes deleted per put by the SQLite store
+
+
+class CodeStore(ABC):
+    """Interface of the authorization code stores"""
+
+    @abstractmethod
+    def put(self, code: str, username: str, ttl: float = AUTH_CODE_TTL) -> None:
+        """Store a code for a user, redeemable for ttl seconds"""
+
+    @abstractmethod
+    def pop(self, code: str):
+        """
+        Redeem a code
+        :return: the username of the code, None if the code is unknown, expired or already redeemed
+        """
+
+
+class MemoryCodeStore(CodeStore):
+    """
+    Codes of this process, expired lazily
+    Codes are queued by expiry so each put drops the expired ones from the front of the queue,
+    the store holds at most the codes issued in the last ttl seconds.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._codes = {}  # code -> (expires_at, username)
+        self._expiry = deque()  # (expires_at, code), by expires_at when the ttl is constant
+        self._lock = threading.Lock()
+
+    def put(self, code: str, username: str, ttl: float = AUTH_CODE_TTL) -> None:
+        now = self._clock()
+        with self._lock:
+            self._evict(now)
+            self._codes[code] = (now + ttl, username)
+            self._expiry.append((now + ttl, code))
+
+    def pop(self, code: str):
+        now = self._clock()
+        with self._lock:
+            self._evict(now)
+            entry = self._codes.pop(code, None)
+        if entry is None or entry[0] <= now:
+            return None
+        return entry[1]
+
+    def _evict(self, now: float) -> None:
+        # Redeemed codes leave their queue entry behind, it is dropped here once expired
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, code = self._expiry.popleft()
+            if code in self._codes and self._codes[code][0] <= now:
+                del self._codes[code]
+
+    def __len__(self):
+        return len(self._codes)
+
+
+class SQLiteCodeStore(CodeStore):
+    """
+    Codes in the auth_codes table, shared by every worker of the database
+    pop() is one DELETE ... RETURNING, so of concurrent redeems of a code only one gets its username.
+    """
+
+    def __init__(self, session_factory: sessionmaker):
+        self._session_factory = session_factory
+
+    @staticmethod
+    def _now() -> datetime:
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+
+    def put(self, code: str, username: str, ttl: float = AUTH_CODE_TTL) -> None:
+        now = self._now()
+        with self._session_factory() as session:
+            session.execute(insert(AuthCode).values(code=code, username=username,
+                                                    expires_at=now + timedelta(seconds=ttl)))
+            # Bounded sweep from the start of the expires_at index
+            expired = (select(AuthCode.code).where(AuthCode.expires_at <= now)
+                       .order_by(AuthCode.expires_at).limit(SWEEP_BATCH))
+            session.execute(delete(AuthCode).where(AuthCode.code.in_(expired)))
+            session.commit()
+
+    def pop(self, code: str):
+        with self._session_factory() as session:
+            username = session.execute(
+                delete(AuthCode)
+                .where(AuthCode.code == code, AuthCode.expires_at > self._now())
+                .returning(AuthCode.username)).scalar()
+            session.commit()
+        return username
+
+
+def create_code_store(kind: str, session_factory: sessionmaker) -> CodeStore:
+    """
+    Create the code store of AUTH_CODE_STORE
+    :param kind: "sqlite" or "memory"
+    :param session_factory: sessionmaker of the shared database, used by the SQLite store
+    :exception: ValueError: unknown store kind
+    """
+    if kind == "sqlite":
+        return SQLiteCodeStore(session_factory)
+    if kind == "memory":
+        return MemoryCodeStore()
+    raise ValueError(f"Unknown authorization code store: {kind}")
@@ -1,8 +1,20 @@
 ## common/config.py
+import os
 
 SECRET = 'supersecretjwtkey'  # private key used to sign/verify JWT using in Auth Server + Resource Server
 CLIENT_ID = 'client123'  # registered with Authenticate Server
 CLIENT_SECRET = 'secret456' # registered with Authenticate Server
 TOKEN_EXPIRE_MINUTES = 60000
+TOKEN_CACHE_MAX_ENTRIES = int(os.environ.get('TOKEN_CACHE_MAX_ENTRIES', 10000))  # verified tokens kept per worker
+AUTH_CODE_TTL = int(os.environ.get('AUTH_CODE_TTL', 60))  # seconds an authorization code can be redeemed
+# "sqlite": codes shared by all workers in the database, "memory": codes of this process only (single worker)
+AUTH_CODE_STORE = os.environ.get('AUTH_CODE_STORE', 'sqlite')
+# /authorize throttling: token buckets per username and per client IP, burst attempts then a refill per minute
+# "memory": buckets of this process, "sqlite": buckets shared by all workers in the database
+LOGIN_LIMIT_STORE = os.environ.get('LOGIN_LIMIT_STORE', 'memory')
+LOGIN_USER_BURST = int(os.environ.get('LOGIN_USER_BURST', 10))
+LOGIN_USER_PER_MINUTE = float(os.environ.get('LOGIN_USER_PER_MINUTE', 10))
+LOGIN_IP_BURST = int(os.environ.get('LOGIN_IP_BURST', 100))
+LOGIN_IP_PER_MINUTE = float(os.environ.get('LOGIN_IP_PER_MINUTE', 100))
 AUTH_SERVER = "http://localhost:5000"
 FRONTEND_SERVER = "http://localhost:3000"
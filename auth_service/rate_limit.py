@@ -0,0 +1,157 @@
+## auth_service/rate_limit.py
+"""
+Login throttling for /authorize
+
+Every attempt takes a token from the bucket of its username and the bucket of its client IP. A bucket holds up to
+burst tokens and refills at a steady rate, so a key gets a burst of attempts then a steady trickle.
+Attempts without a token are rejected with 429 and Retry-After, before any database or bcrypt work.
+    - MemoryTokenBuckets: buckets of this process, O(1) per attempt
+    - SQLiteTokenBuckets: buckets in the shared database, one atomic UPSERT per attempt, for multi-worker deployments
+A bucket refilled up to its burst holds no information: every SWEEP_INTERVAL seconds such idle buckets are evicted.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import sessionmaker
+
+from common.models import LoginBucket
+from .config import LOGIN_USER_BURST, LOGIN_USER_PER_MINUTE, LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE
+
+SWEEP_INTERVAL = 60  # seconds between evictions of idle buckets
+SWEEP_BATCH = 500  # idle buckets deleted per sweep by the SQLite store
+
+
+class TokenBuckets(ABC):
+    """
+    Interface of the bucket stores, one bucket per key, all with the same limit
+    :param burst: bucket capacity, a new bucket is full
+    :param per_second: refill rate
+    """
+
+    def __init__(self, burst: int, per_second: float):
+        self.burst = burst
+        self.per_second = per_second
+
+    @abstractmethod
+    def take(self, key: str) -> float:
+        """
+        Take a token from the bucket of a key
+        :return: 0 if a token was taken, else seconds until the next token
+        """
+
+
+class MemoryTokenBuckets(TokenBuckets):
+    """Buckets of this process, key -> (tokens, updated at)"""
+
+    def __init__(self, burst: int, per_second: float, clock=time.monotonic, sweep_interval: float = SWEEP_INTERVAL):
+        super().__init__(burst, per_second)
+        self._clock = clock
+        self._sweep_interval = sweep_interval
+        self._buckets = {}
+        self._next_sweep = clock() + sweep_interval
+        self._lock = threading.Lock()
+
+    def take(self, key: str) -> float:
+        now = self._clock()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._evict(now)
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.per_second)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / self.per_second
+            self._buckets[key] = (tokens - 1, now)
+            return 0.0
+
+    def _evict(self, now: float) -> None:
+        idle = [key for key, (tokens, updated) in self._buckets.items()
+                if tokens + (now - updated) * self.per_second >= self.burst]
+        for key in idle:
+            del self._buckets[key]
+        self._next_sweep = now + self._sweep_interval
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteTokenBuckets(TokenBuckets):
+    """
+    Buckets in the login_buckets table, shared by every worker of the database, keys prefixed by the limiter
+    The refill, the check and the take are one INSERT ... ON CONFLICT DO UPDATE ... WHERE, so concurrent attempts
+    on a key can not take more tokens than the bucket holds.
+    """
+
+    def __init__(self, session_factory: sessionmaker, prefix: str, burst: int, per_second: float,
+                 clock=time.time, sweep_interval: float = SWEEP_INTERVAL):
+        super().__init__(burst, per_second)
+        self._session_factory = session_factory
+        self._prefix = prefix
+        self._clock = clock
+        self._sweep_interval = sweep_interval
+        self._next_sweep = clock() + sweep_interval
+
+    def take(self, key: str) -> float:
+        now = self._clock()
+        key = self._prefix + key
+        table = LoginBucket.__table__
+        refilled = func.min(self.burst, table.c.tokens + (now - table.c.updated_at) * self.per_second)
+        upsert = (insert(table).values(key=key, tokens=self.burst - 1, updated_at=now)
+                  .on_conflict_do_update(index_elements=[table.c.key],
+                                         set_={"tokens": refilled - 1, "updated_at": now},
+                                         where=refilled >= 1)
+                  .returning(table.c.tokens))
+        with self._session_factory() as session:
+            if session.execute(upsert).first() is None:
+                tokens, updated = session.execute(
+                    select(table.c.tokens, table.c.updated_at).where(table.c.key == key)).one()
+                session.rollback()
+                return (1 - min(self.burst, tokens + (now - updated) * self.per_second)) / self.per_second
+            if now >= self._next_sweep:
+                self._next_sweep = now + self._sweep_interval
+                # Bounded sweep of this limiter's buckets idle long enough to be full again
+                idle = (select(table.c.key)
+                        .where(table.c.updated_at <= now - self.burst / self.per_second,
+                               table.c.key.startswith(self._prefix, autoescape=True))
+                        .order_by(table.c.updated_at).limit(SWEEP_BATCH))
+                session.execute(delete(table).where(table.c.key.in_(idle)))
+            session.commit()
+        return 0.0
+
+
+class LoginThrottle:
+    """Per-client-IP and per-username limits of /authorize attempts"""
+
+    def __init__(self, by_ip: TokenBuckets, by_user: TokenBuckets):
+        self._by_ip = by_ip
+        self._by_user = by_user
+
+    def check(self, username: str, ip: str) -> float:
+        """
+        Count an attempt
+        :return: 0 if the attempt is allowed, else seconds to wait before retrying
+        """
+        wait = self._by_ip.take(ip)
+        if wait:
+            return wait
+        return self._by_user.take(username)
+
+
+def create_login_throttle(kind: str, session_factory: sessionmaker) -> LoginThrottle:
+    """
+    Create the login throttle of LOGIN_LIMIT_STORE, with the LOGIN_IP_* and LOGIN_USER_* limits
+    :param kind: "memory" or "sqlite"
+    :param session_factory: sessionmaker of the shared database, used by the SQLite store
+    :exception: ValueError: unknown store kind
+    """
+    ip_limit = (LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE / 60)
+    user_limit = (LOGIN_USER_BURST, LOGIN_USER_PER_MINUTE / 60)
+    if kind == "memory":
+        return LoginThrottle(MemoryTokenBuckets(*ip_limit), MemoryTokenBuckets(*user_limit))
+    if kind == "sqlite":
+        return LoginThrottle(SQLiteTokenBuckets(session_factory, "ip:", *ip_limit),
+                             SQLiteTokenBuckets(session_factory, "user:", *user_limit))
+    raise ValueError(f"Unknown login limit store: {kind}")
@@ -1,17 +1,18 @@
 ## auth_service/routes.py
 
-from flask import request, jsonify, current_app, make_response
+from flask import request, jsonify, current_app
 from flask_restx import Namespace, Resource, fields
 
 from book_service.utils.utils import validate_field_types
 from .db import get_session
 from .token_utils import generate_token
 from .config import CLIENT_ID, CLIENT_SECRET, TOKEN_EXPIRE_MINUTES
+from common.auth import needs_rehash
+from common.exceptions import ServiceUnavailableError
 from common.models import User
+import math
 import secrets
 
-auth_codes = {}  # store temporary authorization codes
-
 auth_api_ns = Namespace('auth', path='/')
 
 authorize_model = auth_api_ns.model('AuthorizeRequest', {
@@ -45,6 +46,8 @@ class Authorize(Resource):
         - 200: Return an auth code
         - 400: Validation errors on required fields, fields types
         - 401: Unauthorized
+        - 429: Too many attempts for the username or client IP, retry after Retry-After seconds
+        - 503: Password hashing is saturated, retry later
         """
         # Validate required fields
         data = request.get_json(force=True)
@@ -68,14 +71,31 @@ class Authorize(Resource):
         if errors:
             return {"error": "; ".join(errors)}, 400
 
+        # Throttle before any database or bcrypt work
+        wait = current_app.config["LOGIN_THROTTLE"].check(username, request.remote_addr)
+        if wait:
+            return {'error': 'Too many login attempts, please retry later'}, 429, {'Retry-After': str(math.ceil(wait))}
+
         with get_session() as session:
             user = session.query(User).filter_by(username=username).first()
-            if not user or not user.verify_password(password):
+            try:
+                verified = user is not None and user.verify_password(password)
+            except ServiceUnavailableError as e:
+                return {'error': str(e)}, 503, {'Retry-After': '1'}
+            if not verified:
                 return {'error': 'Invalid username or password'}, 401
 
+            # Upgrade a hash made under an older cost policy while the password is at hand
+            if needs_rehash(user.password):
+                try:
+                    user.set_password(password)
+                    session.commit()
+                except ServiceUnavailableError:
+                    session.rollback()  # best effort, retried on a later login
+
             # Simulate creating auth code
             code = secrets.token_urlsafe(16)
-            auth_codes[code] = user.username
+            current_app.config["AUTH_CODE_STORE"].put(code, user.username)
 
             # Redirect with code (normally you'd use HTTP redirect, here we simulate JSON)
             return {
@@ -131,12 +151,11 @@ class Token(Resource):
         if client_id != CLIENT_ID or client_secret != CLIENT_SECRET:
             return {'error': 'Invalid client'}, 401
 
-        # Validate code
-        if code not in auth_codes:
+        # Validate code, removed once used
+        username = current_app.config["AUTH_CODE_STORE"].pop(code)
+        if username is None:
             return {'error': 'Invalid grant'}, 401
 
-        username = auth_codes.pop(code)  # remove once used
-
         # if not redirect_uri.startswith("http://localhost"):
         #     return jsonify({'error': 'invalid_redirect_uri'}), 400
 
@@ -1,10 +1,14 @@
-## auth_service/token_utils.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
 import jwt
 from datetime import datetime, timezone, timedelta
 
 from jwt import ExpiredSignatureError, InvalidTokenError, DecodeError
 
-from auth_service.config import SECRET, TOKEN_EXPIRE_MINUTES
+from auth_service.config import SECRET, TOKEN_EXPIRE_MINUTES, TOKEN_CACHE_MAX_ENTRIES
 from book_service.utils.handlers import validate_types
 
 
@@ -22,3 +26,63 @@ def verify_token(token: str):
     except (InvalidTokenError, DecodeError):
         raise InvalidTokenError("Invalid token")
     return payload
+
+
+class TokenCache:
+    """
+    Claims of verified tokens by SHA-256 digest of the token, least recently used evicted first
+
+    An entry expires at the exp claim of its token, a hit is exactly what verify_token would return.
+    Only valid tokens with an exp claim are cached, invalid and expired ones are verified every time.
+    """
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_MAX_ENTRIES, clock=time.time):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._entries = OrderedDict()  # token digest -> (exp, claims), least recently used first
+        self._lock = threading.Lock()
+
+    def verify(self, token: str) -> dict:
+        """
+        Return the claims of a token, from the cache or verify_token
+        :exception: ExpiredSignatureError, InvalidTokenError: raised by verify_token
+        """
+        key = hashlib.sha256(token.encode()).digest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self._clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry[1])
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+
+        payload = verify_token(token)
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            with self._lock:
+                self._entries[key] = (exp, dict(payload))
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return payload
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+token_cache = TokenCache()  # verified tokens of this worker
@@ -0,0 +1,76 @@
+## benchmarks/bench_auth_overhead.py
+"""
+Auth overhead per request of require_auth, with and without the verified-token cache
+
+Measures verify_token against TokenCache.verify, then a whole request to a @require_auth route,
+over a pool of active tokens picked at random (the cache holds all of them once warm).
+
+Usage:
+    python -m benchmarks.bench_auth_overhead [--tokens 2000] [--requests 20000]
+"""
+import argparse
+import random
+import time
+
+from flask import Flask, jsonify
+
+from auth_service import auth_middleware
+from auth_service.auth_middleware import require_auth
+from auth_service.token_utils import TokenCache, generate_token, verify_token
+
+
+def per_call_us(fn, tokens, calls):
+    started = time.perf_counter()
+    for token in tokens[:calls]:
+        fn(token)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def create_app():
+    app = Flask(__name__)
+
+    @app.route("/protected")
+    @require_auth()
+    def protected():
+        return jsonify({})
+
+    return app
+
+
+def per_request_us(client, tokens, calls):
+    headers = [{"Authorization": f"Bearer {token}"} for token in tokens[:calls]]
+    started = time.perf_counter()
+    for header in headers:
+        client.get("/protected", headers=header)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=2000, help="active tokens")
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    active = [generate_token({"user_id": i, "role": "user"}) for i in range(args.tokens)]
+    tokens = [rng.choice(active) for _ in range(args.requests)]
+
+    cache = TokenCache()
+    for token in active:
+        cache.verify(token)
+    print(f"{'':<22} {'uncached us':>12} {'cached us':>10}")
+    print(f"{'verify':<22} {per_call_us(verify_token, tokens, args.requests):>12.1f} "
+          f"{per_call_us(cache.verify, tokens, args.requests):>10.1f}")
+
+    client = create_app().test_client()
+    # A cache too small to hold a token is the uncached path plus its bookkeeping
+    auth_middleware.token_cache = TokenCache(max_entries=0)
+    uncached = per_request_us(client, tokens, args.requests)
+    auth_middleware.token_cache = cache
+    cached = per_request_us(client, tokens, args.requests)
+    print(f"{'request (test client)':<22} {uncached:>12.1f} {cached:>10.1f}")
+    print(f"cache: {cache.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+## benchmarks/bench_book_search.py
+"""
+Latency of GET /books/search queries (search_books) on a large synthetic catalog
+
+Usage:
+    python -m benchmarks.bench_book_search [--books 1000000] [--repeat 50] [--vocabulary 2000]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+from book_service.services.book_service import search_books
+from common.db import create_default_engine
+from common.migrations import init_schema
+
+WORDS = ["python", "data", "cloud", "design", "patterns", "learning", "systems", "network", "security", "guide",
+         "advanced", "practical", "modern", "history", "garden", "cooking", "travel", "music", "physics", "art"]
+PUBLISHERS = ["O'Reilly", "Manning", "Packt", "Penguin", "Springer", "Wiley", "Pearson", "No Starch"]
+QUERIES = ["python", "pyth des", "advanced cloud security", "manning", "b000123", "garden travel music"]
+
+
+def seed(engine, books, vocabulary):
+    rng = random.Random(42)
+    # Real catalogs have a long tail of title words: pad the query words with synthetic ones
+    words = WORDS + [f"word{i}" for i in range(max(vocabulary - len(WORDS), 0))]
+    rows = ((f"B{i:07d}", " ".join(rng.sample(words, 3)) + f" {i}", rng.choice(PUBLISHERS), 10, 10.0, 11.0)
+            for i in range(books))
+    raw = engine.raw_connection()
+    raw.executemany("INSERT INTO books (code, name, publisher, quantity, imported_price, sell_price) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", rows)
+    raw.commit()
+    raw.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--vocabulary", type=int, default=2000, help="distinct title words")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_default_engine(os.path.join(tmp, "bench.db"))
+        init_schema(engine)
+        started = time.perf_counter()
+        seed(engine, args.books, args.vocabulary)
+        print(f"Seeded {args.books} books in {time.perf_counter() - started:.1f}s")
+
+        Session = sessionmaker(bind=engine)
+        print(f"{'query':<26} {'p50 ms':>8} {'p95 ms':>8}")
+        with Session() as session:
+            for q in QUERIES:
+                timings = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    search_books(session, q, args.limit)
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                p95 = timings[int(len(timings) * 0.95) - 1]
+                print(f"{q:<26} {statistics.median(timings):>8.2f} {p95:>8.2f}")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
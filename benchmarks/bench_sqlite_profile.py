@@ -0,0 +1,100 @@
+## benchmarks/bench_sqlite_profile.py
+"""
+Concurrent read/write throughput of each SQLite pragma profile
+
+Readers list the catalog while writers run place_order-like transactions (stock decrement + order insert)
+against a fresh database file per profile.
+
+Usage:
+    python -m benchmarks.bench_sqlite_profile [--books 2000] [--readers 4] [--writers 2] [--seconds 5]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from book_service.models import Base, Book, Order, OrderItem
+from common.config import SQLITE_PRAGMA_PROFILES
+from common.db import create_default_engine
+from common.models import User
+
+
+def seed(Session, books):
+    with Session() as session:
+        session.add(User(username="bench", password="x", role="user"))
+        session.add_all(Book(code=f"B{i:07d}", name=f"Book {i}", publisher="Bench", quantity=10 ** 9,
+                             imported_price=10, sell_price=11) for i in range(books))
+        session.commit()
+
+
+def reader(Session, stop, counters):
+    while not stop.is_set():
+        try:
+            with Session() as session:
+                session.execute(text("SELECT * FROM books")).fetchall()
+            counters["reads"] += 1
+        except OperationalError:
+            counters["errors"] += 1
+
+
+def writer(Session, books, stop, counters):
+    book_id = 0
+    while not stop.is_set():
+        book_id = book_id % books + 1
+        try:
+            with Session() as session:
+                session.execute(text("UPDATE books SET quantity = quantity - 1 WHERE id = :id"), {"id": book_id})
+                order = Order(user_id=1, status="new")
+                session.add(order)
+                session.flush()
+                session.add(OrderItem(order_id=order.id, book_id=book_id, quantity=1, price_each=11))
+                session.commit()
+            counters["writes"] += 1
+        except OperationalError:
+            counters["errors"] += 1
+
+
+def run_profile(profile, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_default_engine(os.path.join(tmp, "bench.db"), pragma_profile=profile)
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+        seed(Session, args.books)
+
+        stop = threading.Event()
+        counters = {"reads": 0, "writes": 0, "errors": 0}
+        threads = [threading.Thread(target=reader, args=(Session, stop, counters)) for _ in range(args.readers)]
+        threads += [threading.Thread(target=writer, args=(Session, args.books, stop, counters))
+                    for _ in range(args.writers)]
+        for t in threads:
+            t.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        engine.dispose()
+
+    return {k: v / args.seconds for k, v in counters.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=2000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{'profile':<12} {'reads/s':>10} {'writes/s':>10} {'errors/s':>10}")
+    for profile in SQLITE_PRAGMA_PROFILES:
+        result = run_profile(profile, args)
+        print(f"{profile:<12} {result['reads']:>10.1f} {result['writes']:>10.1f} {result['errors']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,18 +4,23 @@ from flask_cors import CORS
 
 from auth_service.config import FRONTEND_SERVER
 from book_service.reset_route import reset_blueprint
-from common.config import DB_PATH
+from common.config import DB_PATH, LEGACY_BOOK_LIST, LEGACY_ORDER_LIST
+from common.db import init_app_db
 from .routes import books_bp
 from .auth_proxy import auth_proxy_bp
 
 def create_app(session_factory=None):
     # Initializes a Flask application
     app = Flask(__name__)
-    # Config for database factory to support testing
-    app.config["SESSION_FACTORY"] = session_factory
+    # One pooled engine and request-scoped session registry per process,
+    # session_factory overrides the default engine to support testing
+    init_app_db(app, session_factory)
     # Default config for database
     app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{DB_PATH}"
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Unpaginated GET /books for clients predating pagination
+    app.config["LEGACY_BOOK_LIST"] = LEGACY_BOOK_LIST
+    app.config["LEGACY_ORDER_LIST"] = LEGACY_ORDER_LIST
     # Enable CORS
     CORS(app,
          supports_credentials=True,  # allow sending cookies or Authorization header
@@ -1,29 +1,17 @@
 ## book_service/db.py
-from flask import current_app
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-
-from common.config import DB_PATH, DB_NAME
-from .models import Base
-
-
-def get_default_session_factory():
-    return sessionmaker(bind=get_default_engine())
+from common.config import DB_NAME
+from common.db import create_default_engine, get_session
+from common.migrations import init_schema
 
 
 def get_default_engine():
-    return create_engine(f"sqlite:///{DB_PATH}", echo=True)
-
-
-def get_session():
-    session_factory = current_app.config.get("SESSION_FACTORY")
-    return session_factory() if session_factory else get_default_session_factory()()
+    return create_default_engine()
 
 
 def init_db(engine):
-    # Init database once
-    Base.metadata.create_all(engine)
-    print(f"Database schema created in {DB_NAME}")
+    # Create tables, then bring an existing schema up to date
+    version = init_schema(engine)
+    print(f"Database schema created in {DB_NAME} (version {version})")
 
 
 if __name__ == '__main__':
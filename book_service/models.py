@@ -1,10 +1,17 @@
 ## book_service/models.py
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Index, Text, UniqueConstraint, \
+    bindparam, func, select
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import column_property, relationship
 from datetime import datetime, timezone
 from common.models import Base, User
 
+
+def utc_now() -> datetime:
+    """Current time as stored: naive UTC"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 # Base = declarative_base()
 # class User(Base):
 #     __tablename__ = 'users'
@@ -21,7 +28,14 @@ class Book(Base):
     publisher = Column(String)
     quantity = Column(Integer)
     imported_price = Column(Float)
-    sell_price = Column(Float)
+    sell_price = Column(Float, index=True)
+
+    __table_args__ = (
+        Index('ix_books_publisher_sell_price', 'publisher', 'sell_price'),
+        Index('ix_books_name', 'name'),
+        # Partial index of the in-stock books
+        Index('ix_books_in_stock', 'id', sqlite_where=quantity > 0),
+    )
 
     def to_dict(self):
         return {
@@ -30,6 +44,7 @@ class Book(Base):
             "name": self.name,
             "publisher": self.publisher,
             "quantity": self.quantity,
+            "available": self.available,
             "imported_price": self.imported_price,
             "sell_price": self.sell_price,
         }
@@ -40,37 +55,107 @@ class Order(Base):
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'))
     status = Column(String, default='new')
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    # Evaluated per insert, naive UTC
+    created_at = Column(DateTime, default=utc_now)
+
+    __table_args__ = (
+        # Order lists are sorted by (created_at, id); index entries end with the rowid (id)
+        # A user's orders by time, also serves lookups on user_id alone
+        Index('ix_orders_user_id_created_at', 'user_id', 'created_at'),
+        # Orders of a status by time, also serves lookups on status alone
+        Index('ix_orders_status_created_at', 'status', 'created_at'),
+        Index('ix_orders_created_at', 'created_at'),
+    )
 
     user = relationship("User")
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
 
-    def to_dict(self):
+    def to_dict(self, with_books=False):
         return {
             "id": self.id,
             "user_id": self.user_id,
             "status": self.status,
             "created_at": self.created_at.isoformat(),
-            "items": [item.to_dict() for item in self.items]
+            "items": [item.to_dict(with_book=with_books) for item in self.items]
         }
 
 
 class OrderItem(Base):
     __tablename__ = 'order_items'
     id = Column(Integer, primary_key=True)
-    order_id = Column(Integer, ForeignKey('orders.id'))
-    book_id = Column(Integer, ForeignKey('books.id'))
+    order_id = Column(Integer, ForeignKey('orders.id'), index=True)
+    book_id = Column(Integer, ForeignKey('books.id'), index=True)
     quantity = Column(Integer)
     price_each = Column(Float)
 
     order = relationship("Order", back_populates="items")
     book = relationship("Book")
 
-    def to_dict(self):
-        return {
+    def to_dict(self, with_book=False):
+        data = {
             "id": self.id,
             "order_id": self.order_id,
             "book_id": self.book_id,
             "quantity": self.quantity,
             "price_each": self.price_each
         }
+        if with_book:
+            data["book_code"] = self.book.code if self.book else None
+            data["book_name"] = self.book.name if self.book else None
+        return data
+
+
+class IdempotencyKey(Base):
+    """Response of a POST /orders made with an Idempotency-Key, replayed to retries until it expires"""
+    __tablename__ = 'idempotency_keys'
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    key = Column(String, nullable=False)
+    request_hash = Column(String, nullable=False)  # sha256 of the request body
+    order_id = Column(Integer, ForeignKey('orders.id'))
+    response_body = Column(Text)
+    response_hash = Column(String)  # sha256 of response_body
+    created_at = Column(DateTime, default=utc_now)
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        # Concurrent requests with the same key coalesce on it
+        UniqueConstraint('user_id', 'key', name='uq_idempotency_keys_user_id_key'),
+    )
+
+
+class Reservation(Base):
+    """Hold of a book quantity for a user until expires_at, counted out of the available stock while active"""
+    __tablename__ = 'reservations'
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    book_id = Column(Integer, ForeignKey('books.id'), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=utc_now)
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        # Active holds of a book: sum of the entries after now
+        Index('ix_reservations_book_id_expires_at', 'book_id', 'expires_at'),
+        # Sweep of the expired holds, oldest first
+        Index('ix_reservations_expires_at', 'expires_at'),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "book_id": self.book_id,
+            "quantity": self.quantity,
+            "created_at": self.created_at.isoformat(),
+            "expires_at": self.expires_at.isoformat()
+        }
+
+
+# Quantity not held by active reservations, what can be ordered or held now; loaded with the book by a correlated
+# subquery on ix_reservations_book_id_expires_at, "now" is bound each time a query runs
+Book.available = column_property(
+    Book.quantity - select(func.coalesce(func.sum(Reservation.quantity), 0))
+    .where(Reservation.book_id == Book.id,
+           Reservation.expires_at > bindparam("available_at", callable_=utc_now, type_=DateTime))
+    .scalar_subquery())
@@ -2,8 +2,9 @@
 """
 Provide APIs for loading test data
 """
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify
 from auth_service.db import get_session
+from book_service.services.book_service import invalidate_book_caches
 from common.config import RUNNING_ENV, ENV, TEST_SECRET_KEY
 from test_utils.data_loader import clean_data, initialize_data
 from werkzeug.utils import secure_filename
@@ -40,6 +41,7 @@ def reset_and_load():
         session = get_session()
         clean_data(session)
         initialize_data(session, data)
+        invalidate_book_caches(session)
         return jsonify({"status": "success"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
\ No newline at end of file
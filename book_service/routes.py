@@ -11,32 +11,128 @@ Each API Responsibilities:
     - Uses @handle_exceptions to catch and return proper JSON error responses
     - Order of validation: Auth -> Role -> Required fields -> Type
 """
-from flask import Blueprint, request, jsonify, g, current_app
+import io
+
+from flask import Blueprint, request, jsonify, g, current_app, url_for, stream_with_context
 
 from auth_service.auth_middleware import require_auth, require_role
+from common.config import PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX
 from .db import get_session
 from .services.book_service import *
 from .services.order_service import *
+from .services.reservation_service import *
 from .services.user_service import *
 from .utils.handlers import handle_exceptions
+from .utils.utils import parse_limit, parse_ids, iter_ndjson_rows, iter_csv_rows
 books_bp = Blueprint('books', __name__)
 
 
 @books_bp.route('/books')
+@handle_exceptions
 def get_all_books():
     """
-    GET /books
+    GET /books?limit=<page_size>&after=<cursor>&publisher=&min_price=&max_price=&in_stock=&sort=
+    GET /books?ids=1,2,3
 
-    Returns a list of all available books.
+    Returns one page of books, filtered and sorted by the database, served from the in-process catalog cache.
+    With ids, returns these books, served from the in-process book cache.
 
-    Requirements: NA
+    Requirements:
+    - ids: comma-separated book ids, at most PAGE_SIZE_MAX, other parameters are ignored
+    - publisher: exact publisher name
+    - min_price, max_price: bounds of sell_price
+    - in_stock: true for books with quantity > 0
+    - sort: id (default), name or price, prefixed with - for descending
+    - limit: integer in [1, PAGE_SIZE_MAX], default PAGE_SIZE_DEFAULT
+    - after: the "next" cursor of the previous page, omitted for the first page
+    - Without limit and after, returns the list of all books while LEGACY_BOOK_LIST is enabled
+    - If-None-Match: ETag of a previous response, answered with 304 while the catalog is unchanged
 
     Response:
-    - 200: List of book objects
+    - 200: {"items": [book objects], "next": <cursor or null>}, with a Link rel="next" header if there is a next page
+           or a list of all book objects (legacy). ETag header carries the catalog version
+           or {"items": [book objects in the order of ids], "missing": [ids not found]} with ids
+    - 304: Not modified since the If-None-Match ETag
+    - 400: Invalid limit, cursor, filter or ids
 
    """
+    if "ids" in request.args:
+        ids = parse_ids(request.args["ids"], PAGE_SIZE_MAX)
+        with get_session() as session:
+            body, missing = get_books_json(session, ids)
+        return current_app.response_class(b'{"items":' + body + b',"missing":' + encode_json(missing) + b'}',
+                                          mimetype="application/json")
+
+    legacy = "limit" not in request.args and "after" not in request.args and current_app.config["LEGACY_BOOK_LIST"]
+    limit = None if legacy else parse_limit(request.args.get("limit"), PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX)
+    filters = BookFilter.from_args(request.args)
+    next_cursor = None
+    with get_session() as session:
+        # Read the version before the body: a concurrent write can only make the tag older than the body
+        etag = catalog_etag(session)
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        elif legacy:
+            response = current_app.response_class(list_books_json(session, filters), mimetype="application/json")
+        else:
+            body, next_cursor = list_books_page_json(session, limit, request.args.get("after"), filters)
+            response = current_app.response_class(body, mimetype="application/json")
+
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"  # clients revalidate with If-None-Match
+    if next_cursor:
+        next_args = {**request.args.to_dict(), "limit": limit, "after": next_cursor}
+        next_url = url_for("books.get_all_books", **next_args, _external=True)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return response
+
+
+@books_bp.route('/books/<int:book_id>')
+@handle_exceptions
+def get_book_route(book_id):
+    """
+    GET /books/<book_id>
+
+    Returns one book, served from the in-process book cache.
+
+    Response:
+    - 200: Book object
+    - 404: Book not found
+    """
     with get_session() as session:
-        return jsonify([b.to_dict() for b in list_books(session)]), 200
+        return current_app.response_class(get_book_json(session, book_id), mimetype="application/json")
+
+
+@books_bp.route('/books/search')
+@handle_exceptions
+def search_books_route():
+    """
+    GET /books/search?q=<text>&limit=<page_size>&after=<cursor>
+
+    Full-text search of books by name, publisher or code, best matches first.
+
+    Requirements:
+    - q: required, words are matched as prefixes, all words must match
+    - limit: integer in [1, PAGE_SIZE_MAX], default PAGE_SIZE_DEFAULT
+    - after: the "next" cursor of the previous page, omitted for the first page
+
+    Response:
+    - 200: {"items": [book objects], "next": <cursor or null>}, with a Link rel="next" header if there is a next page
+    - 400: Missing q, q without words, invalid limit or cursor
+    """
+    q = request.args.get("q")
+    if not q:
+        return jsonify({"error": "Missing required query parameter: q"}), 400
+
+    limit = parse_limit(request.args.get("limit"), PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX)
+    with get_session() as session:
+        books, next_cursor = search_books(session, q, limit, request.args.get("after"))
+        response = jsonify({"items": [b.to_dict() for b in books], "next": next_cursor})
+
+    if next_cursor:
+        next_url = url_for("books.search_books_route", q=q, limit=limit, after=next_cursor, _external=True)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return response
 
 
 @books_bp.route('/books', methods=['POST'])
@@ -76,6 +172,42 @@ def add_book_route():
         return jsonify(add_book(session, data).to_dict()), 201
 
 
+@books_bp.route('/books/bulk', methods=['POST'])
+@handle_exceptions
+@require_auth()
+@require_role("admin")
+def bulk_import_books_route():
+    """
+    POST /books/bulk
+
+    Inserts or updates books by code from a streamed NDJSON or CSV body.
+
+    Requirements:
+    - Must be authenticated
+    - Must have 'admin' role
+    - Content-Type: application/x-ndjson (one JSON book object per line)
+        or text/csv (header line with field names: code, name, publisher, quantity, imported_price, sell_price)
+    - Each row follows the rules of POST /books (code and name required); a row with an existing code
+      updates that book, optional fields missing from the row keep their value
+
+    Response:
+    - 200: {"inserted": n, "updated": n, "failed": n, "errors": [{"line": n, "code": code, "error": message}]}
+    - 401: Unauthorized
+    - 403: Insufficient permission
+    - 415: Unsupported content type
+    """
+    stream = io.TextIOWrapper(request.stream, encoding="utf-8", newline="")
+    if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+        rows = iter_ndjson_rows(stream)
+    elif request.mimetype == "text/csv":
+        rows = iter_csv_rows(stream, {"quantity": int, "imported_price": float, "sell_price": float})
+    else:
+        return jsonify({"error": "Content-Type must be application/x-ndjson or text/csv"}), 415
+
+    with get_session() as session:
+        return jsonify(bulk_upsert_books(session, rows)), 200
+
+
 @books_bp.route('/books/<int:book_id>', methods=['PUT'])
 @handle_exceptions
 @require_auth()
@@ -156,22 +288,36 @@ def place_order_route():
                 "quantity": 4
             }]
     }
+    - reservation_ids (optional): ids of the user's active holds on books of the order, released by the order;
+      without them, stock held by active reservations is not available
+    - Idempotency-Key header (optional): retries with the same key and body get the response of the first
+      successful request, without placing the order again, until the key expires (IDEMPOTENCY_KEY_TTL)
 
     Response:
     - 201: created successfully return json response with order info
+           replays carry the header Idempotent-Replayed: true
     - 401: Unauthorized
     - 400: Validation error (missing or invalid data violations)
-    - 404: Book ID is not found
+    - 404: Book ID is not found, or reservation not found (expired, of another user)
     - 400: Book stock unavailable
-    - 409: database integrity errors
+    - 409: database integrity errors, or Idempotency-Key used with a different request
     """
     data = request.json
     if "items" not in data:
         return jsonify({"error": f"Missing required field: items"}), 400
 
     user_id = g.user['user_id']
+    idempotency_key = request.headers.get("Idempotency-Key")
     with get_session() as session:
-        return jsonify(place_order(session, user_id, data['items']).to_dict()), 201
+        if idempotency_key is None:
+            return jsonify(place_order(session, user_id, data['items'], data.get('reservation_ids')).to_dict()), 201
+        body, replayed = place_order_idempotent(session, user_id, data['items'], idempotency_key,
+                                                data.get('reservation_ids'))
+
+    response = current_app.response_class(body, status=201, mimetype="application/json")
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return response
 
 
 @books_bp.route('/orders')
@@ -179,21 +325,115 @@ def place_order_route():
 @require_auth()
 def list_order_route():
     """
-    GET /orders
+    GET /orders?limit=<page_size>&after=<cursor>&status=&user_id=&book_id=&created_from=&created_to=
+
+    Returns one page of the orders placed by the current user, or of all orders for an admin, newest first.
+
+    Requirements:
+    - Must be authenticated
+    - status: one of the order statuses
+    - user_id: orders of this user, admin only
+    - book_id: orders with an item of this book
+    - created_from, created_to: ISO 8601 date or datetime (UTC unless an offset is given), from inclusive, to exclusive
+    - limit: integer in [1, PAGE_SIZE_MAX], default PAGE_SIZE_DEFAULT
+    - after: the "next" cursor of the previous page, omitted for the first page
+    - Without limit and after, returns the list of all matching orders while LEGACY_ORDER_LIST is enabled
+
+    Response:
+    - 200: {"items": [order objects], "next": <cursor or null>, "total": <count of matching orders>},
+           with a Link rel="next" header if there is a next page
+           or a list of all matching order objects (legacy)
+    - 400: Invalid limit, cursor or filter
+    - 401: Unauthorized
+    - 403: Filter by user_id as a non-admin user
+    """
+    is_admin = g.user['role'] == 'admin'
+    user_id = g.user['user_id']
+    legacy = "limit" not in request.args and "after" not in request.args and current_app.config["LEGACY_ORDER_LIST"]
+    limit = None if legacy else parse_limit(request.args.get("limit"), PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX)
+    filters = OrderFilter.from_args(request.args)
+    with get_session() as session:
+        if legacy:
+            orders = list_orders(session, user_id=user_id, is_admin=is_admin,
+                                 filters=filters if filters != OrderFilter() else None)
+            return jsonify([o.to_dict() for o in orders]), 200
+
+        orders, next_cursor, total = list_orders_page(session, limit, request.args.get("after"), user_id=user_id,
+                                                      is_admin=is_admin, filters=filters)
+        response = jsonify({"items": [o.to_dict() for o in orders], "next": next_cursor, "total": total})
+
+    if next_cursor:
+        next_args = {**request.args.to_dict(), "limit": limit, "after": next_cursor}
+        next_url = url_for("books.list_order_route", **next_args, _external=True)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return response
+
+
+@books_bp.route('/orders/<int:oid>')
+@handle_exceptions
+@require_auth()
+def get_order_route(oid):
+    """
+    GET /orders/<order_id>
 
-    Returns the list of orders placed by the current user.
+    Returns one order with its items, and the code and name of each item's book.
 
     Requirements:
     - Must be authenticated
+    - Must be admin, or order owner
 
     Response:
-    - 200: List of order objects
+    - 200: Order object, items with "book_code" and "book_name"
     - 401: Unauthorized
+    - 403: The order belongs to another user
+    - 404: Order not found
     """
     is_admin = g.user['role'] == 'admin'
     user_id = g.user['user_id']
     with get_session() as session:
-        return jsonify([o.to_dict() for o in list_orders(session, user_id=user_id, is_admin=is_admin)]), 200
+        return jsonify(get_order(session, oid, user_id, is_admin).to_dict(with_books=True)), 200
+
+
+@books_bp.route('/orders/status', methods=['PUT'])
+@handle_exceptions
+@require_auth()
+@require_role("admin")
+def update_order_statuses_route():
+    """
+    PUT /orders/status
+
+    Updates the status of many orders in one transaction, following status transitions.
+
+    Requirements:
+    - Must be authenticated
+    - Must have 'admin' role
+    - JSON body with either a list of orders and their new status, at most ORDER_STATUS_BATCH_MAX:
+        {"orders": [{"id": 1, "status": "shipping"}, {"id": 2, "status": "rejected"}]}
+      or a filter of GET /orders (status, user_id, book_id, created_from, created_to) and the new status:
+        {"filter": {"status": "processing"}, "status": "shipping"}
+    - Field types: "id": int, "status": str, "filter": object
+
+    Response:
+    - 200: {"updated": <count>, "failed": <count>, "results": [{"id", "status"} or {"id", "error"} per order]}
+    - 401: Unauthorized
+    - 403: Insufficient permission
+    - 400: Validation error (missing or invalid data, too many orders)
+    """
+    data = request.get_json()
+    with get_session() as session:
+        if "orders" in data:
+            if not isinstance(data["orders"], list):
+                return jsonify({"error": "Field 'orders' must be of type list"}), 400
+            results = update_order_statuses(session, data["orders"])
+        elif "filter" in data:
+            if not isinstance(data["filter"], dict) or not isinstance(data.get("status"), str):
+                return jsonify({"error": "Field 'filter' must be of type object and 'status' of type str"}), 400
+            results = update_filtered_order_statuses(session, OrderFilter.from_json(data["filter"]), data["status"])
+        else:
+            return jsonify({"error": "Missing required field: orders or filter"}), 400
+
+    failed = sum("error" in r for r in results)
+    return jsonify({"updated": len(results) - failed, "failed": failed, "results": results}), 200
 
 
 @books_bp.route('/orders/<int:oid>/status', methods=['PUT'])
@@ -231,6 +471,131 @@ def update_order_route(oid):
         return jsonify(update_order_status(session, oid, data["status"], user_id, is_admin).to_dict()), 200
 
 
+@books_bp.route('/reservations', methods=['POST'])
+@handle_exceptions
+@require_auth()
+def create_reservation_route():
+    """
+    POST /reservations
+
+    Holds a quantity of a book for the current user, for checkout.
+
+    Requirements:
+    - Must be authenticated
+    - JSON body must include fields: book_id, quantity. Optional: minutes (default RESERVATION_MINUTES_DEFAULT)
+    - Field types: "book_id": int, "quantity": int, "minutes": int
+    - quantity must be positive, minutes in [1, RESERVATION_MINUTES_MAX]
+    - Available stock (quantity - active holds) must cover the quantity
+    {
+        "book_id": 1,
+        "quantity": 2,
+        "minutes": 15
+    }
+
+    Response:
+    - 201: created successfully return json response with reservation info, to send with POST /orders
+    - 401: Unauthorized
+    - 400: Validation error, or book stock unavailable
+    - 404: Book ID is not found
+    """
+    user_id = g.user['user_id']
+    with get_session() as session:
+        return jsonify(create_reservation(session, user_id, request.get_json()).to_dict()), 201
+
+
+@books_bp.route('/reservations/<int:rid>', methods=['DELETE'])
+@handle_exceptions
+@require_auth()
+def release_reservation_route(rid):
+    """
+    DELETE /reservations/<reservation_id>
+
+    Releases a hold before it expires.
+
+    Requirements:
+    - Must be authenticated
+    - Must be admin, or reservation owner
+
+    Response:
+    - 200: Reservation released, return json response with reservation info
+    - 401: Unauthorized
+    - 403: The reservation belongs to another user
+    - 404: Reservation not found
+    """
+    is_admin = g.user['role'] == 'admin'
+    user_id = g.user['user_id']
+    with get_session() as session:
+        return jsonify(release_reservation(session, rid, user_id, is_admin).to_dict()), 200
+
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def export_response(name: str, fmt: str, chunks):
+    """Streamed attachment response of export chunks, the request context is kept until the last chunk"""
+    response = current_app.response_class(stream_with_context(chunks), mimetype=EXPORT_FORMATS[fmt])
+    response.headers["Content-Disposition"] = f'attachment; filename="{name}.{fmt}"'
+    return response
+
+
+@books_bp.route('/export/books')
+@handle_exceptions
+@require_auth()
+@require_role("admin")
+def export_books_route():
+    """
+    GET /export/books?format=ndjson|csv
+
+    Streams the whole catalog, by id, in the format of POST /books/bulk.
+
+    Requirements:
+    - Must be authenticated
+    - Must have 'admin' role
+    - format: ndjson (default) or csv
+
+    Response:
+    - 200: application/x-ndjson, one book object per line, or text/csv with a header line
+    - 400: Invalid format
+    - 401: Unauthorized
+    - 403: Insufficient permission
+    """
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": "Query parameter 'format' must be ndjson or csv"}), 400
+    # The session of the request stays open while the response streams, removed on teardown
+    return export_response("books", fmt, export_books(get_session(), fmt))
+
+
+@books_bp.route('/export/orders')
+@handle_exceptions
+@require_auth()
+@require_role("admin")
+def export_orders_route():
+    """
+    GET /export/orders?format=ndjson|csv&status=&user_id=&book_id=&created_from=&created_to=
+
+    Streams orders with their items, oldest first.
+
+    Requirements:
+    - Must be authenticated
+    - Must have 'admin' role
+    - format: ndjson (default) or csv
+    - Filters of GET /orders, e.g. created_from=2026-01-01&created_to=2026-02-01 for a month
+
+    Response:
+    - 200: application/x-ndjson, one order object with its items per line,
+           or text/csv with a header line and one line per order item
+    - 400: Invalid format or filter
+    - 401: Unauthorized
+    - 403: Insufficient permission
+    """
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": "Query parameter 'format' must be ndjson or csv"}), 400
+    filters = OrderFilter.from_args(request.args)
+    return export_response("orders", fmt, export_orders(get_session(), filters, fmt))
+
+
 @books_bp.route('/users')
 @handle_exceptions
 @require_auth()
@@ -273,6 +638,7 @@ def register_user_route():
     - 201: created successfully return json response with user info
     - 400: required fields, validation errors, username not unique
     - 409: database integrity errors
+    - 503: password hashing is saturated, retry later
     """
     # Check for required fields
     data = request.get_json()
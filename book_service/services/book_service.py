@@ -13,15 +13,223 @@ Responsibilities:
     - Validation order: input type (-> record existence) -> required/non-empty+type+non-negative (business rule)
         -> DB checks
     - Uses @validate_types to validate input types and raise ValueError on first error
+    - Keep the catalog cache coherent: every committed book write invalidates it
 """
+import json
+import math
+import re
+import secrets
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy import text, or_, and_, tuple_, select, func, delete, Integer, Float
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from common.config import CATALOG_CACHE_TTL, CATALOG_CACHE_MAX_ENTRIES, BOOK_CACHE_TTL, BOOK_CACHE_MAX_ENTRIES, \
+    BOOK_SEARCH_WEIGHTS, BULK_IMPORT_BATCH_SIZE, BULK_IMPORT_MAX_ERRORS, EXPORT_BATCH_SIZE
 from common.exceptions import RecordNotFoundError
-from ..models import Book
+from ..models import Book, Reservation, utc_now
 from ..utils.handlers import validate_types
 from ..utils.utils import validate_required_fields, validate_field_types, validate_non_negative_fields, \
-    validate_non_empty_if_present, filter_valid_model_fields
+    validate_non_empty_if_present, filter_valid_model_fields, encode_cursor, decode_cursor, \
+    ndjson_chunk, csv_chunk
+
+
+class CatalogCache:
+    """
+    Serialized catalog reads of one database, pre-encoded as JSON bytes
+
+    Entries are keyed by the read (full list, page, ...) and all belong to the current catalog version.
+    invalidate() bumps the version and drops them. A version also expires after ttl seconds, a safety net for
+    writes made by other processes. The version is exposed as a strong ETag, unique per cache instance.
+    """
+
+    def __init__(self, ttl: float = CATALOG_CACHE_TTL, max_entries: int = CATALOG_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._instance = secrets.token_hex(4)  # versions of other workers' caches must not collide
+        self._expires_at = time.monotonic() + ttl
+        self._entries = OrderedDict()  # key -> value, least recently used first
+        self._lock = threading.Lock()
+
+    def _expire(self) -> None:
+        # Caller holds the lock
+        now = time.monotonic()
+        if now >= self._expires_at:
+            self.version += 1
+            self._entries.clear()
+            self._expires_at = now + self.ttl
+
+    def get(self, key, loader):
+        """
+        Return the cached value of key, or load, cache and return it
+        :param key: hashable key of the read
+        :param loader: function building the value on a miss
+        """
+        with self._lock:
+            self._expire()
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+            version = self.version
+
+        value = loader()
+
+        with self._lock:
+            # Skip caching if a write invalidated the catalog while loading
+            if version == self.version:
+                self._entries[key] = value
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def etag(self) -> str:
+        """Strong entity tag of the current catalog version"""
+        with self._lock:
+            self._expire()
+            return f"{self._instance}-{self.version}"
+
+    def invalidate(self) -> None:
+        """Drop every entry and start a new version, called after a catalog write is committed"""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            self._expires_at = time.monotonic() + self.ttl
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_catalog_caches = weakref.WeakKeyDictionary()  # engine -> CatalogCache
+_catalog_caches_lock = threading.Lock()
+
+
+def catalog_cache(session: Session) -> CatalogCache:
+    """Return the catalog cache of the database the session is bound to"""
+    engine = session.get_bind()
+    with _catalog_caches_lock:
+        cache = _catalog_caches.get(engine)
+        if cache is None:
+            cache = _catalog_caches[engine] = CatalogCache()
+        return cache
+
+
+class BookCache:
+    """
+    Serialized books of one database by id, pre-encoded as JSON bytes, least recently used evicted first
+
+    Writes drop the entries of the books they changed. An entry also expires after ttl seconds, a safety net for
+    writes made by other processes.
+    """
+
+    def __init__(self, ttl: float = BOOK_CACHE_TTL, max_entries: int = BOOK_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._generation = 0  # bumped by every invalidation
+        self._entries = OrderedDict()  # book id -> (expires at, JSON bytes), least recently used first
+        self._lock = threading.Lock()
+
+    def get_many(self, book_ids: list, loader) -> dict:
+        """
+        Return the serialized books of book_ids found in the cache or by the loader, by id
+        :param book_ids: ids of the books
+        :param loader: function loading {id: JSON bytes} of the missed ids, ids not found are left out
+        """
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for book_id in book_ids:
+                entry = self._entries.get(book_id)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(book_id)
+                    found[book_id] = entry[1]
+            self.hits += len(found)
+            missed = [book_id for book_id in book_ids if book_id not in found]
+            self.misses += len(missed)
+            generation = self._generation
+        if not missed:
+            return found
+
+        loaded = loader(missed)
+        found.update(loaded)
+
+        with self._lock:
+            # Skip caching if a write invalidated books while loading
+            if generation == self._generation:
+                expires_at = time.monotonic() + self.ttl
+                for book_id, value in loaded.items():
+                    self._entries[book_id] = (expires_at, value)
+                    self._entries.move_to_end(book_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return found
+
+    def invalidate(self, book_ids=None) -> None:
+        """Drop the entries of book_ids, or every entry if None, called after a book write is committed"""
+        with self._lock:
+            self._generation += 1
+            if book_ids is None:
+                self._entries.clear()
+            else:
+                for book_id in book_ids:
+                    self._entries.pop(book_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_book_caches = weakref.WeakKeyDictionary()  # engine -> BookCache
+_book_caches_lock = threading.Lock()
+
+
+def book_cache(session: Session) -> BookCache:
+    """Return the book cache of the database the session is bound to"""
+    engine = session.get_bind()
+    with _book_caches_lock:
+        cache = _book_caches.get(engine)
+        if cache is None:
+            cache = _book_caches[engine] = BookCache()
+        return cache
+
+
+def invalidate_book_caches(session: Session, book_ids=None) -> None:
+    """
+    Drop the cached reads a committed book write made stale: every catalog read, and the changed books
+    :param book_ids: ids of the changed books, None when unknown (all books are dropped)
+    """
+    catalog_cache(session).invalidate()
+    book_cache(session).invalidate(book_ids)
+
+
+def encode_json(data) -> bytes:
+    return json.dumps(data, separators=(",", ":")).encode()
 
 
 def validate_book_data(data: dict, is_create: bool) -> None:
@@ -45,16 +253,216 @@ def validate_book_data(data: dict, is_create: bool) -> None:
         raise ValueError("; ".join(errors))
 
 
-def list_books(session: Session) -> list[Book]:
+BOOK_SORTS = {"id": Book.id, "name": Book.name, "price": Book.sell_price}  # "-<sort>" sorts descending
+
+
+@dataclass(frozen=True)
+class BookFilter:
+    """Filters and sort order of a book list, hashable so it can key the catalog cache"""
+    publisher: str | None = None
+    min_price: float | None = None  # on sell_price
+    max_price: float | None = None
+    in_stock: bool = False  # quantity > 0
+    sort: str = "id"
+
+    @classmethod
+    def from_args(cls, args) -> "BookFilter":
+        """
+        Build a filter from query string parameters: publisher, min_price, max_price, in_stock, sort
+        :exception: ValueError: invalid parameter values
+        """
+        errors = []
+        prices = {}
+        for name in ("min_price", "max_price"):
+            if args.get(name) is not None:
+                try:
+                    prices[name] = float(args[name])
+                except ValueError:
+                    prices[name] = math.nan
+                # nan and inf parse as floats but no price compares to them
+                if not math.isfinite(prices[name]):
+                    errors.append(f"Query parameter '{name}' must be a number")
+        in_stock = args.get("in_stock", "false").lower()
+        if in_stock not in ("true", "false"):
+            errors.append("Query parameter 'in_stock' must be true or false")
+        sort = args.get("sort", "id")
+        if sort.lstrip("-") not in BOOK_SORTS:
+            errors.append(f"Query parameter 'sort' must be one of: {', '.join(BOOK_SORTS)} (prefix - for descending)")
+        if errors:
+            raise ValueError("; ".join(errors))
+        return cls(publisher=args.get("publisher") or None, in_stock=in_stock == "true", sort=sort, **prices)
+
+    @property
+    def descending(self) -> bool:
+        return self.sort.startswith("-")
+
+    @property
+    def sort_column(self):
+        return BOOK_SORTS[self.sort.lstrip("-")]
+
+    def apply(self, query):
+        """Add the filters and the sort order (tie-broken by id) to a Book query"""
+        if self.publisher is not None:
+            query = query.filter(Book.publisher == self.publisher)
+        if self.min_price is not None:
+            query = query.filter(Book.sell_price >= self.min_price)
+        if self.max_price is not None:
+            query = query.filter(Book.sell_price <= self.max_price)
+        if self.in_stock:
+            query = query.filter(Book.quantity > 0)
+        order = [self.sort_column] if self.sort_column is not Book.id else []
+        order.append(Book.id)
+        return query.order_by(*(c.desc() for c in order) if self.descending else order)
+
+    def after(self, query, value, last_id: int):
+        """
+        Keep the rows sorted after (value, last_id), the keyset of the previous page's last row
+        SQLite sorts NULL first, so ascending pages cross the NULL rows first and descending pages last.
+        """
+        column = self.sort_column
+        if column is Book.id:
+            return query.filter(Book.id < last_id if self.descending else Book.id > last_id)
+        if self.descending:
+            if value is None:
+                return query.filter(column.is_(None), Book.id < last_id)
+            return query.filter(or_(tuple_(column, Book.id) < tuple_(value, last_id), column.is_(None)))
+        if value is None:
+            return query.filter(or_(and_(column.is_(None), Book.id > last_id), column.isnot(None)))
+        return query.filter(tuple_(column, Book.id) > tuple_(value, last_id))
+
+
+@validate_types(filters=(BookFilter, type(None)))
+def list_books(session: Session, filters: BookFilter = None) -> list[Book]:
     """
     Get all books
     :param session: database session
+    :param filters: filters and sort order, default all books by id
+    """
+    if filters is None:
+        return session.query(Book).all()
+    return filters.apply(session.query(Book)).all()
+
+
+@validate_types(limit=int, after=(str, type(None)), filters=(BookFilter, type(None)))
+def list_books_page(session: Session, limit: int, after: str = None,
+                    filters: BookFilter = None) -> tuple[list[Book], str | None]:
+    """
+    Get one page of books (keyset pagination)
+    :param session: database session
+    :param limit: page size
+    :param after: cursor returned with the previous page, None for the first page
+    :param filters: filters and sort order, default all books by id
+    :return: (books, cursor of the next page or None on the last page)
+    :exception: TypeError: function input type error
+        ValueError: malformed cursor, or cursor of another sort order
+    """
+    filters = filters or BookFilter()
+    query = filters.apply(session.query(Book))
+    if after is not None:
+        sort, value, last_id = decode_cursor(after, 3)
+        if sort != filters.sort or not isinstance(last_id, int):
+            raise ValueError("Invalid cursor")
+        query = filters.after(query, value, last_id)
+
+    # One extra row tells whether there is a next page
+    books = query.limit(limit + 1).all()
+    if len(books) <= limit:
+        return books, None
+    books = books[:limit]
+    last = books[-1]
+    return books, encode_cursor([filters.sort, getattr(last, filters.sort_column.key), last.id])
+
+
+SEARCH_MAX_TERMS = 10
+
+
+def build_search_query(q: str) -> str:
+    """
+    Turn free text into an FTS5 query: every word must match, as a prefix, in any indexed column
+    Words are quoted, so FTS5 operators and punctuation in the input are never interpreted.
+    :exception: ValueError: no word in q
+    """
+    terms = re.findall(r"\w+", q)[:SEARCH_MAX_TERMS]
+    if not terms:
+        raise ValueError("Query parameter 'q' must contain at least one word")
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+@validate_types(q=str, limit=int, after=(str, type(None)))
+def search_books(session: Session, q: str, limit: int, after: str = None) -> tuple[list[Book], str | None]:
+    """
+    Full-text search over book name, publisher and code, best matches (BM25) first
+    :param session: database session
+    :param q: free text
+    :param limit: page size
+    :param after: cursor returned with the previous page, None for the first page
+    :return: (books, cursor of the next page or None on the last page)
+    :exception: TypeError: function input type error
+        ValueError: q has no word, malformed cursor
     """
-    return session.query(Book).all()
+    offset = 0
+    if after is not None:
+        offset, = decode_cursor(after, 1)
+        if not isinstance(offset, int) or offset < 0:
+            raise ValueError("Invalid cursor")
+
+    weights = ", ".join(str(w) for w in BOOK_SEARCH_WEIGHTS)
+    # Rank inside the index first, then read only the rows of the page from books
+    hits = text(f"""
+        SELECT rowid, bm25(books_fts, {weights}) AS score FROM books_fts
+        WHERE books_fts MATCH :match
+        ORDER BY score, rowid
+        LIMIT :limit OFFSET :offset""").columns(rowid=Integer, score=Float).subquery("hits")
+    # An ORM query (not from_statement) so Book.available is selected with the row, not lazy-loaded per book;
+    # one extra row tells whether there is a next page
+    books = (session.query(Book).join(hits, Book.id == hits.c.rowid).order_by(hits.c.score, hits.c.rowid)
+             .params(match=build_search_query(q), limit=limit + 1, offset=offset).all())
+    if len(books) <= limit:
+        return books, None
+    return books[:limit], encode_cursor([offset + limit])
+
+
+def catalog_etag(session: Session) -> str:
+    """
+    Get the entity tag of the current catalog version, without querying the database
+    :param session: database session
+    """
+    return catalog_cache(session).etag()
+
+
+@validate_types(filters=(BookFilter, type(None)))
+def list_books_json(session: Session, filters: BookFilter = None) -> bytes:
+    """
+    Get all books as a JSON array, served from the catalog cache
+    :param session: database session
+    :param filters: filters and sort order, default all books by id
+    """
+    return catalog_cache(session).get(
+        ("all", filters), lambda: encode_json([b.to_dict() for b in list_books(session, filters)]))
+
+
+@validate_types(limit=int, after=(str, type(None)), filters=(BookFilter, type(None)))
+def list_books_page_json(session: Session, limit: int, after: str = None,
+                         filters: BookFilter = None) -> tuple[bytes, str | None]:
+    """
+    Get one page of books as a JSON object {"items": [...], "next": <cursor>}, served from the catalog cache
+    :param session: database session
+    :param limit: page size
+    :param after: cursor returned with the previous page, None for the first page
+    :param filters: filters and sort order, default all books by id
+    :return: (JSON bytes, cursor of the next page or None on the last page)
+    :exception: TypeError: function input type error
+        ValueError: malformed cursor
+    """
+    def load():
+        books, next_cursor = list_books_page(session, limit, after, filters)
+        return encode_json({"items": [b.to_dict() for b in books], "next": next_cursor}), next_cursor
+
+    return catalog_cache(session).get(("page", limit, after, filters), load)
 
 
 @validate_types(book_id=int)
-def get_book(session: Session, book_id: int) -> None:
+def get_book(session: Session, book_id: int) -> Book:
     """
     Get book by id
     :param session: database session
@@ -65,6 +473,41 @@ def get_book(session: Session, book_id: int) -> None:
     book = session.query(Book).filter(Book.id == book_id).first()
     if not book:
         raise RecordNotFoundError(f"Book with id {book_id} not found")
+    return book
+
+
+def _load_books_json(session: Session, book_ids: list) -> dict:
+    return {b.id: encode_json(b.to_dict()) for b in session.query(Book).filter(Book.id.in_(book_ids))}
+
+
+@validate_types(book_id=int)
+def get_book_json(session: Session, book_id: int) -> bytes:
+    """
+    Get a book serialized as JSON, served from the book cache
+    :param session: database session
+    :param book_id: book id
+    :exception: TypeError: function input type error
+        RecordNotFoundError: book_id is not found
+    """
+    found = book_cache(session).get_many([book_id], lambda missed: _load_books_json(session, missed))
+    if book_id not in found:
+        raise RecordNotFoundError(f"Book with id {book_id} not found")
+    return found[book_id]
+
+
+@validate_types(book_ids=list)
+def get_books_json(session: Session, book_ids: list) -> tuple[bytes, list[int]]:
+    """
+    Get books by ids as a JSON list, in the order of book_ids, served from the book cache
+    The missed books are loaded by one IN query.
+    :param session: database session
+    :param book_ids: distinct book ids
+    :return: (JSON list of the books found, ids not found)
+    :exception: TypeError: function input type error
+    """
+    found = book_cache(session).get_many(book_ids, lambda missed: _load_books_json(session, missed))
+    body = b"[" + b",".join(found[book_id] for book_id in book_ids if book_id in found) + b"]"
+    return body, [book_id for book_id in book_ids if book_id not in found]
 
 
 @validate_types(data=dict)
@@ -97,9 +540,90 @@ def add_book(session: Session, data: dict) -> Book:
         if "UNIQUE constraint failed" in str(ie.orig):
             raise ValueError("A book with this code already exists.")
         raise
+    catalog_cache(session).invalidate()
     return book
 
 
+BOOK_IMPORT_FIELDS = ["code", "name", "publisher", "quantity", "imported_price", "sell_price"]
+
+
+def _report_row_error(report: dict, line: int, row: dict | None, error: str) -> None:
+    report["failed"] += 1
+    if len(report["errors"]) < BULK_IMPORT_MAX_ERRORS:
+        code = row.get("code") if isinstance(row, dict) else None
+        report["errors"].append({"line": line, "code": code, "error": error})
+    else:
+        report["errors_truncated"] = True
+
+
+def _upsert_books_batch(session: Session, batch: list, report: dict) -> None:
+    """Upsert one batch of validated rows in a single executemany transaction"""
+    table = Book.__table__
+    params = [row for _, row in batch]
+    codes = {row["code"] for row in params}
+    existing = set(session.execute(select(table.c.code).where(table.c.code.in_(codes))).scalars())
+
+    statement = sqlite_insert(table)
+    # Fields missing from a row keep their stored value
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.code],
+        set_={f: func.coalesce(statement.excluded[f], table.c[f]) for f in BOOK_IMPORT_FIELDS if f != "code"})
+    try:
+        session.execute(statement, params)
+        session.commit()
+    except IntegrityError as ie:
+        session.rollback()
+        for line, row in batch:
+            _report_row_error(report, line, row, f"Database integrity error: {ie.orig}")
+        return
+
+    for row in params:
+        if row["code"] in existing:
+            report["updated"] += 1
+        else:
+            report["inserted"] += 1
+            existing.add(row["code"])
+
+
+@validate_types(batch_size=int)
+def bulk_upsert_books(session: Session, rows, batch_size: int = BULK_IMPORT_BATCH_SIZE) -> dict:
+    """
+    Insert or update books by code from a stream of rows, a bad row never aborts the load
+    :param session: database session
+    :param rows: iterable of (line number, row dict or None, parse error or None), see iter_ndjson_rows
+    :param batch_size: valid rows per upsert transaction
+    :return: report {"inserted": n, "updated": n, "failed": n, "errors": [{"line", "code", "error"}]}
+    :exception: TypeError: function input type error
+    """
+    report = {"inserted": 0, "updated": 0, "failed": 0, "errors": []}
+    batch = []
+    for line, row, error in rows:
+        if error is None:
+            try:
+                # Same rules as add_book
+                validate_book_data(row, is_create=True)
+            except ValueError as ve:
+                error = str(ve)
+        if error is not None:
+            _report_row_error(report, line, row, error)
+            continue
+
+        params = {f: row.get(f) for f in BOOK_IMPORT_FIELDS}
+        # Update sell_price according to imported_price
+        if not params["sell_price"] and params["imported_price"]:
+            params["sell_price"] = round(params["imported_price"] * 1.1, 2)
+        batch.append((line, params))
+        if len(batch) >= batch_size:
+            _upsert_books_batch(session, batch, report)
+            invalidate_book_caches(session)
+            batch = []
+
+    if batch:
+        _upsert_books_batch(session, batch, report)
+        invalidate_book_caches(session)
+    return report
+
+
 @validate_types(book_id=int, updates=dict)
 def update_book(session: Session, book_id: int, updates: dict) -> Book:
     """
@@ -135,6 +659,7 @@ def update_book(session: Session, book_id: int, updates: dict) -> Book:
         if "UNIQUE constraint failed" in str(ie.orig):
             raise ValueError("A book with this code already exists.")
         raise
+    invalidate_book_caches(session, [book_id])
     return book
 
 
@@ -146,11 +671,38 @@ def delete_book(session: Session, book_id: int) -> Book:
     :param book_id: book id
     :exception: TypeError: function input type error
         RecordNotFoundError: book_id is not found
-        IntegrityError: FK constraint violation
+        IntegrityError: FK constraint violation (order items, active holds)
     """
     book = session.query(Book).filter(Book.id == book_id).first()
     if not book:
         raise RecordNotFoundError(f"Book with id {book_id} not found")
+    # Expired holds are only swept lazily, they must not keep the book
+    session.execute(delete(Reservation).where(Reservation.book_id == book_id, Reservation.expires_at <= utc_now()))
     session.delete(book)
     session.commit()
+    invalidate_book_caches(session, [book_id])
     return book
+
+
+BOOK_EXPORT_FIELDS = ["id"] + BOOK_IMPORT_FIELDS
+
+
+@validate_types(fmt=str, batch_size=int)
+def export_books(session: Session, fmt: str = "ndjson", batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    Stream all books by id as NDJSON objects or CSV lines (with a header line), the format of POST /books/bulk
+    Rows are fetched batch_size at a time from a streamed Core result and written as one chunk,
+    so memory does not grow with the catalog.
+    :param session: database session, open while the chunks are consumed
+    :param fmt: "ndjson" or "csv"
+    :return: generator of encoded chunks
+    :exception: TypeError: function input type error
+    """
+    books = Book.__table__
+    result = session.execute(select(*(books.c[f] for f in BOOK_EXPORT_FIELDS))
+                             .order_by(books.c.id)
+                             .execution_options(yield_per=batch_size))
+    if fmt == "csv":
+        yield csv_chunk([], BOOK_EXPORT_FIELDS)
+    for rows in result.partitions():
+        yield csv_chunk(rows) if fmt == "csv" else ndjson_chunk([row._asdict() for row in rows])
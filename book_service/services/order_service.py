@@ -20,85 +20,412 @@ Responsibilities:
 """
 
 
-from sqlalchemy.exc import InvalidRequestError
-from sqlalchemy.orm import Session
+import hashlib
+import json
+from dataclasses import dataclass
+from datetime import datetime, timedelta
 
+from sqlalchemy import case, delete, func, insert, select, tuple_, update
+from sqlalchemy.exc import IntegrityError, InvalidRequestError
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from common.config import IDEMPOTENCY_KEY_TTL, ORDER_STATUS_BATCH_MAX, EXPORT_BATCH_SIZE
 from common.constants import ORDER_TRANSITIONS, OrderStatus
-from common.exceptions import ForbiddenError, RecordNotFoundError
-from ..models import Order, OrderItem, Book
+from common.exceptions import ForbiddenError, RecordNotFoundError, ConflictError
+from ..models import Order, OrderItem, Book, IdempotencyKey
+from .book_service import invalidate_book_caches, encode_json
+from .reservation_service import held_quantity, consume_reservations, utc_now
 from ..utils.handlers import validate_types
-from ..utils.utils import validate_field_types, validate_required_fields, validate_non_negative_fields
+from ..utils.utils import validate_field_types, validate_required_fields, validate_non_negative_fields, \
+    parse_timestamp, encode_cursor, decode_cursor, ndjson_chunk, csv_chunk
+
+
+def merge_order_items(items: list) -> dict:
+    """
+    Validate the order items and merge the quantities by book_id, keeping the first-seen order
+    :exception: ValueError: errors about items fields (book_id, quantity): required fields, field types, non-negative
+    """
+    merged = {}
+    errors = []
+    for item in items:
+        # Validate the order item for field required, types, non-negative
+        validate_required_fields(item, ["book_id", "quantity"], errors)
+        validate_field_types(item, {"book_id": int, "quantity": int}, errors)
+        if errors:
+            raise ValueError("; ".join(errors))
+
+        validate_non_negative_fields(item, ["book_id", "quantity"], errors)
+        if errors:
+            raise ValueError("; ".join(errors))
+
+        merged[item['book_id']] = merged.get(item['book_id'], 0) + item['quantity']
+    return merged
+
+
+def decrement_stock(session: Session, quantities: dict, now: datetime) -> None:
+    """
+    Take the ordered quantities out of stock in one conditional UPDATE, in the caller's transaction
+    Available stock is checked and decremented by the same statement, so concurrent orders can not oversell:
+    the UPDATE matches only the books whose quantity minus active holds covers the order,
+    and anything short of all of them fails.
+    :param quantities: {book_id: quantity}
+    :param now: expiry limit of the active holds
+    :exception: ValueError: book quantity is not enough (the transaction is rolled back)
+    """
+    ordered = case(quantities, value=Book.id)
+    books = Book.__table__
+    available = books.c.quantity - held_quantity(books.c.id, now)
+    result = session.execute(
+        update(books)
+        .where(books.c.id.in_(quantities), available >= ordered)
+        .values(quantity=books.c.quantity - ordered))
+    if result.rowcount == len(quantities):
+        return
+
+    session.rollback()
+    stock = dict(session.execute(select(books.c.id, available).where(books.c.id.in_(quantities))).all())
+    # A cancel or restock committed since the UPDATE may cover every book again: still a failed order
+    short = next((book_id for book_id, quantity in quantities.items() if (stock.get(book_id) or 0) < quantity),
+                 next(iter(quantities)))
+    raise ValueError(f"Book with id {short} quantity not enough")
+
+
+def _validate_items(items: list) -> dict:
+    """Validate the order items and merge them by book_id, see merge_order_items"""
+    if not items:
+        raise ValueError("Items can not empty")
+    return merge_order_items(items)
+
+
+def _validate_reservation_ids(reservation_ids) -> list:
+    """Validate the ids of the holds an order consumes, return them distinct"""
+    if reservation_ids is None:
+        return []
+    if not isinstance(reservation_ids, list) or not all(isinstance(i, int) for i in reservation_ids):
+        raise ValueError("Field 'reservation_ids' must be a list of integers")
+    return list(dict.fromkeys(reservation_ids))
+
+
+def _create_order(session: Session, user_id: int, quantities: dict, reservation_ids: list) -> Order:
+    """Check the books, take the items out of stock and add the order, in the caller's transaction"""
+    # Validate the order items for exist book id
+    prices = dict(session.query(Book.id, Book.sell_price).filter(Book.id.in_(quantities)).all())
+    for book_id in quantities:
+        if book_id not in prices:
+            raise RecordNotFoundError(f"Book with id {book_id} not found")
+
+    # Release the user's holds for the order, then validate available stock and take the items out of it
+    now = utc_now()
+    if reservation_ids:
+        consume_reservations(session, user_id, reservation_ids, quantities, now)
+    decrement_stock(session, quantities, now)
+
+    order = Order(user_id=user_id, status=OrderStatus.NEW)
+    session.add(order)
+    session.flush()
+    # One executemany for all items; they are loaded with the order when first read
+    session.execute(insert(OrderItem), [
+        {"order_id": order.id, "book_id": book_id, "quantity": quantity, "price_each": prices[book_id]}
+        for book_id, quantity in quantities.items()])
+    return order
 
 
 @validate_types(user_id=int, items=list)
-def place_order(session: Session, user_id: int, items: list) -> Order:
+def place_order(session: Session, user_id: int, items: list, reservation_ids: list = None) -> Order:
     """
     Create a new order
+    Items are merged by book_id, books are loaded by one IN query, stock is decremented by one conditional
+    UPDATE and the order items are inserted in one batch, all in a single transaction.
+    Stock held by active reservations is not available, except the user's holds consumed by the order.
     :param session: database session
     :param user_id
     :param items: order items info: {"items": [{ "book_id": 1, "quantity": 3 }]}
+    :param reservation_ids: ids of the user's holds on books of the order, released by the order
     :exception: TypeError: function input type error
         ValueError: raise when error about empty items
-            then, when error about status value is invalid
             then, when errors about items fields (book_id, quantity): required fields, field types, non-negative
-        RecordNotFoundError: book_id is not existed
+            then, when reservation_ids is not a list of integers
+        RecordNotFoundError: book_id is not existed, or a reservation is not found (expired, of another user)
+        ValueError: a reservation is not for a book of the order
         ValueError: book quantity is not enough
     """
+    quantities = _validate_items(items)
+    reservation_ids = _validate_reservation_ids(reservation_ids)
+    order = _create_order(session, user_id, quantities, reservation_ids)
+    session.commit()
+    # Stock changed
+    invalidate_book_caches(session, list(quantities))
+    return order
 
-    order = Order(user_id=user_id, status=OrderStatus.NEW)
-    session.add(order)
-    session.flush()
-    if not items:
-        raise ValueError("Items can not empty")
 
-    errors = []
-    for item in items:
-        # Validate the order item for field required, types, non-negative
-        validate_required_fields(item, ["book_id", "quantity"], errors)
-        validate_field_types(item, {"book_id": int, "quantity": int}, errors)
+def _replay(session: Session, user_id: int, idempotency_key: str, request_hash: str) -> bytes | None:
+    """Return the stored response of an unexpired key, None if there is none"""
+    record = (session.query(IdempotencyKey)
+              .filter(IdempotencyKey.user_id == user_id, IdempotencyKey.key == idempotency_key,
+                      IdempotencyKey.expires_at > utc_now())
+              .first())
+    if record is None:
+        return None
+    if record.request_hash != request_hash:
+        raise ConflictError("Idempotency-Key has already been used with a different request")
+    return record.response_body.encode()
+
+
+@validate_types(user_id=int, items=list, idempotency_key=str)
+def place_order_idempotent(session: Session, user_id: int, items: list, idempotency_key: str,
+                           reservation_ids: list = None) -> tuple[bytes, bool]:
+    """
+    Create a new order once per idempotency key, retries with the key get the response of the first request
+    The key is inserted as the first write of the order transaction, so a concurrent duplicate waits for the
+    write lock, then fails on the unique (user_id, key) and replays the committed response.
+    Only created orders are stored: a request that failed runs again when retried.
+    :param session: database session
+    :param user_id
+    :param items: order items info, see place_order
+    :param reservation_ids: see place_order
+    :param idempotency_key: client-chosen key of the request, unique per user, 1 to 255 characters
+    :return: (the order as JSON, True if it is the stored response of an earlier request)
+    :exception: TypeError: function input type error
+        ValueError: invalid key, then the errors of place_order
+        ConflictError: the key was used with a different request
+        RecordNotFoundError: book_id is not existed
+    """
+    if not 1 <= len(idempotency_key) <= 255:
+        raise ValueError("Idempotency-Key must be 1 to 255 characters")
+    quantities = _validate_items(items)
+    reservation_ids = _validate_reservation_ids(reservation_ids)
+    request = {"items": items, "reservation_ids": reservation_ids} if reservation_ids else items
+    request_hash = hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+
+    replayed = _replay(session, user_id, idempotency_key, request_hash)
+    if replayed is not None:
+        return replayed, True
+
+    now = utc_now()
+    try:
+        # Expired keys of the user can be reused
+        session.execute(delete(IdempotencyKey).where(IdempotencyKey.user_id == user_id,
+                                                     IdempotencyKey.expires_at <= now))
+        record = IdempotencyKey(user_id=user_id, key=idempotency_key, request_hash=request_hash,
+                                expires_at=now + timedelta(seconds=IDEMPOTENCY_KEY_TTL))
+        session.add(record)
+        session.flush()
+    except IntegrityError:
+        # A concurrent request with the key committed first
+        session.rollback()
+        replayed = _replay(session, user_id, idempotency_key, request_hash)
+        if replayed is None:
+            raise
+        return replayed, True
+
+    order = _create_order(session, user_id, quantities, reservation_ids)
+    # Serialized before the commit: created_at is the naive UTC default, the value the database returns later
+    body = encode_json(order.to_dict())
+    record.order_id = order.id
+    record.response_body = body.decode()
+    record.response_hash = hashlib.sha256(body).hexdigest()
+    session.commit()
+    # Stock changed
+    invalidate_book_caches(session, list(quantities))
+    return body, False
+
+
+# Fields of a filter given as JSON, and their types
+ORDER_FILTER_FIELDS = {"status": str, "user_id": int, "book_id": int, "created_from": str, "created_to": str}
+
+
+@dataclass(frozen=True)
+class OrderFilter:
+    """Filters of an order list; lists are sorted newest first, by (created_at, id)"""
+    status: str | None = None
+    user_id: int | None = None  # admin only
+    book_id: int | None = None  # orders with an item of this book
+    created_from: datetime | None = None  # inclusive, naive UTC
+    created_to: datetime | None = None  # exclusive, naive UTC
+
+    @classmethod
+    def from_args(cls, args) -> "OrderFilter":
+        """
+        Build a filter from query string parameters: status, user_id, book_id, created_from, created_to
+        :exception: ValueError: invalid parameter values
+        """
+        errors = []
+        status = args.get("status") or None
+        if status is not None and status not in OrderStatus.ALL:
+            errors.append(f"Query parameter 'status' must be one of: {', '.join(sorted(OrderStatus.ALL))}")
+        values = {}
+        for name in ("user_id", "book_id"):
+            if args.get(name) is not None:
+                try:
+                    values[name] = int(args[name])
+                except ValueError:
+                    errors.append(f"Query parameter '{name}' must be an integer")
+        for name in ("created_from", "created_to"):
+            if args.get(name) is not None:
+                try:
+                    values[name] = parse_timestamp(args[name])
+                except ValueError:
+                    errors.append(f"Query parameter '{name}' must be an ISO 8601 date or datetime")
         if errors:
             raise ValueError("; ".join(errors))
+        return cls(status=status, **values)
 
-        validate_non_negative_fields(item, ["book_id", "quantity"], errors)
+    @classmethod
+    def from_json(cls, data: dict) -> "OrderFilter":
+        """
+        Build a filter from a JSON object with the query string parameters as fields, see from_args
+        :exception: ValueError: unknown fields, field types, invalid values
+        """
+        errors = [f"Unknown filter field '{name}'" for name in data if name not in ORDER_FILTER_FIELDS]
+        validate_field_types(data, ORDER_FILTER_FIELDS, errors)
         if errors:
             raise ValueError("; ".join(errors))
+        return cls.from_args(data)
 
-        # Validate the order item for exist book id, available stock
-        book = session.query(Book).filter(Book.id == item['book_id']).first()
-        if not book:
-            raise RecordNotFoundError(f"Book with id {item['book_id']} not found")
-        elif book.quantity < item['quantity']:
-            raise ValueError(f"Book with id {item['book_id']} quantity not enough")
+    def scoped(self, user_id: int | None, is_admin: bool) -> "OrderFilter":
+        """
+        Restrict the filter to the orders the caller may see: all orders for an admin, else their own
+        :exception: ForbiddenError: a user filters by another user_id
+        """
+        if is_admin:
+            return self
+        if self.user_id is not None and self.user_id != user_id:
+            raise ForbiddenError("Only admin can list other users' orders")
+        return OrderFilter(self.status, user_id, self.book_id, self.created_from, self.created_to)
 
-        book.quantity -= item['quantity']
-        session.add(OrderItem(
-            order_id=order.id,
-            book_id=item['book_id'],
-            quantity=item['quantity'],
-            price_each=book.sell_price))
+    def filter(self, query):
+        """Add the filters to an Order query"""
+        if self.status is not None:
+            query = query.filter(Order.status == self.status)
+        if self.user_id is not None:
+            query = query.filter(Order.user_id == self.user_id)
+        if self.book_id is not None:
+            query = query.filter(Order.id.in_(select(OrderItem.order_id).where(OrderItem.book_id == self.book_id)))
+        if self.created_from is not None:
+            query = query.filter(Order.created_at >= self.created_from)
+        if self.created_to is not None:
+            query = query.filter(Order.created_at < self.created_to)
+        return query
 
-    session.commit()
-    return order
+    def apply(self, query):
+        """Add the filters and the sort order (newest first, tie-broken by id) to an Order query"""
+        return self.filter(query).order_by(Order.created_at.desc(), Order.id.desc())
 
 
-@validate_types(user_id=(int, type(None)), is_admin=bool)
-def list_orders(session: Session, user_id: int=None, is_admin: bool = False) -> list[Order]:
+@validate_types(user_id=(int, type(None)), is_admin=bool, filters=(OrderFilter, type(None)))
+def list_orders(session: Session, user_id: int=None, is_admin: bool = False, filters: OrderFilter = None) -> list[Order]:
     """
     Get all orders if user is admin, or user own orders
     :param session: database session
     :param user_id
     :param is_admin
+    :param filters: filters of the orders, listed newest first; None lists the orders in id order
     :exception: TypeError: function input type error
+        ForbiddenError: a user filters by another user_id
+    Items are loaded with the orders (one extra IN query), so to_dict() does not lazy-load per order
     """
+    query = session.query(Order).options(selectinload(Order.items))
+    if filters is not None:
+        return filters.scoped(user_id, is_admin).apply(query).all()
     if is_admin:
-        return session.query(Order).all()
-    return session.query(Order).filter(Order.user_id == user_id).all()
+        return query.all()
+    return query.filter(Order.user_id == user_id).all()
+
+
+@validate_types(limit=int, after=(str, type(None)), user_id=(int, type(None)), is_admin=bool,
+                filters=(OrderFilter, type(None)))
+def list_orders_page(session: Session, limit: int, after: str = None, user_id: int = None, is_admin: bool = False,
+                     filters: OrderFilter = None) -> tuple[list[Order], str | None, int]:
+    """
+    Get one page of orders, newest first (keyset pagination on created_at, id)
+    :param session: database session
+    :param limit: page size
+    :param after: cursor returned with the previous page, None for the first page
+    :param user_id
+    :param is_admin: admins see all orders, users their own
+    :param filters: filters of the orders
+    :return: (orders, cursor of the next page or None on the last page, count of all matching orders)
+    :exception: TypeError: function input type error
+        ValueError: malformed cursor
+        ForbiddenError: a user filters by another user_id
+    """
+    filters = (filters or OrderFilter()).scoped(user_id, is_admin)
+    # Counted from the indexes only, without loading any row
+    total = filters.filter(session.query(func.count(Order.id))).scalar()
+
+    query = filters.apply(session.query(Order).options(selectinload(Order.items)))
+    if after is not None:
+        created_at, last_id = decode_cursor(after, 2)
+        try:
+            created_at = datetime.fromisoformat(created_at)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+        if not isinstance(last_id, int):
+            raise ValueError("Invalid cursor")
+        query = query.filter(tuple_(Order.created_at, Order.id) < tuple_(created_at, last_id))
+
+    # One extra row tells whether there is a next page
+    orders = query.limit(limit + 1).all()
+    if len(orders) <= limit:
+        return orders, None, total
+    orders = orders[:limit]
+    last = orders[-1]
+    return orders, encode_cursor([last.created_at.isoformat(), last.id]), total
+
+
+RESTOCK_STATUSES = {OrderStatus.CANCELED, OrderStatus.REJECTED}  # their items go back to stock
+
+
+def restock_orders(session: Session, order_ids: list) -> list[int]:
+    """
+    Put the items of orders back in stock in one UPDATE ... FROM the item quantities summed by book,
+    in the caller's transaction
+    :param order_ids: ids of the orders whose stock is returned, each once
+    :return: ids of the restocked books
+    """
+    items = OrderItem.__table__
+    returned = (select(items.c.book_id, func.sum(items.c.quantity).label("quantity"))
+                .where(items.c.order_id.in_(order_ids))
+                .group_by(items.c.book_id)
+                .subquery())
+    books = Book.__table__
+    return list(session.execute(
+        update(books)
+        .where(books.c.id == returned.c.book_id)
+        .values(quantity=books.c.quantity + returned.c.quantity)
+        .returning(books.c.id)).scalars())
+
+
+@validate_types(order_id=int, user_id=(int, type(None)), is_admin=bool)
+def get_order(session: Session, order_id: int, user_id: int = None, is_admin: bool = False) -> Order:
+    """
+    Get an order with its items and their books, loaded by one joined query
+    :param session: database session
+    :param order_id
+    :param user_id
+    :param is_admin: admins can get any order, users their own
+    :exception: TypeError: function input type error
+        RecordNotFoundError: order_id not found
+        ForbiddenError: the order belongs to another user
+    """
+    order = (session.query(Order)
+             .options(joinedload(Order.items).joinedload(OrderItem.book))
+             .filter(Order.id == order_id)
+             .first())
+    if not order:
+        raise RecordNotFoundError(f"Order with id {order_id} not found")
+
+    # Check for permission
+    if not (is_admin or order.user_id == user_id):
+        raise ForbiddenError("You are not authorized to view this order.")
+    return order
 
 
 @validate_types(order_id=int, status=str, user_id=(int, type(None)), is_admin=bool)
 def update_order_status(session: Session, order_id: int, status: str, user_id: int=None, is_admin: bool = False) -> Order:
     """
     Allow admin to update any order status, while normal user is only able to cancel their orders
+    The items of a canceled or rejected order are put back in stock in the same transaction.
     :param session: database session
     :param order_id
     :param user_id
@@ -108,7 +435,8 @@ def update_order_status(session: Session, order_id: int, status: str, user_id: i
         RecordNotFoundError: order_id not found
         ValueError: status value is invalid
         ForbiddenError: status not follows status transitions
-        InvalidRequestError: user does not have permission to update status
+        InvalidRequestError: user does not have permission to update status, or the status was changed
+            by a concurrent update
         IntegrityError: DB check violation (e.g., FK, constraints)
     """
     order = session.query(Order).filter(Order.id == order_id).first()
@@ -129,7 +457,159 @@ def update_order_status(session: Session, order_id: int, status: str, user_id: i
         if status not in valid_next:
             raise InvalidRequestError(f"Cannot change status from {order.status} to {status}")
 
-    # Update order status
-    order.status = status
+    # Update order status, unless a concurrent update changed it since loaded
+    orders = Order.__table__
+    changed = session.execute(
+        update(orders).where(orders.c.id == order_id, orders.c.status == order.status).values(status=status))
+    if not changed.rowcount:
+        session.rollback()
+        raise InvalidRequestError(f"Order with id {order_id} is no longer {order.status}")
+    restocked = restock_orders(session, [order_id]) if status in RESTOCK_STATUSES else []
     session.commit()
+    if restocked:
+        invalidate_book_caches(session, restocked)
     return order
+
+
+def validate_status_changes(changes: list) -> list:
+    """
+    Validate a list of status changes {"id": 1, "status": "shipping"}, raise ValueError on violations
+    :return: the changes as (order id, status) pairs
+    """
+    if not changes:
+        raise ValueError("Orders can not empty")
+    if len(changes) > ORDER_STATUS_BATCH_MAX:
+        raise ValueError(f"At most {ORDER_STATUS_BATCH_MAX} orders can be updated at once")
+    errors = []
+    for change in changes:
+        validate_required_fields(change, ["id", "status"], errors)
+        validate_field_types(change, {"id": int, "status": str}, errors)
+        if errors:
+            raise ValueError("; ".join(errors))
+    ids = [change["id"] for change in changes]
+    if len(set(ids)) != len(ids):
+        raise ValueError("Each order can be listed once")
+    return [(change["id"], change["status"]) for change in changes]
+
+
+@validate_types(changes=list)
+def update_order_statuses(session: Session, changes: list) -> list[dict]:
+    """
+    Allow admin to update the status of many orders at once, following status transitions
+    The current statuses are loaded by one IN query and the changes are grouped by (current, new) status:
+    each group is one UPDATE ... WHERE id IN (...) AND status = :current, all in a single transaction.
+    An order whose status changed since loaded is not updated.
+    The items of the orders canceled or rejected are put back in stock by one more UPDATE, see restock_orders.
+    :param session: database session
+    :param changes: [{"id": 1, "status": "shipping"}], at most ORDER_STATUS_BATCH_MAX distinct orders
+    :return: result per order, in the order of changes: {"id", "status"} if updated, else {"id", "error"}
+    :exception: TypeError: function input type error
+        ValueError: empty or too many changes, errors about fields (id, status): required fields, field types,
+            order listed twice
+    """
+    pairs = validate_status_changes(changes)
+    current = dict(session.query(Order.id, Order.status).filter(Order.id.in_([oid for oid, _ in pairs])).all())
+
+    errors = {}
+    groups = {}  # (current status, new status) -> order ids
+    for order_id, status in pairs:
+        if order_id not in current:
+            errors[order_id] = f"Order with id {order_id} not found"
+        elif status not in OrderStatus.ALL:
+            errors[order_id] = f"status must be one of: {', '.join(sorted(OrderStatus.ALL))}"
+        elif status not in ORDER_TRANSITIONS.get(current[order_id], []):
+            errors[order_id] = f"Cannot change status from {current[order_id]} to {status}"
+        else:
+            groups.setdefault((current[order_id], status), []).append(order_id)
+
+    orders = Order.__table__
+    to_restock = []
+    for (from_status, to_status), order_ids in groups.items():
+        updated = set(session.execute(
+            update(orders)
+            .where(orders.c.id.in_(order_ids), orders.c.status == from_status)
+            .values(status=to_status)
+            .returning(orders.c.id)).scalars())
+        for order_id in order_ids:
+            if order_id not in updated:
+                errors[order_id] = f"Order with id {order_id} is no longer {from_status}"
+        if to_status in RESTOCK_STATUSES:
+            to_restock += updated
+    restocked = restock_orders(session, to_restock) if to_restock else []
+    session.commit()
+    if restocked:
+        invalidate_book_caches(session, restocked)
+
+    return [{"id": order_id, "error": errors[order_id]} if order_id in errors else {"id": order_id, "status": status}
+            for order_id, status in pairs]
+
+
+@validate_types(filters=OrderFilter, status=str)
+def update_filtered_order_statuses(session: Session, filters: OrderFilter, status: str) -> list[dict]:
+    """
+    Allow admin to move the orders matching a filter to a status, see update_order_statuses
+    :param session: database session
+    :param filters: filters of the orders, matching at most ORDER_STATUS_BATCH_MAX orders
+    :param status: the new status
+    :return: result per matching order, newest first
+    :exception: TypeError: function input type error
+        ValueError: no or too many matching orders
+    """
+    order_ids = [oid for oid, in filters.apply(session.query(Order.id)).limit(ORDER_STATUS_BATCH_MAX + 1)]
+    if len(order_ids) > ORDER_STATUS_BATCH_MAX:
+        raise ValueError(f"At most {ORDER_STATUS_BATCH_MAX} orders can be updated at once, narrow the filter")
+    if not order_ids:
+        return []
+    return update_order_statuses(session, [{"id": order_id, "status": status} for order_id in order_ids])
+
+
+ORDER_EXPORT_FIELDS = ["order_id", "user_id", "status", "created_at", "item_id", "book_id", "quantity", "price_each"]
+
+
+@validate_types(filters=(OrderFilter, type(None)), fmt=str, batch_size=int)
+def export_orders(session: Session, filters: OrderFilter = None, fmt: str = "ndjson",
+                  batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    Stream orders with their items, oldest first, by one joined query
+    NDJSON: one order object per line, with its items; CSV: one line per item (a line without item for an order
+    without items), after a header line.
+    Rows are fetched batch_size at a time from a streamed Core result and written as one chunk,
+    so memory does not grow with the table.
+    :param session: database session, open while the chunks are consumed
+    :param filters: filters of the orders, all orders if None
+    :param fmt: "ndjson" or "csv"
+    :return: generator of encoded chunks
+    :exception: TypeError: function input type error
+    """
+    orders, items = Order.__table__, OrderItem.__table__
+    query = (select(orders.c.id, orders.c.user_id, orders.c.status, orders.c.created_at,
+                    items.c.id, items.c.book_id, items.c.quantity, items.c.price_each)
+             .select_from(orders.outerjoin(items, items.c.order_id == orders.c.id)))
+    if filters is not None:
+        query = filters.filter(query)
+    result = session.execute(query.order_by(orders.c.created_at, orders.c.id, items.c.id)
+                             .execution_options(yield_per=batch_size))
+
+    if fmt == "csv":
+        yield csv_chunk([], ORDER_EXPORT_FIELDS)
+        for rows in result.partitions():
+            yield csv_chunk([(*row[:3], row[3].isoformat(), *row[4:]) for row in rows])
+        return
+
+    # Rows of an order are consecutive, the last order of a batch may continue in the next one
+    current = None
+    for rows in result.partitions():
+        done = []
+        for order_id, user_id, status, created_at, item_id, book_id, quantity, price_each in rows:
+            if current is None or current["id"] != order_id:
+                if current is not None:
+                    done.append(current)
+                current = {"id": order_id, "user_id": user_id, "status": status, "created_at": created_at,
+                           "items": []}
+            if item_id is not None:
+                current["items"].append({"id": item_id, "book_id": book_id, "quantity": quantity,
+                                         "price_each": price_each})
+        if done:
+            yield ndjson_chunk(done)
+    if current is not None:
+        yield ndjson_chunk([current])
@@ -0,0 +1,158 @@
+### book_service/services/reservation_service.py
+"""
+Reservation Service Layer
+
+Holds book stock for a user while they check out, so what they saw available is still there when they order.
+
+Responsibilities:
+    - Validate input types and fields of a hold (book_id, quantity, minutes)
+    - Compute the available stock of a book: quantity - active holds (holds not expired yet), as Book.available
+    - Create holds atomically: the stock check and the insert are one statement
+    - Consume the holds of a user when they place an order, release holds, and sweep expired ones
+    - Raise domain-specific exceptions (ValueError, ForbiddenError, RecordNotFoundError)
+    - Validation order: input type -> required+type+value -> record existence (book) -> stock (business rule)
+    - Uses @validate_types to validate input types and raise ValueError on first error
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.orm import Session
+from sqlalchemy.types import DateTime, Integer
+
+from common.config import RESERVATION_MINUTES_DEFAULT, RESERVATION_MINUTES_MAX, RESERVATION_SWEEP_BATCH
+from common.exceptions import ForbiddenError, RecordNotFoundError
+from ..models import Book, Reservation, utc_now
+from .book_service import invalidate_book_caches
+from ..utils.handlers import validate_types
+from ..utils.utils import validate_field_types, validate_required_fields, validate_non_negative_fields
+
+
+def held_quantity(book_id, now: datetime):
+    """Scalar subquery of the quantity of a book held by active reservations, served by the (book_id, expires_at) index"""
+    return (select(func.coalesce(func.sum(Reservation.quantity), 0))
+            .where(Reservation.book_id == book_id, Reservation.expires_at > now)
+            .scalar_subquery())
+
+
+def validate_reservation_data(data: dict) -> None:
+    """Validate reservation data for required fields, data types and values, raise ValueError on violations"""
+    errors = []
+    validate_required_fields(data, ["book_id", "quantity"], errors)
+    validate_field_types(data, {"book_id": int, "quantity": int, "minutes": int}, errors)
+    if errors:
+        raise ValueError("; ".join(errors))
+
+    validate_non_negative_fields(data, ["book_id"], errors)
+    if data["quantity"] < 1:
+        errors.append("Field 'quantity' must be positive")
+    if "minutes" in data and not 1 <= data["minutes"] <= RESERVATION_MINUTES_MAX:
+        errors.append(f"Field 'minutes' must be between 1 and {RESERVATION_MINUTES_MAX}")
+    if errors:
+        raise ValueError("; ".join(errors))
+
+
+@validate_types(user_id=int, data=dict)
+def create_reservation(session: Session, user_id: int, data: dict) -> Reservation:
+    """
+    Hold a quantity of a book for a user
+    The hold is inserted by one INSERT ... SELECT that also checks the available stock, so concurrent holds and
+    orders can not take more than the stock.
+    :param session: database session
+    :param user_id
+    :param data: {"book_id": 1, "quantity": 2, "minutes": 15}, minutes defaults to RESERVATION_MINUTES_DEFAULT
+    :exception: TypeError: function input type error
+        ValueError: errors about fields (book_id, quantity, minutes): required fields, field types, values
+        RecordNotFoundError: book_id is not existed
+        ValueError: available book quantity is not enough
+    """
+    validate_reservation_data(data)
+    book_id, quantity = data["book_id"], data["quantity"]
+    sweep_expired_reservations(session)
+
+    now = utc_now()
+    expires_at = now + timedelta(minutes=data.get("minutes", RESERVATION_MINUTES_DEFAULT))
+    books = Book.__table__
+    hold = (select(literal(user_id, Integer), books.c.id, literal(quantity, Integer),
+                   literal(now, DateTime), literal(expires_at, DateTime))
+            .where(books.c.id == book_id, books.c.quantity - held_quantity(books.c.id, now) >= quantity))
+    reservations = Reservation.__table__
+    inserted = session.execute(
+        insert(reservations)
+        .from_select(["user_id", "book_id", "quantity", "created_at", "expires_at"], hold)
+        .returning(reservations.c.id)).scalar()
+    if inserted is None:
+        session.rollback()
+        if session.get(Book, book_id) is None:
+            raise RecordNotFoundError(f"Book with id {book_id} not found")
+        raise ValueError(f"Book with id {book_id} quantity not enough")
+    session.commit()
+    # Available stock changed
+    invalidate_book_caches(session, [book_id])
+    return session.get(Reservation, inserted)
+
+
+@validate_types(reservation_id=int, user_id=(int, type(None)), is_admin=bool)
+def release_reservation(session: Session, reservation_id: int, user_id: int = None,
+                        is_admin: bool = False) -> Reservation:
+    """
+    Release a hold before it expires
+    :param session: database session
+    :param reservation_id
+    :param user_id
+    :param is_admin: admins can release any hold, users their own
+    :exception: TypeError: function input type error
+        RecordNotFoundError: reservation_id not found
+        ForbiddenError: the hold belongs to another user
+    """
+    reservation = session.get(Reservation, reservation_id)
+    if reservation is None:
+        raise RecordNotFoundError(f"Reservation with id {reservation_id} not found")
+    if not (is_admin or reservation.user_id == user_id):
+        raise ForbiddenError("You are not authorized to release this reservation.")
+    session.delete(reservation)
+    session.commit()
+    invalidate_book_caches(session, [reservation.book_id])
+    return reservation
+
+
+def consume_reservations(session: Session, user_id: int, reservation_ids: list, quantities: dict,
+                         now: datetime) -> None:
+    """
+    Delete the holds a user orders with, in the caller's transaction, before the stock is decremented
+    so the ordered books are no longer held for them
+    :param reservation_ids: distinct ids of active holds of the user, on books of the order
+    :param quantities: the order {book_id: quantity}
+    :exception: RecordNotFoundError: a hold is not found, expired, or belongs to another user
+        ValueError: a hold is on a book not in the order
+    """
+    holds = dict(session.query(Reservation.id, Reservation.book_id)
+                 .filter(Reservation.id.in_(reservation_ids), Reservation.user_id == user_id,
+                         Reservation.expires_at > now).all())
+    for reservation_id in reservation_ids:
+        if reservation_id not in holds:
+            raise RecordNotFoundError(f"Reservation with id {reservation_id} not found")
+        if holds[reservation_id] not in quantities:
+            raise ValueError(f"Reservation with id {reservation_id} is not for a book of the order")
+
+    # Expired or consumed by a concurrent order since loaded
+    result = session.execute(delete(Reservation).where(Reservation.id.in_(reservation_ids),
+                                                       Reservation.expires_at > now))
+    if result.rowcount != len(reservation_ids):
+        session.rollback()
+        raise RecordNotFoundError("Reservation not found")
+
+
+def sweep_expired_reservations(session: Session, batch: int = RESERVATION_SWEEP_BATCH) -> int:
+    """
+    Delete up to batch expired holds, oldest first, walking the expires_at index from its start
+    Expired holds no longer count in the available stock, the sweep only reclaims their rows.
+    :param session: database session
+    :return: count of deleted holds
+    """
+    expired = (select(Reservation.id)
+               .where(Reservation.expires_at <= utc_now())
+               .order_by(Reservation.expires_at)
+               .limit(batch))
+    deleted = session.execute(delete(Reservation).where(Reservation.id.in_(expired))).rowcount
+    session.commit()
+    return deleted
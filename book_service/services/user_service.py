@@ -19,7 +19,6 @@ Responsibilities:
 import re
 from typing import Type
 
-from passlib.hash import bcrypt
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
@@ -159,7 +158,7 @@ def update_user(session: Session, user_id: int, updates: dict) -> User:
             setattr(user, k, updates[k])
 
     if updates.get('password'):
-        user.password = bcrypt.hash(user.password)
+        user.password = hash_password(user.password)
     session.commit()
     return user
 
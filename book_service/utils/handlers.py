@@ -5,7 +5,7 @@ from flask import jsonify, request
 from sqlalchemy.exc import IntegrityError, InvalidRequestError
 from werkzeug.exceptions import BadRequest
 
-from common.exceptions import ForbiddenError, RecordNotFoundError
+from common.exceptions import ForbiddenError, RecordNotFoundError, ConflictError, ServiceUnavailableError
 
 
 def handle_exceptions(f):
@@ -24,6 +24,10 @@ def handle_exceptions(f):
             return jsonify({"error": f"{ir}"}), 400
         except RecordNotFoundError as rnf:
             return jsonify({"error": f'{rnf}'}), 404
+        except ConflictError as ce:
+            return jsonify({"error": str(ce)}), 409
+        except ServiceUnavailableError as su:
+            return jsonify({"error": str(su)}), 503, {"Retry-After": "1"}
         except BadRequest as e:
             # Often triggered by malformed JSON
             return jsonify({"error": str(e.description)}), 400
@@ -1,4 +1,11 @@
 ## book_service/utils/utils.py
+import base64
+import binascii
+import csv
+import io
+import json
+from datetime import datetime, timezone
+
 from sqlalchemy.orm import class_mapper
 
 def is_empty(value):
@@ -35,3 +42,121 @@ def filter_valid_model_fields(model_class, data: dict) -> dict:
     valid_keys = {prop.key for prop in class_mapper(model_class).iterate_properties}
     return {k: v for k, v in data.items() if k in valid_keys and k!="id"}
 
+
+def parse_limit(value, default: int, maximum: int) -> int:
+    """Parse the page size query parameter, raise ValueError when it is not an integer in [1, maximum]"""
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("Query parameter 'limit' must be an integer")
+    if not 1 <= limit <= maximum:
+        raise ValueError(f"Query parameter 'limit' must be between 1 and {maximum}")
+    return limit
+
+
+def parse_ids(value: str, maximum: int) -> list[int]:
+    """Parse a comma-separated ids query parameter into distinct ids in order, raise ValueError when it is invalid"""
+    try:
+        ids = [int(v) for v in value.split(",")]
+    except ValueError:
+        raise ValueError("Query parameter 'ids' must be a comma-separated list of integers")
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > maximum:
+        raise ValueError(f"Query parameter 'ids' accepts at most {maximum} ids")
+    return ids
+
+
+def parse_timestamp(value: str) -> datetime:
+    """
+    Parse an ISO 8601 date or datetime query parameter into a naive UTC datetime, as timestamps are stored
+    Raise ValueError when it is malformed
+    """
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def encode_cursor(values: list) -> str:
+    """Encode the keyset values of the last row of a page into an opaque cursor"""
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """Decode a cursor made by encode_cursor, raise ValueError when it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def ndjson_chunk(rows: list) -> bytes:
+    """Encode dict rows as newline-delimited JSON, datetimes in ISO 8601"""
+    return "".join(json.dumps(row, separators=(",", ":"), default=datetime.isoformat) + "\n"
+                   for row in rows).encode()
+
+
+def csv_chunk(rows: list, header: list = None) -> bytes:
+    """Encode tuple rows as CSV lines, after a header line if given"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(header)
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def iter_ndjson_rows(stream):
+    """
+    Parse newline-delimited JSON objects from a text stream, one line at a time
+    :return: generator of (line number, row dict or None, parse error or None)
+    """
+    for line_no, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_no, None, "Invalid JSON"
+            continue
+        if not isinstance(row, dict):
+            yield line_no, None, "Row must be a JSON object"
+            continue
+        yield line_no, row, None
+
+
+def iter_csv_rows(stream, field_types: dict):
+    """
+    Parse CSV rows with a header line from a text stream, one row at a time
+    Empty cells are left out; cells of typed fields are converted when possible, so that
+    validate_field_types reports the ones that are not.
+    :param field_types: {field: int or float} conversions
+    :return: generator of (line number, row dict or None, parse error or None)
+    """
+    reader = csv.DictReader(stream)
+    try:
+        for raw in reader:
+            if None in raw:
+                yield reader.line_num, None, "Row has more cells than the header"
+                continue
+            row = {}
+            for field, value in raw.items():
+                if value is None or value == "":
+                    continue
+                if field in field_types:
+                    try:
+                        value = field_types[field](value)
+                    except ValueError:
+                        pass
+                row[field] = value
+            yield reader.line_num, row, None
+    except csv.Error as e:
+        yield reader.line_num, None, f"Invalid CSV: {e}"
+
@@ -1,6 +1,230 @@
+## common/auth.py
+"""
+Password hashing shared by the services
+
+bcrypt costs hundreds of milliseconds of CPU per call. PasswordHasher runs it in a pool of worker processes so
+a burst of logins does not hold the GIL of the request threads:
+    - at most workers + max_pending calls are in flight, further calls fail fast with ServiceUnavailableError (503)
+    - a call waits timeout seconds for its result, then fails with ServiceUnavailableError
+    - a pool broken by a dead worker fails its calls with ServiceUnavailableError, the next call starts a new pool
+    - stats() reports the queue depth and hash latency
+New hashes use PASSWORD_HASH_ROUNDS, calibrated for the hardware by calibrate_rounds:
+    python -m common.auth [--target-ms 250] [--write]  # --write stores the rounds in the .env file
+"""
+import argparse
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
 from passlib.hash import bcrypt
 
+from common.config import BASE_DIR, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE, PASSWORD_HASH_TIMEOUT, \
+    PASSWORD_HASH_ROUNDS, PASSWORD_HASH_TARGET_MS
+from common.exceptions import ServiceUnavailableError
+
+
+MIN_ROUNDS = 10  # calibration never goes below this cost, whatever the target
+MAX_ROUNDS = 16
+
+
+def _bcrypt_hash(raw_password, rounds=PASSWORD_HASH_ROUNDS):
+    return bcrypt.using(rounds=rounds).hash(raw_password)
+
+
+def _bcrypt_verify(raw_password, hashed_password):
+    return bcrypt.verify(raw_password, hashed_password)
+
+
+class PasswordHasher:
+    """bcrypt in a bounded pool of worker processes, created on first use in each process"""
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_QUEUE,
+                 timeout: float = PASSWORD_HASH_TIMEOUT, rounds: int = PASSWORD_HASH_ROUNDS):
+        """
+        :param workers: worker processes, 0 runs bcrypt in the calling thread (still bounded and measured)
+        :param max_pending: calls waiting for a busy worker before new calls are rejected
+        :param timeout: seconds a call waits for its result
+        :param rounds: bcrypt cost of new hashes
+        """
+        self.workers = workers
+        self.rounds = rounds
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._pid = os.getpid()
+        self._executor = None
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._broken = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    def hash(self, raw_password: str) -> str:
+        return self._run(_bcrypt_hash, raw_password, self.rounds)
+
+    def verify(self, raw_password: str, hashed_password: str) -> bool:
+        return self._run(_bcrypt_verify, raw_password, hashed_password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """Whether a hash was made with other parameters than the current policy (only parses the hash)"""
+        return bcrypt.using(rounds=self.rounds).needs_update(hashed_password)
+
+    def _run(self, fn, *args):
+        """
+        Run fn in a worker, raise ServiceUnavailableError if the pool is saturated or broken, or the result is late
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker: the parent's pool and counters are not ours
+                self._reset()
+            if self._in_flight >= self.workers + self.max_pending:
+                self._rejected += 1
+                raise ServiceUnavailableError("Password hashing is busy, please retry later")
+            self._in_flight += 1
+            executor = self._get_executor()
+
+        started = time.perf_counter()
+        if executor is None:
+            try:
+                return fn(*args)
+            finally:
+                self._done(started)
+
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._done(started)
+            self._discard(executor)
+            raise ServiceUnavailableError("Password hashing failed, please retry later")
+        except Exception:
+            self._done(started)
+            raise
+        # The slot is held until the worker is done, even by a call that timed out
+        future.add_done_callback(lambda f: self._done(started))
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            with self._lock:
+                self._timeouts += 1
+            raise ServiceUnavailableError("Password hashing timed out, please retry later")
+        except BrokenProcessPool:
+            self._discard(executor)
+            raise ServiceUnavailableError("Password hashing failed, please retry later")
+
+    def _get_executor(self):
+        if self.workers > 0 and self._executor is None:
+            # spawn: forking a process with request threads running is not safe
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def _discard(self, executor: ProcessPoolExecutor) -> None:
+        """Drop a broken pool (a worker died), unless another call already replaced it"""
+        with self._lock:
+            self._broken += 1
+            if self._executor is not executor:
+                return
+            self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _done(self, started: float) -> None:
+        latency = time.perf_counter() - started
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+            self._latency_total += latency
+            self._latency_max = max(self._latency_max, latency)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        """Queue depth (calls in flight, running or waiting) and hash latency (seconds, queueing included)"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "in_flight": self._in_flight,
+                "queued": max(self._in_flight - max(self.workers, 1), 0),
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "timeouts": self._timeouts,
+                "broken": self._broken,
+                "latency_avg": self._latency_total / self._completed if self._completed else 0.0,
+                "latency_max": self._latency_max,
+            }
+
+
+password_hasher = PasswordHasher()
+atexit.register(password_hasher.shutdown)
+
 
 def hash_password(raw_password):
-    return bcrypt.hash(raw_password)
+    return password_hasher.hash(raw_password)
+
+
+def verify_password(raw_password, hashed_password) -> bool:
+    return password_hasher.verify(raw_password, hashed_password)
+
+
+def needs_rehash(hashed_password) -> bool:
+    return password_hasher.needs_rehash(hashed_password)
+
+
+def measure_hash_ms(rounds: int, samples: int = 3) -> float:
+    """Best time in milliseconds of hashing a password at a cost, in this process"""
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        _bcrypt_hash("calibration password", rounds)
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings)
+
+
+def calibrate_rounds(target_ms: float = PASSWORD_HASH_TARGET_MS, min_rounds: int = MIN_ROUNDS,
+                     max_rounds: int = MAX_ROUNDS, measure=measure_hash_ms) -> int:
+    """
+    Pick the highest bcrypt cost whose hash time stays within a target
+    Each round doubles the hash time, so the search stops at the first cost over the target.
+    :param target_ms: latency target of one hash, in milliseconds
+    :param min_rounds: cost returned even if it misses the target
+    :param max_rounds: highest cost tried
+    :param measure: function returning the hash time in milliseconds at a cost
+    :return: rounds
+    """
+    rounds = min_rounds
+    while rounds < max_rounds and measure(rounds + 1) <= target_ms:
+        rounds += 1
+    return rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate the bcrypt cost (PASSWORD_HASH_ROUNDS) on this machine")
+    parser.add_argument("--target-ms", type=float, default=PASSWORD_HASH_TARGET_MS)
+    parser.add_argument("--write", action="store_true", help="store PASSWORD_HASH_ROUNDS in the .env file")
+    args = parser.parse_args()
+
+    rounds = calibrate_rounds(args.target_ms)
+    print(f"PASSWORD_HASH_ROUNDS={rounds}  # {measure_hash_ms(rounds):.0f} ms per hash, "
+          f"target {args.target_ms:.0f} ms")
+    if args.write:
+        from dotenv import set_key
+        env_file = os.path.join(BASE_DIR, ".env")
+        set_key(env_file, "PASSWORD_HASH_ROUNDS", str(rounds), quote_mode="never")
+        print(f"Written to {env_file}")
+
 
+if __name__ == '__main__':
+    main()
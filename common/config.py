@@ -25,6 +25,79 @@ BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 DB_NAME = DBS[RUNNING_ENV]
 DB_PATH = os.path.join(BASE_DIR, DB_NAME)
 
+# Engine and connection pool, one per process
+DB_ECHO = os.environ.get('DB_ECHO', 'false').lower() == 'true'
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))  # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', -1))  # seconds, -1 never recycles
+
+# SQLite pragma profiles, applied on every new connection
+SQLITE_PRAGMA_PROFILES = {
+    # SQLite defaults: rollback journal, readers block writers
+    'baseline': {
+        'foreign_keys': 'ON',
+    },
+    # WAL lets readers run alongside the single writer, commits fsync only at checkpoints
+    'performance': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 268435456,  # 256 MiB
+        'cache_size': -65536,  # negative is KiB: 64 MiB page cache per connection
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,  # ms to wait for the write lock before "database is locked"
+        'foreign_keys': 'ON',
+    },
+}
+SQLITE_PRAGMA_PROFILE = os.environ.get('SQLITE_PRAGMA_PROFILE', 'performance')
+
+if SQLITE_PRAGMA_PROFILE not in SQLITE_PRAGMA_PROFILES:
+    raise ValueError(f"Invalid SQLITE_PRAGMA_PROFILE: {SQLITE_PRAGMA_PROFILE}")
+
+# List endpoints pagination
+PAGE_SIZE_DEFAULT = int(os.environ.get('PAGE_SIZE_DEFAULT', 50))
+PAGE_SIZE_MAX = int(os.environ.get('PAGE_SIZE_MAX', 500))
+# GET /books without limit/after returns the whole catalog as a bare list (pre-pagination clients)
+LEGACY_BOOK_LIST = os.environ.get('LEGACY_BOOK_LIST', 'true').lower() == 'true'
+# GET /orders without limit/after returns every matching order as a bare list (pre-pagination clients)
+LEGACY_ORDER_LIST = os.environ.get('LEGACY_ORDER_LIST', 'true').lower() == 'true'
+
+# POST /orders: how long a used Idempotency-Key replays its response
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 24 * 3600))  # seconds
+
+# PUT /orders/status: orders changed per request
+ORDER_STATUS_BATCH_MAX = int(os.environ.get('ORDER_STATUS_BATCH_MAX', 1000))
+
+# POST /reservations: hold duration in minutes, and expired holds deleted per sweep
+RESERVATION_MINUTES_DEFAULT = int(os.environ.get('RESERVATION_MINUTES_DEFAULT', 15))
+RESERVATION_MINUTES_MAX = int(os.environ.get('RESERVATION_MINUTES_MAX', 60))
+RESERVATION_SWEEP_BATCH = int(os.environ.get('RESERVATION_SWEEP_BATCH', 500))
+
+# POST /books/bulk: rows per upsert transaction, per-row errors listed in the report
+BULK_IMPORT_BATCH_SIZE = int(os.environ.get('BULK_IMPORT_BATCH_SIZE', 1000))
+BULK_IMPORT_MAX_ERRORS = int(os.environ.get('BULK_IMPORT_MAX_ERRORS', 1000))
+# GET /export/*: rows fetched from the database and written to the response per chunk
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+
+# Password hashing (bcrypt) off the request threads: worker processes (0 hashes in the calling thread),
+# calls waiting for a worker before new ones are rejected with 503, seconds a call waits for its result
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 16))
+PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+# bcrypt cost of new hashes, pick it with `python -m common.auth --write`; older hashes are upgraded on login
+PASSWORD_HASH_ROUNDS = int(os.environ.get('PASSWORD_HASH_ROUNDS', 12))
+PASSWORD_HASH_TARGET_MS = float(os.environ.get('PASSWORD_HASH_TARGET_MS', 250))  # calibration target per hash
+
+# Book search ranking: bm25 weight of each indexed column (name, publisher, code)
+BOOK_SEARCH_WEIGHTS = (10.0, 2.0, 5.0)
+
+# In-process catalog cache of GET /books, per worker
+CATALOG_CACHE_TTL = float(os.environ.get('CATALOG_CACHE_TTL', 30))  # seconds, bounds staleness across workers
+CATALOG_CACHE_MAX_ENTRIES = int(os.environ.get('CATALOG_CACHE_MAX_ENTRIES', 256))
+# In-process cache of serialized books by id (GET /books/<id>, GET /books?ids=), per worker
+BOOK_CACHE_TTL = float(os.environ.get('BOOK_CACHE_TTL', 30))  # seconds, bounds staleness across workers
+BOOK_CACHE_MAX_ENTRIES = int(os.environ.get('BOOK_CACHE_MAX_ENTRIES', 10000))
+
 # Secret key for test API
 TEST_SECRET_KEY = "super-secret"
 
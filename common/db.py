@@ -0,0 +1,95 @@
+## common/db.py
+"""
+Shared database plumbing for the services
+
+Each process owns one pooled engine and one request-scoped session registry, created by create_app.
+Sessions are handed out per request by get_session() and removed in teardown_appcontext.
+"""
+import os
+import weakref
+
+from flask import current_app
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from common.config import DB_PATH, DB_ECHO, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, \
+    SQLITE_PRAGMA_PROFILE, SQLITE_PRAGMA_PROFILES
+
+
+def create_default_engine(db_path: str = DB_PATH, pragma_profile: str = SQLITE_PRAGMA_PROFILE) -> Engine:
+    """
+    Create the pooled engine for the configured database file
+    :param db_path: path of the SQLite database file
+    :param pragma_profile: name of the SQLITE_PRAGMA_PROFILES entry applied to each connection
+    """
+    engine = create_engine(f"sqlite:///{db_path}",
+                           echo=DB_ECHO,
+                           pool_size=DB_POOL_SIZE,
+                           max_overflow=DB_MAX_OVERFLOW,
+                           pool_timeout=DB_POOL_TIMEOUT,
+                           pool_recycle=DB_POOL_RECYCLE)
+    apply_sqlite_pragmas(engine, pragma_profile)
+    dispose_after_fork(engine)
+    return engine
+
+
+def apply_sqlite_pragmas(engine: Engine, pragma_profile: str = SQLITE_PRAGMA_PROFILE) -> None:
+    """
+    Run the pragmas of a profile on every new DBAPI connection of the engine
+    :param engine: SQLite engine
+    :param pragma_profile: name of the SQLITE_PRAGMA_PROFILES entry
+    :exception: ValueError: unknown profile name
+    """
+    if pragma_profile not in SQLITE_PRAGMA_PROFILES:
+        raise ValueError(f"Unknown SQLite pragma profile: {pragma_profile}")
+    pragmas = SQLITE_PRAGMA_PROFILES[pragma_profile]
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def dispose_after_fork(engine: Engine) -> None:
+    """
+    Drop the pooled connections inherited by a forked worker (e.g. gunicorn --preload),
+    so the child opens its own connections instead of sharing the parent's file handles
+    """
+    engine_ref = weakref.ref(engine)
+
+    def _dispose_in_child():
+        inherited = engine_ref()
+        if inherited is not None:
+            # close=False: leave the parent's connections alone, just forget them in the child
+            inherited.dispose(close=False)
+
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_dispose_in_child)
+
+
+def init_app_db(app, session_factory=None) -> scoped_session:
+    """
+    Install the process-wide session registry on a Flask app
+    :param app: Flask application
+    :param session_factory: sessionmaker to use (tests), default is bound to the pooled engine
+    """
+    if session_factory is None:
+        session_factory = sessionmaker(bind=create_default_engine())
+    registry = scoped_session(session_factory)
+    app.config["SESSION_FACTORY"] = session_factory
+    app.config["SESSION_REGISTRY"] = registry
+
+    @app.teardown_appcontext
+    def remove_session(exception=None):
+        # Return the request's connection to the pool
+        registry.remove()
+
+    return registry
+
+
+def get_session():
+    """Return the session of the current request"""
+    return current_app.config["SESSION_REGISTRY"]()
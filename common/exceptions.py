@@ -5,3 +5,11 @@ class ForbiddenError(Exception):
 class RecordNotFoundError(Exception):
     """Raised when a database record is not found."""
     pass
+
+class ConflictError(Exception):
+    """Raised when the request conflicts with the current state of a resource"""
+    pass
+
+class ServiceUnavailableError(Exception):
+    """Raised when a shared resource is saturated and the request should be retried later"""
+    pass
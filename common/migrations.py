@@ -0,0 +1,160 @@
+## common/migrations.py
+"""
+Versioned schema migrations for the shared SQLite database
+
+Base.metadata.create_all only creates missing tables, it never changes an existing schema.
+Migrations run once each, in version order, and the applied version is kept in PRAGMA user_version.
+Every migration must be idempotent (IF NOT EXISTS, ...) because a fresh schema built by create_all
+already matches the models.
+
+Usage:
+    python -m common.migrations  # upgrade the configured database to the latest version
+"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.engine import Connection, Engine
+
+MIGRATIONS = []  # (version, description, upgrade function), registered with @migration
+
+
+def migration(version: int, description: str):
+    """Register an upgrade function for a schema version"""
+    def inner_decorator(fn):
+        if any(v == version for v, _, _ in MIGRATIONS):
+            raise ValueError(f"Duplicate migration version: {version}")
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return inner_decorator
+
+
+def latest_version() -> int:
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def get_schema_version(conn: Connection) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def upgrade(engine: Engine) -> int:
+    """
+    Apply the pending migrations
+    :param engine: database engine
+    :return: the schema version after upgrade
+    """
+    with engine.begin() as conn:
+        current = get_schema_version(conn)
+        for version, description, fn in MIGRATIONS:
+            if version <= current:
+                continue
+            fn(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {version}")
+            current = version
+            print(f"Applied migration {version}: {description}")
+    return current
+
+
+@migration(1, "Index order foreign keys and filter columns")
+def _index_orders(conn: Connection):
+    # (user_id, created_at) also serves lookups on user_id alone
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_orders_user_id_created_at ON orders (user_id, created_at)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_orders_status ON orders (status)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_order_items_order_id ON order_items (order_id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_order_items_book_id ON order_items (book_id)")
+
+
+@migration(2, "Full-text index over book name, publisher and code")
+def _books_fts(conn: Connection):
+    # External content table: the index stores only tokens, rows are read from books by rowid
+    conn.exec_driver_sql("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+            name, publisher, code,
+            content='books', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )""")
+    # Triggers keep the index in sync with every write to books, ORM or not
+    conn.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, name, publisher, code) VALUES (new.id, new.name, new.publisher, new.code);
+        END""")
+    conn.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, name, publisher, code)
+            VALUES ('delete', old.id, old.name, old.publisher, old.code);
+        END""")
+    conn.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF name, publisher, code ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, name, publisher, code)
+            VALUES ('delete', old.id, old.name, old.publisher, old.code);
+            INSERT INTO books_fts (rowid, name, publisher, code) VALUES (new.id, new.name, new.publisher, new.code);
+        END""")
+    # Index the existing rows
+    conn.exec_driver_sql("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+
+
+@migration(3, "Index book filter and sort columns")
+def _index_books(conn: Connection):
+    # Index entries end with the rowid (books.id), so each index also serves the "ORDER BY <column>, id" keyset
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_books_publisher_sell_price ON books (publisher, sell_price)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_books_sell_price ON books (sell_price)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_books_name ON books (name)")
+    # Partial index: only in-stock rows, walked in id order
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_books_in_stock ON books (id) WHERE quantity > 0")
+
+
+@migration(4, "Index order lists by time")
+def _index_orders_by_time(conn: Connection):
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_orders_status_created_at ON orders (status, created_at)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_orders_created_at ON orders (created_at)")
+    # Superseded: the prefix of ix_orders_status_created_at serves the same lookups
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_orders_status")
+
+
+@migration(5, "Backfill per-order timestamps")
+def _backfill_order_timestamps(conn: Connection):
+    # created_at used to default to the import time of the worker, so a worker's orders share one timestamp,
+    # the time it started. The real times are lost: the orders of a shared timestamp are spread by
+    # 1 microsecond each in id (insertion) order, so lists by time keep the order in which they were placed.
+    # Orders without a timestamp get one just after the order placed before them.
+    rows = conn.exec_driver_sql("SELECT id, created_at FROM orders ORDER BY id").fetchall()
+    seen = set()  # timestamps stored or assigned so far
+    previous = None
+    updates = []
+    for order_id, stored in rows:
+        if stored is None:
+            created_at = previous + timedelta(microseconds=1) if previous else datetime.now(timezone.utc).replace(tzinfo=None)
+        else:
+            try:
+                created_at = datetime.fromisoformat(stored)
+            except ValueError:
+                continue
+            if created_at not in seen:
+                seen.add(created_at)
+                previous = created_at
+                continue
+        while created_at in seen:
+            created_at += timedelta(microseconds=1)
+        seen.add(created_at)
+        updates.append({"id": order_id, "created_at": created_at.strftime("%Y-%m-%d %H:%M:%S.%f")})
+        previous = created_at
+    if updates:
+        conn.exec_driver_sql("UPDATE orders SET created_at = :created_at WHERE id = :id", updates)
+
+
+def init_schema(engine: Engine) -> int:
+    """
+    Create missing tables from the models, then apply pending migrations
+    :param engine: database engine
+    :return: the schema version
+    """
+    # Register every model on the shared Base
+    import book_service.models  # noqa: F401
+    from common.models import Base
+
+    Base.metadata.create_all(engine)
+    return upgrade(engine)
+
+
+if __name__ == '__main__':
+    from common.db import create_default_engine
+    print(f"Schema version: {init_schema(create_default_engine())}")
@@ -1,9 +1,8 @@
 ## common/models.py
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, Integer, String
-from passlib.hash import bcrypt
+from sqlalchemy import Column, DateTime, Float, Integer, String
 
-from common.auth import hash_password
+from common.auth import hash_password, verify_password
 
 Base = declarative_base()
 
@@ -15,7 +14,7 @@ class User(Base):
     role = Column(String, default='user')
 
     def verify_password(self, raw_password) -> bool:
-        return bcrypt.verify(raw_password, self.password)
+        return verify_password(raw_password, self.password)
 
     def set_password(self, raw_password):
         self.password = hash_password(raw_password)
@@ -26,3 +25,19 @@ class User(Base):
             "username": self.username,
             "role": self.role
         }
+
+
+class AuthCode(Base):
+    """Authorization code issued by /authorize, redeemed once by /token before it expires"""
+    __tablename__ = 'auth_codes'
+    code = Column(String, primary_key=True)
+    username = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class LoginBucket(Base):
+    """Token bucket of /authorize attempts for a key ("user:<username>" or "ip:<address>"), shared by the workers"""
+    __tablename__ = 'login_buckets'
+    key = Column(String, primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False, index=True)  # epoch seconds of the last update
@@ -0,0 +1,14 @@
+## tests/auth_service/integration/conftest.py
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from common.db import create_default_engine
+from common.migrations import init_schema
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_default_engine(str(tmp_path / "auth.db"), pragma_profile="performance")
+    init_schema(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
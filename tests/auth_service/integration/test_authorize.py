@@ -0,0 +1,65 @@
+## tests/auth_service/integration/test_authorize.py
+from unittest.mock import Mock
+
+import pytest
+
+from auth_service.app import create_app
+from auth_service.rate_limit import LoginThrottle, MemoryTokenBuckets
+from common.auth import _bcrypt_hash, password_hasher
+from common.models import User
+from tests.utils.clock import FakeClock
+
+
+@pytest.fixture
+def client(session_factory, monkeypatch):
+    monkeypatch.setattr(password_hasher, "rounds", 5)
+    with session_factory() as session:
+        session.add(User(username="admin", password=_bcrypt_hash("admin", 4), role="admin"))
+        session.commit()
+    return create_app(session_factory).test_client()
+
+
+def stored_hash(session_factory):
+    with session_factory() as session:
+        return session.query(User).filter_by(username="admin").one().password
+
+
+def test_authorize_rehashes_password_under_old_policy(client, session_factory):
+    assert stored_hash(session_factory).startswith("$2b$04$")
+    res = client.post("/authorize", json={"username": "admin", "password": "admin"})
+    assert res.status_code == 200
+    upgraded = stored_hash(session_factory)
+    assert upgraded.startswith("$2b$05$")
+
+    assert client.post("/authorize", json={"username": "admin", "password": "admin"}).status_code == 200
+    assert stored_hash(session_factory) == upgraded
+
+
+def test_authorize_wrong_password_keeps_hash(client, session_factory):
+    res = client.post("/authorize", json={"username": "admin", "password": "wrong"})
+    assert res.status_code == 401
+    assert stored_hash(session_factory).startswith("$2b$04$")
+
+
+def test_authorize_unsuccessful_password_hashing_busy(client, monkeypatch):
+    monkeypatch.setattr(password_hasher, "max_pending", -password_hasher.workers)
+    res = client.post("/authorize", json={"username": "admin", "password": "admin"})
+    assert res.status_code == 503
+    assert res.headers["Retry-After"] == "1"
+    assert res.json == {"error": "Password hashing is busy, please retry later"}
+
+
+def test_authorize_unsuccessful_too_many_attempts(client, monkeypatch):
+    clock = FakeClock()
+    client.application.config["LOGIN_THROTTLE"] = LoginThrottle(MemoryTokenBuckets(10, 1, clock),
+                                                                MemoryTokenBuckets(2, 0.1, clock))
+    assert client.post("/authorize", json={"username": "admin", "password": "wrong"}).status_code == 401
+    assert client.post("/authorize", json={"username": "admin", "password": "admin"}).status_code == 200
+
+    # Throttled before the password is checked
+    monkeypatch.setattr(User, "verify_password", Mock(side_effect=AssertionError("bcrypt must not run")))
+    res = client.post("/authorize", json={"username": "admin", "password": "admin"})
+    assert res.status_code == 429
+    assert res.headers["Retry-After"] == "10"
+    assert res.json == {"error": "Too many login attempts, please retry later"}
+    assert client.post("/authorize", json={"username": "other", "password": "x"}).status_code == 401
@@ -0,0 +1,63 @@
+## tests/auth_service/integration/test_code_store.py
+import threading
+
+from auth_service.app import create_app
+from auth_service.code_store import SQLiteCodeStore
+from auth_service.config import CLIENT_ID, CLIENT_SECRET
+from common.models import AuthCode, User
+
+
+def test_sqlite_code_store_pops_once(session_factory):
+    store = SQLiteCodeStore(session_factory)
+    store.put("code", "admin")
+    assert store.pop("code") == "admin"
+    assert store.pop("code") is None
+    assert store.pop("unknown") is None
+
+
+def test_sqlite_code_store_expires_and_sweeps_codes(session_factory):
+    store = SQLiteCodeStore(session_factory)
+    store.put("expired", "admin", ttl=-1)
+    assert store.pop("expired") is None
+    store.put("other", "admin", ttl=-1)
+    store.put("fresh", "admin")
+    with session_factory() as session:
+        assert [c.code for c in session.query(AuthCode)] == ["fresh"]
+
+
+def test_sqlite_code_store_concurrent_pops_redeem_once(session_factory):
+    store = SQLiteCodeStore(session_factory)
+    store.put("code", "admin")
+    usernames = []
+    start = threading.Barrier(8)
+
+    def redeem():
+        start.wait()
+        usernames.append(store.pop("code"))
+
+    threads = [threading.Thread(target=redeem) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert usernames.count("admin") == 1 and usernames.count(None) == 7
+
+
+def test_code_from_one_worker_redeemed_by_another(session_factory):
+    with session_factory() as session:
+        user = User(username="admin", role="admin")
+        user.set_password("admin")
+        session.add(user)
+        session.commit()
+    authorizer = create_app(session_factory).test_client()
+    issuer = create_app(session_factory).test_client()
+
+    code = authorizer.post("/authorize", json={"username": "admin", "password": "admin"}).json["code"]
+    exchange = {"client_id": CLIENT_ID, "client_secret": CLIENT_SECRET, "code": code}
+    res = issuer.post("/token", json=exchange)
+    assert res.status_code == 200
+    assert res.json["role"] == "admin"
+
+    res = authorizer.post("/token", json=exchange)
+    assert res.status_code == 401
+    assert res.json == {"error": "Invalid grant"}
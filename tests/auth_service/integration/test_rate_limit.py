@@ -0,0 +1,50 @@
+## tests/auth_service/integration/test_rate_limit.py
+import threading
+
+import pytest
+
+from auth_service.rate_limit import SQLiteTokenBuckets
+from common.models import LoginBucket
+from tests.utils.clock import FakeClock
+
+
+def test_sqlite_buckets_allow_burst_then_refill(session_factory):
+    clock = FakeClock()
+    buckets = SQLiteTokenBuckets(session_factory, "user:", 3, 0.5, clock)
+    assert [buckets.take("a") for _ in range(3)] == [0, 0, 0]
+    assert buckets.take("a") == pytest.approx(2)
+    assert buckets.take("b") == 0
+    clock.now += 2
+    assert buckets.take("a") == 0
+    assert buckets.take("a") == pytest.approx(2)
+    with session_factory() as session:
+        assert sorted(b.key for b in session.query(LoginBucket)) == ["user:a", "user:b"]
+
+
+def test_sqlite_buckets_sweep_only_own_idle_buckets(session_factory):
+    clock = FakeClock()
+    by_ip = SQLiteTokenBuckets(session_factory, "ip:", 2, 1, clock, sweep_interval=10)
+    by_user = SQLiteTokenBuckets(session_factory, "user:", 2, 0.01, clock, sweep_interval=10)
+    by_ip.take("10.0.0.1")
+    by_user.take("admin")
+    clock.now += 10
+    by_ip.take("10.0.0.2")
+    with session_factory() as session:
+        assert sorted(b.key for b in session.query(LoginBucket)) == ["ip:10.0.0.2", "user:admin"]
+
+
+def test_sqlite_buckets_concurrent_takes_never_exceed_burst(session_factory):
+    buckets = SQLiteTokenBuckets(session_factory, "user:", 5, 0.001)
+    waits = []
+    start = threading.Barrier(12)
+
+    def attempt():
+        start.wait()
+        waits.append(buckets.take("admin"))
+
+    threads = [threading.Thread(target=attempt) for _ in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert waits.count(0) == 5
@@ -0,0 +1,51 @@
+## tests/auth_service/unit/test_code_store.py
+import pytest
+
+from auth_service.code_store import CodeStore, MemoryCodeStore, SQLiteCodeStore, create_code_store
+from tests.utils.clock import FakeClock
+
+
+def test_memory_code_store_pops_once():
+    store = MemoryCodeStore()
+    store.put("code", "admin")
+    assert store.pop("code") == "admin"
+    assert store.pop("code") is None
+    assert store.pop("unknown") is None
+
+
+def test_memory_code_store_expires_codes():
+    clock = FakeClock(now=0.0)
+    store = MemoryCodeStore(clock)
+    store.put("old", "admin", ttl=10)
+    clock.now = 5
+    store.put("new", "user", ttl=10)
+    clock.now = 10
+    assert store.pop("old") is None
+    assert store.pop("new") == "user"
+
+
+def test_memory_code_store_drops_expired_codes_lazily():
+    clock = FakeClock(now=0.0)
+    store = MemoryCodeStore(clock)
+    for i in range(100):
+        store.put(f"code{i}", "admin", ttl=10)
+    assert len(store) == 100
+    clock.now = 11
+    store.put("fresh", "admin", ttl=10)
+    assert len(store) == 1
+
+
+def test_create_code_store():
+    assert isinstance(create_code_store("memory", None), MemoryCodeStore)
+    assert isinstance(create_code_store("sqlite", None), SQLiteCodeStore)
+    with pytest.raises(ValueError, match="Unknown authorization code store: redis"):
+        create_code_store("redis", None)
+
+
+def test_incomplete_code_store_fails_on_instantiation():
+    class PutOnly(CodeStore):
+        def put(self, code, username, ttl=60):
+            pass
+
+    with pytest.raises(TypeError, match="abstract"):
+        PutOnly()
@@ -0,0 +1,84 @@
+## tests/auth_service/unit/test_password_hasher.py
+import os
+import threading
+
+import pytest
+
+from common.auth import PasswordHasher, _bcrypt_hash, calibrate_rounds
+from common.exceptions import ServiceUnavailableError
+
+
+def test_password_hasher_hashes_and_verifies_in_worker():
+    hasher = PasswordHasher(workers=1, max_pending=1)
+    try:
+        hashed = hasher.hash("pw")
+        assert hasher.verify("pw", hashed)
+        assert not hasher.verify("other", hashed)
+        stats = hasher.stats()
+        assert stats["completed"] == 3 and stats["in_flight"] == 0
+        assert stats["latency_max"] >= stats["latency_avg"] > 0
+    finally:
+        hasher.shutdown()
+
+
+def test_password_hasher_rejects_when_saturated():
+    hasher = PasswordHasher(workers=0, max_pending=1)
+    started, release = threading.Event(), threading.Event()
+
+    def slow(raw_password):
+        started.set()
+        release.wait()
+        return _bcrypt_hash(raw_password)
+
+    worker = threading.Thread(target=hasher._run, args=(slow, "pw"))
+    worker.start()
+    started.wait()
+    assert hasher.stats()["in_flight"] == 1
+    with pytest.raises(ServiceUnavailableError, match="Password hashing is busy"):
+        hasher.hash("pw")
+    release.set()
+    worker.join()
+
+    assert hasher.verify("pw", hasher.hash("pw"))
+    assert hasher.stats()["rejected"] == 1
+
+
+def test_password_hasher_times_out():
+    hasher = PasswordHasher(workers=1, max_pending=0, timeout=0.001)
+    try:
+        with pytest.raises(ServiceUnavailableError, match="timed out"):
+            hasher.hash("pw")
+        assert hasher.stats()["timeouts"] == 1
+    finally:
+        hasher.shutdown()
+
+
+def test_password_hasher_needs_rehash_on_other_cost():
+    hasher = PasswordHasher(workers=0, rounds=5)
+    assert not hasher.needs_rehash(hasher.hash("pw"))
+    assert hasher.needs_rehash(_bcrypt_hash("pw", 4))
+    assert hasher.needs_rehash(_bcrypt_hash("pw", 6))
+
+
+@pytest.mark.parametrize("target_ms, expected", [(1, 10), (400, 10), (600, 11), (2000, 13), (10 ** 6, 16)])
+def test_calibrate_rounds_meets_target(target_ms, expected):
+    # 250 ms at cost 10, doubling per round
+    def measure(rounds):
+        return 250 * 2 ** (rounds - 10)
+
+    assert calibrate_rounds(target_ms, measure=measure) == expected
+
+
+def test_password_hasher_recovers_from_dead_worker():
+    hasher = PasswordHasher(workers=1, max_pending=1)
+    try:
+        assert hasher.verify("pw", hasher.hash("pw"))
+        # The worker exits while running a call: the pool is broken
+        with pytest.raises(ServiceUnavailableError, match="Password hashing failed"):
+            hasher._run(os._exit, 1)
+        assert hasher.stats()["broken"] == 1
+        # The next call runs in a new pool
+        assert hasher.verify("pw", hasher.hash("pw"))
+        assert hasher.stats()["in_flight"] == 0
+    finally:
+        hasher.shutdown()
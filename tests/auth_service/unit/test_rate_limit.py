@@ -0,0 +1,57 @@
+## tests/auth_service/unit/test_rate_limit.py
+import pytest
+
+from auth_service.rate_limit import LoginThrottle, MemoryTokenBuckets, SQLiteTokenBuckets, TokenBuckets, \
+    create_login_throttle
+from tests.utils.clock import FakeClock
+
+
+def test_memory_buckets_allow_burst_then_refill():
+    clock = FakeClock()
+    buckets = MemoryTokenBuckets(3, 0.5, clock)
+    assert [buckets.take("a") for _ in range(3)] == [0, 0, 0]
+    assert buckets.take("a") == pytest.approx(2)
+    assert buckets.take("b") == 0
+    clock.now += 1
+    assert buckets.take("a") == pytest.approx(1)
+    clock.now += 1
+    assert buckets.take("a") == 0
+    assert buckets.take("a") == pytest.approx(2)
+
+
+def test_memory_buckets_evict_idle_buckets():
+    clock = FakeClock()
+    buckets = MemoryTokenBuckets(2, 1, clock, sweep_interval=10)
+    for i in range(100):
+        buckets.take(f"ip{i}")
+    assert len(buckets) == 100
+    clock.now += 10
+    buckets.take("again")
+    assert len(buckets) == 1
+
+
+def test_login_throttle_limits_ip_and_username():
+    clock = FakeClock()
+    throttle = LoginThrottle(MemoryTokenBuckets(2, 1, clock), MemoryTokenBuckets(2, 1, clock))
+    assert throttle.check("admin", "10.0.0.1") == 0
+    assert throttle.check("admin", "10.0.0.2") == 0
+    # Username bucket is empty, from any address
+    assert throttle.check("admin", "10.0.0.3") == pytest.approx(1)
+    assert throttle.check("user", "10.0.0.1") == 0
+    # Address bucket is empty, for any username
+    assert throttle.check("other", "10.0.0.1") == pytest.approx(1)
+
+
+def test_create_login_throttle():
+    assert isinstance(create_login_throttle("memory", None)._by_ip, MemoryTokenBuckets)
+    assert isinstance(create_login_throttle("sqlite", None)._by_user, SQLiteTokenBuckets)
+    with pytest.raises(ValueError, match="Unknown login limit store: redis"):
+        create_login_throttle("redis", None)
+
+
+def test_token_buckets_without_take_fail_on_instantiation():
+    class NoTake(TokenBuckets):
+        pass
+
+    with pytest.raises(TypeError, match="abstract"):
+        NoTake(3, 0.5)
@@ -0,0 +1,58 @@
+## tests/auth_service/unit/test_token_cache.py
+import time
+from datetime import datetime, timezone, timedelta
+
+import jwt
+import pytest
+from jwt import ExpiredSignatureError, InvalidTokenError
+
+from auth_service.config import SECRET
+from auth_service.token_utils import TokenCache, generate_token
+from tests.utils.clock import FakeClock
+
+
+def test_token_cache_hits_return_verified_claims():
+    cache = TokenCache()
+    token = generate_token({"user_id": 1, "role": "admin"})
+    first = cache.verify(token)
+    first["role"] = "changed"
+    second = cache.verify(token)
+    assert second["user_id"] == 1 and second["role"] == "admin"
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_token_cache_entry_expires_with_token():
+    clock = FakeClock(now=time.time())
+    cache = TokenCache(clock=clock)
+    exp = datetime.now(timezone.utc) + timedelta(seconds=2)
+    token = jwt.encode({"user_id": 1, "role": "user", "exp": exp}, SECRET, algorithm="HS256")
+    cache.verify(token)
+    clock.now = exp.timestamp() + 1
+    # The entry is stale, the token is verified again (and still valid for jwt for about a second)
+    cache.verify(token)
+    assert cache.stats()["misses"] == 2
+
+
+def test_token_cache_does_not_cache_invalid_or_expired_tokens():
+    cache = TokenCache()
+    expired = jwt.encode({"user_id": 1, "role": "user", "exp": datetime.now(timezone.utc) - timedelta(minutes=1)},
+                         SECRET, algorithm="HS256")
+    for _ in range(2):
+        with pytest.raises(ExpiredSignatureError):
+            cache.verify(expired)
+        with pytest.raises(InvalidTokenError, match="Invalid token"):
+            cache.verify("not.a.token")
+    assert cache.stats() == {"entries": 0, "hits": 0, "misses": 4, "hit_rate": 0.0}
+
+
+def test_token_cache_evicts_least_recently_used():
+    cache = TokenCache(max_entries=2)
+    tokens = [generate_token({"user_id": i, "role": "user"}) for i in range(3)]
+    cache.verify(tokens[0])
+    cache.verify(tokens[1])
+    cache.verify(tokens[0])
+    cache.verify(tokens[2])
+    assert cache.stats()["entries"] == 2
+    cache.verify(tokens[0])
+    cache.verify(tokens[1])
+    assert cache.stats()["hits"] == 2
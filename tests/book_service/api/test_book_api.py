@@ -1,6 +1,7 @@
 import pytest
 
-from common.config import TEST_SESSION_TYPE
+from common.config import TEST_SESSION_TYPE, PAGE_SIZE_MAX
+from tests.utils.validator import assert_json_structure
 
 
 @pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed_users_books.json"}], indirect=True)
@@ -53,7 +54,8 @@ def test_add_book_successful(client, admin_auth_header):
     book_data = {"code": "B001", "id": 1, "name": "API Book", "publisher": "Pub", "quantity": 3, "imported_price": 80, "sell_price": 88}
     res = client.post("/books", json=book_data, headers=admin_auth_header)
     assert res.status_code == 201
-    assert res.json == book_data
+    # No holds on a new book: all of its quantity is available
+    assert res.json == {**book_data, "available": 3}
 
 
 @pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE}], indirect=True)
@@ -465,3 +467,351 @@ def test_add_book_unsuccessful_insufficient_permission(client, user_auth_header)
     assert res.json == {
             "error": "Forbidden: insufficient permission"
         }
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed_users_books.json"}], indirect=True)
+def test_list_books_paginated(client):
+    """
+    Response 200
+        {"items": [{book_info}], "next": <cursor>}, Link: <next page url>; rel="next"
+    """
+    res = client.get("/books?limit=1")
+    assert res.status_code == 200
+    assert [b["code"] for b in res.json["items"]] == ["B001"]
+    next_cursor = res.json["next"]
+    assert next_cursor
+    assert res.headers["Link"] == f'<http://localhost/books?limit=1&after={next_cursor}>; rel="next"'
+
+    res = client.get(f"/books?limit=1&after={next_cursor}")
+    assert res.status_code == 200
+    assert [b["code"] for b in res.json["items"]] == ["B002"]
+    assert res.json["next"] is None
+    assert "Link" not in res.headers
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed_users_books.json"}], indirect=True)
+def test_list_books_paginated_default_limit(client):
+    """
+    Response 200
+        {"items": [{book_info}, {book_info}], "next": null}
+    """
+    client.application.config["LEGACY_BOOK_LIST"] = False
+    res = client.get("/books")
+    assert res.status_code == 200
+    assert len(res.json["items"]) == 2
+    assert res.json["next"] is None
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE}], indirect=True)
+@pytest.mark.parametrize("query, error", [
+    ("limit=0", f"Query parameter 'limit' must be between 1 and {PAGE_SIZE_MAX}"),
+    ("limit=abc", "Query parameter 'limit' must be an integer"),
+    ("after=not-a-cursor", "Invalid cursor"),
+])
+def test_list_books_paginated_unsuccessful_invalid_parameters(client, query, error):
+    """
+    Response 400
+        {
+            "error": <error>
+        }
+    """
+    res = client.get(f"/books?{query}")
+    assert res.status_code == 400
+    assert res.json == {"error": error}
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed_users_books.json"}], indirect=True)
+def test_list_books_reflects_writes(client, admin_auth_header, user_auth_header):
+    """
+    Cached catalog is invalidated by book writes and order stock decrements
+    """
+    assert len(client.get("/books").json) == 2
+
+    client.post("/books", json={"code": "B003", "name": "Cached Book", "quantity": 1}, headers=admin_auth_header)
+    assert [b["code"] for b in client.get("/books").json] == ["B001", "B002", "B003"]
+
+    client.put("/books/3", json={"name": "Renamed"}, headers=admin_auth_header)
+    assert client.get("/books?limit=10").json["items"][2]["name"] == "Renamed"
+
+    client.post("/orders", json={"items": [{"book_id": 3, "quantity": 1}]}, headers=user_auth_header)
+    assert client.get("/books").json[2]["quantity"] == 0
+    assert client.get("/books?limit=10").json["items"][2]["quantity"] == 0
+
+    client.delete("/books/2", headers=admin_auth_header)
+    assert [b["code"] for b in client.get("/books").json] == ["B001", "B003"]
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed_users_books.json"}], indirect=True)
+def test_get_book_by_id_reflects_writes(client, admin_auth_header, user_auth_header):
+    """
+    Response 200
+        {book_info}
+    Cached books are invalidated by book updates, deletes and order stock decrements
+    """
+    res = client.get("/books/1")
+    assert res.status_code == 200
+    assert_json_structure(res.json, {"id": int, "code": str, "name": str})
+    assert res.json["code"] == "B001"
+    quantity = res.json["quantity"]
+
+    client.put("/books/1", json={"name": "Renamed"}, headers=admin_auth_header)
+    assert client.get("/books/1").json["name"] == "Renamed"
+
+    client.post("/orders", json={"items": [{"book_id": 1, "quantity": 1}]}, headers=user_auth_header)
+    assert client.get("/books/1").json["quantity"] == quantity - 1
+
+    assert client.get("/books/2").status_code == 200
+    client.delete("/books/2", headers=admin_auth_header)
+    res = client.get("/books/2")
+    assert res.status_code == 404
+    assert res.json == {"error": "Book with id 2 not found"}
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed_users_books.json"}], indirect=True)
+def test_get_books_by_ids(client, admin_auth_header):
+    """
+    Response 200
+        {"items": [book_info in the order of ids], "missing": [ids not found]}
+    """
+    res = client.get("/books?ids=2,99,1,2")
+    assert res.status_code == 200
+    assert [b["id"] for b in res.json["items"]] == [2, 1]
+    assert res.json["missing"] == [99]
+
+    client.put("/books/2", json={"name": "Renamed"}, headers=admin_auth_header)
+    assert client.get("/books?ids=2").json["items"][0]["name"] == "Renamed"
+
+    res = client.get("/books?ids=1,x")
+    assert res.status_code == 400
+    assert res.json == {"error": "Query parameter 'ids' must be a comma-separated list of integers"}
+    res = client.get("/books?ids=" + ",".join(str(i) for i in range(PAGE_SIZE_MAX + 1)))
+    assert res.status_code == 400
+    assert res.json == {"error": f"Query parameter 'ids' accepts at most {PAGE_SIZE_MAX} ids"}
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed_users_books.json"}], indirect=True)
+def test_list_books_conditional_get(client, admin_auth_header):
+    """
+    Response 304 while the catalog is unchanged since the If-None-Match ETag, 200 with a new ETag after a write
+    """
+    res = client.get("/books")
+    etag = res.headers["ETag"]
+    assert res.status_code == 200 and etag
+
+    res = client.get("/books", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.headers["ETag"] == etag
+    assert res.data == b""
+
+    res = client.get("/books?limit=1", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+
+    client.put("/books/1", json={"name": "New name"}, headers=admin_auth_header)
+    res = client.get("/books", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["ETag"] != etag
+    assert res.json[0]["name"] == "New name"
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed_users_books.json"}], indirect=True)
+@pytest.mark.parametrize("q, codes", [
+    ("advanced", ["B002"]),
+    ("pyth adv", ["B002"]),
+    ("b001", ["B001"]),
+    ("reilly", ["B001", "B002"]),
+    ("python\" -(*:", ["B001", "B002"]),
+    ("unknown", []),
+])
+def test_search_books(client, q, codes):
+    """
+    Response 200
+        {"items": [{book_info}], "next": null}
+    """
+    res = client.get("/books/search", query_string={"q": q})
+    assert res.status_code == 200
+    assert sorted(b["code"] for b in res.json["items"]) == codes
+    assert res.json["next"] is None
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed_users_books.json"}], indirect=True)
+def test_search_books_ranked_and_paginated(client):
+    """
+    Name matches rank above publisher-only matches; pages follow the "next" cursor
+    """
+    res = client.get("/books/search?q=basics&limit=1")
+    assert [b["code"] for b in res.json["items"]] == ["B001"]
+
+    res = client.get("/books/search?q=python&limit=1")
+    assert res.status_code == 200
+    assert len(res.json["items"]) == 1
+    assert 'rel="next"' in res.headers["Link"]
+    first = res.json["items"][0]["code"]
+
+    res = client.get(f"/books/search?q=python&limit=1&after={res.json['next']}")
+    assert [b["code"] for b in res.json["items"]] == [{"B001": "B002", "B002": "B001"}[first]]
+    assert res.json["next"] is None
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed_users_books.json"}], indirect=True)
+def test_search_books_index_follows_writes(client, admin_auth_header):
+    """
+    The full-text index is kept in sync with book inserts, updates and deletes
+    """
+    client.post("/books", json={"code": "C100", "name": "Clean Code"}, headers=admin_auth_header)
+    assert [b["code"] for b in client.get("/books/search?q=clean").json["items"]] == ["C100"]
+
+    client.put("/books/3", json={"name": "Refactoring"}, headers=admin_auth_header)
+    assert client.get("/books/search?q=clean").json["items"] == []
+    assert [b["code"] for b in client.get("/books/search?q=refactor").json["items"]] == ["C100"]
+
+    client.delete("/books/3", headers=admin_auth_header)
+    assert client.get("/books/search?q=refactor").json["items"] == []
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE}], indirect=True)
+@pytest.mark.parametrize("query, error", [
+    ("", "Missing required query parameter: q"),
+    ("q=", "Missing required query parameter: q"),
+    ("q=%22%2A%22", "Query parameter 'q' must contain at least one word"),
+    ("q=python&after=bad", "Invalid cursor"),
+])
+def test_search_books_unsuccessful_invalid_parameters(client, query, error):
+    """
+    Response 400
+        {
+            "error": <error>
+        }
+    """
+    res = client.get(f"/books/search?{query}")
+    assert res.status_code == 400
+    assert res.json == {"error": error}
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed_users_books.json"}], indirect=True)
+@pytest.mark.parametrize("query, codes", [
+    ("publisher=O'Reilly&sort=-price", ["B001", "B002"]),
+    ("publisher=Manning", []),
+    ("min_price=105", ["B001"]),
+    ("max_price=105&in_stock=true", ["B002"]),
+    ("sort=-id", ["B002", "B001"]),
+    ("sort=name", ["B002", "B001"]),
+])
+def test_list_books_filtered_and_sorted(client, query, codes):
+    """
+    Response 200
+        [{book_info}] or {"items": [{book_info}], "next": null}
+    """
+    res = client.get(f"/books?{query}")
+    assert res.status_code == 200
+    assert [b["code"] for b in res.json] == codes
+
+    res = client.get(f"/books?{query}&limit=1")
+    assert res.status_code == 200
+    assert [b["code"] for b in res.json["items"]] == codes[:1]
+    if len(codes) > 1:
+        assert "sort=" in res.headers["Link"]
+        res = client.get(f"/books?{query}&limit=1&after={res.json['next']}")
+        assert [b["code"] for b in res.json["items"]] == codes[1:]
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE}], indirect=True)
+@pytest.mark.parametrize("query, error", [
+    ("min_price=cheap&in_stock=yes&sort=rating",
+     "Query parameter 'min_price' must be a number; Query parameter 'in_stock' must be true or false; "
+     "Query parameter 'sort' must be one of: id, name, price (prefix - for descending)"),
+    ("min_price=nan", "Query parameter 'min_price' must be a number"),
+    ("max_price=inf", "Query parameter 'max_price' must be a number"),
+    ("min_price=-Infinity&max_price=NaN",
+     "Query parameter 'min_price' must be a number; Query parameter 'max_price' must be a number"),
+])
+def test_list_books_filtered_unsuccessful_invalid_parameters(client, query, error):
+    """
+    Response 400
+        {
+            "error": "Query parameter 'min_price' must be a number; ..."
+        }
+    """
+    res = client.get(f"/books?{query}")
+    assert res.status_code == 400
+    assert res.json == {"error": error}
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed_users_books.json"}], indirect=True)
+def test_bulk_import_books_ndjson(client, admin_auth_header):
+    """
+    Response 200
+        {"inserted": 2, "updated": 1, "failed": 3, "errors": [{"line": <n>, "code": <code>, "error": <message>}]}
+    """
+    body = "\n".join([
+        '{"code": "B003", "name": "New Book", "quantity": 5, "imported_price": 10}',
+        '{"code": "B001", "name": "Python Basics 2nd Edition", "quantity": 99}',
+        '{"code": "B004", "name": "Another"}',
+        '{"code": "B005", "name": "Bad", "quantity": -1}',
+        'not json',
+        '',
+        '["B006"]',
+    ])
+    res = client.post("/books/bulk", data=body, content_type="application/x-ndjson", headers=admin_auth_header)
+    assert res.status_code == 200
+    assert res.json == {
+        "inserted": 2,
+        "updated": 1,
+        "failed": 3,
+        "errors": [
+            {"line": 4, "code": "B005", "error": "Field 'quantity' must be non-negative"},
+            {"line": 5, "code": None, "error": "Invalid JSON"},
+            {"line": 7, "code": None, "error": "Row must be a JSON object"},
+        ]
+    }
+    books = {b["code"]: b for b in client.get("/books").json}
+    assert sorted(books) == ["B001", "B002", "B003", "B004"]
+    assert books["B001"]["quantity"] == 99 and books["B001"]["name"] == "Python Basics 2nd Edition"
+    # Missing fields keep their value
+    assert books["B001"]["publisher"] == "O'Reilly" and books["B001"]["sell_price"] == 110
+    assert books["B003"]["sell_price"] == 11.0
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE}], indirect=True)
+def test_bulk_import_books_csv(client, admin_auth_header):
+    """
+    Response 200
+        {"inserted": 2, "updated": 0, "failed": 1, "errors": [...]}
+    """
+    body = ("code,name,publisher,quantity,imported_price,sell_price\n"
+            "C001,CSV Book,Pub,3,10.5,12\n"
+            "C002,\"Quoted, Name\",,,,\n"
+            "C003,Bad Quantity,Pub,three,1,2\n")
+    res = client.post("/books/bulk", data=body, content_type="text/csv", headers=admin_auth_header)
+    assert res.status_code == 200
+    assert res.json == {
+        "inserted": 2,
+        "updated": 0,
+        "failed": 1,
+        "errors": [{"line": 4, "code": "C003", "error": "Field 'quantity' must be of type int"}]
+    }
+    assert [b["name"] for b in client.get("/books/search?q=quoted").json["items"]] == ["Quoted, Name"]
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE}], indirect=True)
+def test_bulk_import_books_unsuccessful_content_type(client, admin_auth_header):
+    """
+    Response 415
+        {
+            "error": "Content-Type must be application/x-ndjson or text/csv"
+        }
+    """
+    res = client.post("/books/bulk", json=[{"code": "B001", "name": "Book"}], headers=admin_auth_header)
+    assert res.status_code == 415
+    assert res.json == {"error": "Content-Type must be application/x-ndjson or text/csv"}
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE}], indirect=True)
+def test_bulk_import_books_unsuccessful_insufficient_permission(client, user_auth_header):
+    """
+    Response 403
+        {
+            "error": "Forbidden: insufficient permission"
+        }
+    """
+    res = client.post("/books/bulk", data="", content_type="text/csv", headers=user_auth_header)
+    assert res.status_code == 403
@@ -0,0 +1,64 @@
+## tests/book_service/api/test_export_api.py
+import csv
+import io
+import json
+
+import pytest
+
+from common.config import TEST_SESSION_TYPE
+from tests.utils.validator import assert_json_structure
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed.json"}], indirect=True)
+def test_export_orders_ndjson(client, admin_auth_header):
+    res = client.get("/export/orders", headers=admin_auth_header)
+    assert res.status_code == 200
+    assert res.mimetype == "application/x-ndjson"
+    assert 'filename="orders.ndjson"' in res.headers["Content-Disposition"]
+    orders = [json.loads(line) for line in res.get_data(as_text=True).splitlines()]
+    assert len(orders) == 9
+    for order in orders:
+        assert_json_structure(order, {"id": int, "user_id": int, "status": str, "created_at": str, "items": list})
+    keys = [(o["created_at"], o["id"]) for o in orders]
+    assert keys == sorted(keys)
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed.json"}], indirect=True)
+def test_export_orders_csv_filtered(client, admin_auth_header):
+    listed = client.get("/orders?user_id=2&limit=100", headers=admin_auth_header).json["items"]
+    res = client.get("/export/orders?format=csv&user_id=2", headers=admin_auth_header)
+    assert res.status_code == 200
+    assert res.mimetype == "text/csv"
+    rows = list(csv.DictReader(io.StringIO(res.get_data(as_text=True))))
+    assert {int(r["order_id"]) for r in rows} == {o["id"] for o in listed}
+    assert len(rows) == sum(max(len(o["items"]), 1) for o in listed)
+    assert all(r["user_id"] == "2" for r in rows)
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed.json"}], indirect=True)
+def test_export_books_ndjson_and_csv(client, admin_auth_header):
+    books = [json.loads(line) for line in
+             client.get("/export/books", headers=admin_auth_header).get_data(as_text=True).splitlines()]
+    assert [b["id"] for b in books] == sorted(b["id"] for b in books)
+    for book in books:
+        assert_json_structure(book, {"id": int, "code": str, "name": str, "quantity": int})
+
+    res = client.get("/export/books?format=csv", headers=admin_auth_header)
+    assert res.mimetype == "text/csv"
+    rows = list(csv.DictReader(io.StringIO(res.get_data(as_text=True))))
+    assert [(int(r["id"]), r["code"]) for r in rows] == [(b["id"], b["code"]) for b in books]
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed.json"}], indirect=True)
+@pytest.mark.parametrize("path", ["/export/orders", "/export/books"])
+def test_export_unsuccessful_forbidden(client, user_auth_header, path):
+    res = client.get(path, headers=user_auth_header)
+    assert res.status_code == 403
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed.json"}], indirect=True)
+@pytest.mark.parametrize("path", ["/export/orders", "/export/books"])
+def test_export_unsuccessful_invalid_format(client, admin_auth_header, path):
+    res = client.get(f"{path}?format=xml", headers=admin_auth_header)
+    assert res.status_code == 400
+    assert res.json == {"error": "Query parameter 'format' must be ndjson or csv"}
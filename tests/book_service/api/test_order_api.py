@@ -55,6 +55,43 @@ def test_list_order_unsuccessful_unauthorized(client):
     }
 
 
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed.json"}], indirect=True)
+def test_get_order_success(client, admin_auth_header, user_auth_header):
+    """
+        Response 200
+            {order_info, "items": [{item_info, "book_code", "book_name"}]}
+    """
+    res = client.get("/orders/1", headers=admin_auth_header)
+    assert res.status_code == 200
+    assert_json_structure(res.json, {"id": int, "user_id": int, "status": str, "created_at": str, "items": list})
+    assert res.json["id"] == 1
+    assert [(i["book_code"], i["quantity"]) for i in res.json["items"]] == [("B001", 10), ("B002", 11)]
+    assert all(isinstance(i["book_name"], str) for i in res.json["items"])
+
+    # Owner
+    res = client.get("/orders/3", headers=user_auth_header)
+    assert res.status_code == 200
+    assert res.json["user_id"] == 2
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed.json"}], indirect=True)
+def test_get_order_unsuccessful(client, user_auth_header):
+    """
+    Response 401 / 403 / 404
+        {"error": <message>}
+    """
+    res = client.get("/orders/1")
+    assert res.status_code == 401
+
+    res = client.get("/orders/1", headers=user_auth_header)
+    assert res.status_code == 403
+    assert res.json == {"error": "You are not authorized to view this order."}
+
+    res = client.get("/orders/100", headers=user_auth_header)
+    assert res.status_code == 404
+    assert res.json == {"error": "Order with id 100 not found"}
+
+
 @pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed_users_books.json"}], indirect=True)
 def test_place_order_success(client, admin_auth_header):
     """
@@ -104,6 +141,77 @@ def test_place_order_success(client, admin_auth_header):
         assert all(expected_item[f] == item[f] for f in expected_item)
 
 
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed_users_books.json"}], indirect=True)
+def test_place_order_idempotency_key_replays_response(client, admin_auth_header, user_auth_header):
+    """
+    Response 201, the same body for retries with the same Idempotency-Key, with Idempotent-Replayed: true
+    """
+    order_data = {"items": [{"book_id": 1, "quantity": 2}]}
+    headers = {**user_auth_header, "Idempotency-Key": "order-1"}
+    first = client.post("/orders", json=order_data, headers=headers)
+    assert first.status_code == 201
+    assert "Idempotent-Replayed" not in first.headers
+    assert first.json["items"][0]["quantity"] == 2
+
+    retry = client.post("/orders", json=order_data, headers=headers)
+    assert retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json == first.json
+
+    # Placed and taken out of stock once
+    assert len(client.get("/orders", headers=admin_auth_header).json) == 1
+    assert client.get("/books/1").json["quantity"] == 8
+
+    # Keys are per user
+    other = client.post("/orders", json=order_data, headers={**admin_auth_header, "Idempotency-Key": "order-1"})
+    assert other.status_code == 201
+    assert other.json["id"] != first.json["id"]
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed_users_books.json"}], indirect=True)
+def test_place_order_idempotency_key_response_matches_get_order(client, user_auth_header):
+    """
+    Response 201, the stored body is the order as GET /orders/<id> returns it
+    """
+    order_data = {"items": [{"book_id": 1, "quantity": 1}]}
+    placed = client.post("/orders", json=order_data, headers={**user_auth_header, "Idempotency-Key": "order-1"})
+    assert placed.status_code == 201
+    fetched = client.get(f"/orders/{placed.json['id']}", headers=user_auth_header)
+    assert fetched.status_code == 200
+    order = fetched.json
+    for item in order["items"]:
+        del item["book_code"], item["book_name"]
+    assert placed.json == order
+    assert "+" not in placed.json["created_at"]
+
+    plain = client.post("/orders", json=order_data, headers=user_auth_header)
+    assert plain.json["created_at"].count(":") == placed.json["created_at"].count(":")
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed_users_books.json"}], indirect=True)
+def test_place_order_idempotency_key_unsuccessful(client, user_auth_header):
+    """
+    Response 409 for a key reused with a different request, 400 for an invalid key.
+    A failed request is not stored: its retry runs again
+    """
+    headers = {**user_auth_header, "Idempotency-Key": "order-1"}
+    res = client.post("/orders", json={"items": [{"book_id": 1, "quantity": 100}]}, headers=headers)
+    assert res.status_code == 400
+    assert res.json == {"error": "Book with id 1 quantity not enough"}
+
+    res = client.post("/orders", json={"items": [{"book_id": 1, "quantity": 1}]}, headers=headers)
+    assert res.status_code == 201
+
+    res = client.post("/orders", json={"items": [{"book_id": 1, "quantity": 3}]}, headers=headers)
+    assert res.status_code == 409
+    assert res.json == {"error": "Idempotency-Key has already been used with a different request"}
+
+    res = client.post("/orders", json={"items": [{"book_id": 1, "quantity": 1}]},
+                      headers={**user_auth_header, "Idempotency-Key": "k" * 256})
+    assert res.status_code == 400
+    assert res.json == {"error": "Idempotency-Key must be 1 to 255 characters"}
+
+
 @pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE}], indirect=True)
 def test_place_order_unsuccessful_unauthorized(client):
     """
@@ -463,3 +571,162 @@ def test_update_order_status_unsuccessful_violating_order_transition(client, adm
             assert res.json == {
                     "error": f"Cannot change status from {current_status} to {next_status}"
             }
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed.json"}], indirect=True)
+def test_list_order_pages_newest_first(client, admin_auth_header):
+    """
+        Response 200
+            {"items": [order_info], "next": <cursor or null>, "total": 9}
+    """
+    orders, url = [], "/orders?limit=4"
+    while url:
+        res = client.get(url, headers=admin_auth_header)
+        assert res.status_code == 200
+        assert_json_structure(res.json, {"items": list, "total": int})
+        assert res.json["total"] == 9
+        orders += res.json["items"]
+        url = res.headers.get("Link", "").partition("<")[2].partition(">")[0] or None
+        assert bool(url) == (res.json["next"] is not None)
+    assert [o["id"] for o in orders] == sorted(range(1, 10), reverse=True)
+    assert all(len(o["items"]) >= 1 for o in orders)
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed.json"}], indirect=True)
+def test_list_order_filters(client, admin_auth_header, user_auth_header):
+    """
+        Response 200
+            {"items": [order_info], "next": null, "total": <count>}
+    """
+    def listed(query, headers):
+        res = client.get(f"/orders?limit=50&{query}", headers=headers)
+        assert res.status_code == 200
+        assert res.json["total"] == len(res.json["items"])
+        return res.json["items"]
+
+    assert {o["id"] for o in listed("status=new", admin_auth_header)} == {1, 3, 4}
+    assert {o["id"] for o in listed("status=new", user_auth_header)} == {3, 4}
+    assert {o["id"] for o in listed("user_id=1", admin_auth_header)} == {1, 2}
+    assert [o["id"] for o in listed("book_id=2", admin_auth_header)] == [1]
+    assert listed("created_from=2999-01-01", admin_auth_header) == []
+    assert len(listed("created_to=2999-01-01T00:00:00%2B07:00", user_auth_header)) == 7
+    # Legacy list with filters
+    res = client.get("/orders?status=processing", headers=admin_auth_header)
+    assert res.status_code == 200
+    assert {o["id"] for o in res.json} == {2, 5}
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed.json"}], indirect=True)
+def test_list_order_unsuccessful_invalid_filters(client, admin_auth_header, user_auth_header):
+    """
+    Response 400 / 403
+        {"error": <message>}
+    """
+    res = client.get("/orders?limit=10&status=lost&book_id=x&created_from=yesterday", headers=admin_auth_header)
+    assert res.status_code == 400
+    assert res.json["error"] == ("Query parameter 'status' must be one of: canceled, delivered, new, processing, "
+                                 "rejected, shipping; Query parameter 'book_id' must be an integer; "
+                                 "Query parameter 'created_from' must be an ISO 8601 date or datetime")
+
+    res = client.get("/orders?limit=10&after=bad", headers=admin_auth_header)
+    assert res.status_code == 400
+    assert res.json == {"error": "Invalid cursor"}
+
+    res = client.get("/orders?limit=10&user_id=1", headers=user_auth_header)
+    assert res.status_code == 403
+    assert res.json == {"error": "Only admin can list other users' orders"}
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed.json"}], indirect=True)
+def test_update_order_statuses_by_list(client, admin_auth_header):
+    """
+        Response 200
+            {"updated": <count>, "failed": <count>, "results": [{"id", "status"} or {"id", "error"}]}
+    """
+    changes = [{"id": 2, "status": "shipping"}, {"id": 5, "status": "shipping"}, {"id": 1, "status": "delivered"},
+               {"id": 3, "status": "lost"}, {"id": 100, "status": "canceled"}, {"id": 4, "status": "canceled"}]
+    res = client.put("/orders/status", json={"orders": changes}, headers=admin_auth_header)
+    assert res.status_code == 200
+    assert res.json == {"updated": 3, "failed": 3, "results": [
+        {"id": 2, "status": "shipping"},
+        {"id": 5, "status": "shipping"},
+        {"id": 1, "error": "Cannot change status from new to delivered"},
+        {"id": 3, "error": "status must be one of: canceled, delivered, new, processing, rejected, shipping"},
+        {"id": 100, "error": "Order with id 100 not found"},
+        {"id": 4, "status": "canceled"},
+    ]}
+    statuses = {o["id"]: o["status"] for o in client.get("/orders", headers=admin_auth_header).json}
+    assert [statuses[i] for i in (2, 5, 1, 3, 4)] == ["shipping", "shipping", "new", "new", "canceled"]
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed.json"}], indirect=True)
+def test_update_order_statuses_by_filter(client, admin_auth_header):
+    """
+        Response 200, every order matching the filter moved to the status
+    """
+    res = client.put("/orders/status", json={"filter": {"status": "processing"}, "status": "shipping"},
+                     headers=admin_auth_header)
+    assert res.status_code == 200
+    assert res.json["updated"] == 2 and res.json["failed"] == 0
+    assert {r["id"] for r in res.json["results"]} == {2, 5}
+
+    res = client.put("/orders/status", json={"filter": {"user_id": 1}, "status": "rejected"},
+                     headers=admin_auth_header)
+    assert res.json["updated"] == 1
+    assert {r["id"]: r.get("error") for r in res.json["results"]} == {
+        1: None, 2: "Cannot change status from shipping to rejected"}
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed.json"}], indirect=True)
+def test_update_order_statuses_unsuccessful(client, admin_auth_header, user_auth_header):
+    """
+    Response 400 / 403
+        {"error": <message>}
+    """
+    res = client.put("/orders/status", json={"orders": [{"id": 3, "status": "canceled"}]}, headers=user_auth_header)
+    assert res.status_code == 403
+
+    for body, error in [
+        ({}, "Missing required field: orders or filter"),
+        ({"orders": []}, "Orders can not empty"),
+        ({"orders": [{"id": "1"}]}, "Missing required field: status; Field 'id' must be of type int"),
+        ({"orders": [{"id": 1, "status": "processing"}, {"id": 1, "status": "canceled"}]},
+         "Each order can be listed once"),
+        ({"filter": {"status": "lost"}, "status": "shipping"},
+         "Query parameter 'status' must be one of: canceled, delivered, new, processing, rejected, shipping"),
+        ({"filter": {"user_id": [1], "status": 2}, "status": "shipping"},
+         "Field 'status' must be of type str; Field 'user_id' must be of type int"),
+        ({"filter": {"created_from": 20260101, "owner": 1}, "status": "shipping"},
+         "Unknown filter field 'owner'; Field 'created_from' must be of type str"),
+        ({"filter": {"created_to": "yesterday"}, "status": "shipping"},
+         "Query parameter 'created_to' must be an ISO 8601 date or datetime"),
+    ]:
+        res = client.put("/orders/status", json=body, headers=admin_auth_header)
+        assert res.status_code == 400
+        assert res.json == {"error": error}
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed.json"}], indirect=True)
+def test_canceled_and_rejected_orders_restock(client, admin_auth_header, user_auth_header):
+    """
+    Items of canceled or rejected orders go back to stock, once
+    """
+    res = client.put("/orders/3/status", json={"status": "canceled"}, headers=user_auth_header)
+    assert res.status_code == 200
+    assert client.get("/books/1").json["quantity"] == 10 + 30
+
+    # Already canceled: nothing more returned
+    res = client.put("/orders/3/status", json={"status": "canceled"}, headers=admin_auth_header)
+    assert res.status_code == 400
+    assert client.get("/books/1").json["quantity"] == 40
+
+    # Orders 1 (B001 10, B002 11), 2 and 5 (B001 20 and 50) rejected together
+    res = client.put("/orders/status", json={"orders": [{"id": 1, "status": "rejected"}, {"id": 2, "status": "rejected"},
+                                                        {"id": 5, "status": "rejected"}]}, headers=admin_auth_header)
+    assert res.json["updated"] == 3
+    assert client.get("/books?ids=1,2").json["items"][0]["quantity"] == 40 + 10 + 20 + 50
+    assert client.get("/books?ids=1,2").json["items"][1]["quantity"] == 15 + 11
+
+    # Shipping does not restock
+    client.put("/orders/4/status", json={"status": "processing"}, headers=admin_auth_header)
+    assert client.get("/books/1").json["quantity"] == 120
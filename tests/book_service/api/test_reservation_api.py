@@ -0,0 +1,114 @@
+## tests/book_service/api/test_reservation_api.py
+import pytest
+
+from common.config import TEST_SESSION_TYPE, RESERVATION_MINUTES_MAX
+from tests.utils.validator import assert_json_structure
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed_users_books.json"}], indirect=True)
+def test_create_reservation_success(client, user_auth_header):
+    """
+        Response 201
+            {reservation_info}
+    """
+    res = client.post("/reservations", json={"book_id": 1, "quantity": 4, "minutes": 5}, headers=user_auth_header)
+    assert res.status_code == 201
+    assert_json_structure(res.json, {"id": int, "user_id": int, "book_id": int, "quantity": int,
+                                     "created_at": str, "expires_at": str})
+    assert (res.json["user_id"], res.json["book_id"], res.json["quantity"]) == (2, 1, 4)
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed_users_books.json"}], indirect=True)
+def test_reserved_stock_is_not_available_to_others(client, admin_auth_header, user_auth_header):
+    """
+    Book 1 has 10 in stock: a hold of 8 leaves 2 to other holds and orders, the holder orders with the hold
+    """
+    hold = client.post("/reservations", json={"book_id": 1, "quantity": 8}, headers=user_auth_header).json
+
+    res = client.post("/reservations", json={"book_id": 1, "quantity": 3}, headers=admin_auth_header)
+    assert res.status_code == 400
+    assert res.json == {"error": "Book with id 1 quantity not enough"}
+    res = client.post("/orders", json={"items": [{"book_id": 1, "quantity": 3}]}, headers=admin_auth_header)
+    assert res.status_code == 400
+    assert res.json == {"error": "Book with id 1 quantity not enough"}
+
+    # Another user's hold can not be consumed
+    res = client.post("/orders", json={"items": [{"book_id": 1, "quantity": 8}], "reservation_ids": [hold["id"]]},
+                      headers=admin_auth_header)
+    assert res.status_code == 404
+    assert res.json == {"error": f"Reservation with id {hold['id']} not found"}
+
+    # The holder orders its hold and the 2 left
+    res = client.post("/orders", json={"items": [{"book_id": 1, "quantity": 10}], "reservation_ids": [hold["id"]]},
+                      headers=user_auth_header)
+    assert res.status_code == 201
+    assert client.get("/books/1").json["quantity"] == 0
+
+    # Consumed
+    res = client.delete(f"/reservations/{hold['id']}", headers=user_auth_header)
+    assert res.status_code == 404
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed_users_books.json"}], indirect=True)
+def test_release_reservation(client, admin_auth_header, user_auth_header):
+    """
+        Response 200 for the owner, 403 for another user
+    """
+    hold = client.post("/reservations", json={"book_id": 1, "quantity": 10}, headers=admin_auth_header).json
+
+    res = client.delete(f"/reservations/{hold['id']}", headers=user_auth_header)
+    assert res.status_code == 403
+    assert res.json == {"error": "You are not authorized to release this reservation."}
+
+    res = client.delete(f"/reservations/{hold['id']}", headers=admin_auth_header)
+    assert res.status_code == 200
+    assert res.json["id"] == hold["id"]
+    res = client.post("/reservations", json={"book_id": 1, "quantity": 10}, headers=user_auth_header)
+    assert res.status_code == 201
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed_users_books.json"}], indirect=True)
+def test_create_reservation_unsuccessful(client, user_auth_header):
+    """
+    Response 400 / 401 / 404
+        {"error": <message>}
+    """
+    res = client.post("/reservations", json={"book_id": 1, "quantity": 1})
+    assert res.status_code == 401
+
+    res = client.post("/reservations", json={}, headers=user_auth_header)
+    assert res.status_code == 400
+    assert res.json == {"error": "Missing required field: book_id; Missing required field: quantity"}
+
+    res = client.post("/reservations", json={"book_id": "1", "quantity": 1.5}, headers=user_auth_header)
+    assert res.status_code == 400
+    assert res.json == {"error": "Field 'book_id' must be of type int; Field 'quantity' must be of type int"}
+
+    res = client.post("/reservations", json={"book_id": 1, "quantity": 0, "minutes": RESERVATION_MINUTES_MAX + 1},
+                      headers=user_auth_header)
+    assert res.status_code == 400
+    assert res.json == {"error": "Field 'quantity' must be positive; "
+                                 f"Field 'minutes' must be between 1 and {RESERVATION_MINUTES_MAX}"}
+
+    res = client.post("/reservations", json={"book_id": 100, "quantity": 1}, headers=user_auth_header)
+    assert res.status_code == 404
+    assert res.json == {"error": "Book with id 100 not found"}
+
+
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE, "json_file": "test_seed_users_books.json"}], indirect=True)
+def test_book_responses_show_available_stock(client, user_auth_header):
+    """
+    Book 1 has 10 in stock: while a hold of 8 is active the book reads show 2 available
+    """
+    def stock():
+        book = client.get("/books/1").json
+        listed = next(b for b in client.get("/books").json if b["id"] == 1)
+        by_ids = client.get("/books?ids=1").json["items"][0]
+        assert book == listed == by_ids
+        return book["quantity"], book["available"]
+
+    assert stock() == (10, 10)
+    hold = client.post("/reservations", json={"book_id": 1, "quantity": 8}, headers=user_auth_header).json
+    assert stock() == (10, 2)
+    client.delete(f"/reservations/{hold['id']}", headers=user_auth_header)
+    assert stock() == (10, 10)
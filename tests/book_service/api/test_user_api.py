@@ -1,6 +1,7 @@
 ## tests/book_service/api/test_user_api.py
 import pytest
 
+from common.auth import password_hasher
 from common.config import TEST_SESSION_TYPE
 from tests.utils.validator import assert_json_structure
 
@@ -180,6 +181,19 @@ def test_register_user_successful_with_default_user_role_no_auth(client):
     assert user_info["role"] == "user"
 
 
+@pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE}], indirect=True)
+def test_register_user_unsuccessful_password_hashing_busy(client, monkeypatch):
+    """
+    Response 503
+    """
+    # No free slot: every hash is rejected
+    monkeypatch.setattr(password_hasher, "max_pending", -password_hasher.workers)
+    res = client.post("/users", json={"username": "busy", "password": "pw"})
+    assert res.status_code == 503
+    assert res.headers["Retry-After"] == "1"
+    assert res.json == {"error": "Password hashing is busy, please retry later"}
+
+
 @pytest.mark.parametrize("client", [{"type": TEST_SESSION_TYPE}], indirect=True)
 def test_register_user_unsuccessful_missing_json_body(client):
     """
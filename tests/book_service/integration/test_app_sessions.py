@@ -0,0 +1,41 @@
+## tests/book_service/integration/test_app_sessions.py
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+
+from book_service.app import create_app
+from common.config import DB_POOL_SIZE, SQLITE_PRAGMA_PROFILES
+from common.db import get_session, create_default_engine
+from tests.utils.session_factory import session_factory
+
+
+def test_default_app_uses_one_pooled_engine():
+    app = create_app()
+    engine = app.config["SESSION_FACTORY"].kw["bind"]
+    assert isinstance(engine.pool, QueuePool)
+    assert engine.pool.size() == DB_POOL_SIZE
+    assert engine.echo is False
+    with app.app_context():
+        assert get_session().get_bind() is engine
+
+
+def test_session_is_shared_within_request_and_removed_on_teardown():
+    app = create_app(session_factory=session_factory())
+    registry = app.config["SESSION_REGISTRY"]
+    with app.app_context():
+        session = get_session()
+        assert get_session() is session
+        assert registry.registry.has()
+    assert not registry.registry.has()
+
+
+def test_performance_pragma_profile_applied_on_connect(tmp_path):
+    engine = create_default_engine(str(tmp_path / "pragmas.db"), pragma_profile="performance")
+    expected = SQLITE_PRAGMA_PROFILES["performance"]
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA temp_store")).scalar() == 2  # MEMORY
+        assert conn.execute(text("PRAGMA foreign_keys")).scalar() == 1
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == expected["busy_timeout"]
+        assert conn.execute(text("PRAGMA cache_size")).scalar() == expected["cache_size"]
+    engine.dispose()
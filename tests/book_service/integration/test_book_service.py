@@ -0,0 +1,68 @@
+## tests/book_service/integration/test_book_service.py
+import pytest
+
+from book_service.models import Book
+from book_service.services.book_service import BookFilter, list_books, list_books_page
+from tests.utils.query_plan import explain_query_plan, assert_uses_index
+
+
+@pytest.fixture
+def catalog(db_session):
+    prices = [12.5, None, 7.0, 12.5, 30.0, None, 7.0, 19.9, 12.5, 1.0, None, 30.0]
+    for i, price in enumerate(prices, start=1):
+        db_session.add(Book(code=f"B{i:03d}", name=f"Book {(i * 7) % 5}", publisher=["Pub A", "Pub B"][i % 2],
+                            quantity=i % 3, sell_price=price))
+    db_session.commit()
+    return db_session
+
+
+def walk_pages(session, filters, limit):
+    books, cursor = list_books_page(session, limit, None, filters)
+    while cursor:
+        page, cursor = list_books_page(session, limit, cursor, filters)
+        books += page
+    return books
+
+
+@pytest.mark.parametrize("sort", ["id", "-id", "name", "-name", "price", "-price"])
+@pytest.mark.parametrize("limit", [1, 2, 5])
+def test_keyset_pages_match_full_sorted_list(catalog, sort, limit):
+    filters = BookFilter(sort=sort)
+    expected = [b.id for b in list_books(catalog, filters)]
+    assert len(expected) == 12
+    assert [b.id for b in walk_pages(catalog, filters, limit)] == expected
+
+
+def test_list_books_filters(catalog):
+    filters = BookFilter(publisher="Pub A", min_price=7, max_price=20, in_stock=True, sort="-price")
+    books = list_books(catalog, filters)
+    assert books
+    assert all(b.publisher == "Pub A" and 7 <= b.sell_price <= 20 and b.quantity > 0 for b in books)
+    assert [b.sell_price for b in books] == sorted((b.sell_price for b in books), reverse=True)
+
+
+def test_cursor_of_another_sort_is_rejected(catalog):
+    _, cursor = list_books_page(catalog, 2, None, BookFilter(sort="price"))
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        list_books_page(catalog, 2, cursor, BookFilter(sort="name"))
+
+
+def page_plan(session, filters, after=None):
+    query = filters.apply(session.query(Book))
+    if after is not None:
+        query = filters.after(query, *after)
+    return explain_query_plan(session, query.limit(51))
+
+
+@pytest.mark.parametrize("filters, after, index_name", [
+    (BookFilter(publisher="Pub A", sort="price"), (12.5, 4), "ix_books_publisher_sell_price"),
+    (BookFilter(publisher="Pub A", min_price=5, max_price=20, sort="-price"), None, "ix_books_publisher_sell_price"),
+    (BookFilter(min_price=5, max_price=20, sort="price"), (12.5, 4), "ix_books_sell_price"),
+    (BookFilter(in_stock=True), (None, 4), "ix_books_in_stock"),
+    (BookFilter(sort="name"), ("Book 2", 4), "ix_books_name"),
+])
+def test_filter_sort_page_query_plans(catalog, filters, after, index_name):
+    plan = page_plan(catalog, filters, after)
+    assert_uses_index(plan, index_name)
+    # The index delivers rows in page order: no sort step
+    assert not any("TEMP B-TREE" in line for line in plan), plan
@@ -0,0 +1,94 @@
+## tests/book_service/integration/test_migrations.py
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker
+
+from book_service.models import Order, OrderItem
+from common.migrations import upgrade, latest_version, get_schema_version, init_schema
+from common.models import Base
+from tests.utils.query_plan import explain_query_plan, assert_uses_index
+
+MIGRATION_1_INDEXES = ["ix_orders_user_id_created_at", "ix_orders_status",
+                       "ix_order_items_order_id", "ix_order_items_book_id"]
+MIGRATION_4_INDEXES = ["ix_orders_status_created_at", "ix_orders_created_at"]
+
+
+@pytest.fixture
+def legacy_engine():
+    """Database with the pre-migration schema: tables only, no indexes, user_version 0"""
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for name in MIGRATION_1_INDEXES + MIGRATION_4_INDEXES:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+    yield engine
+    engine.dispose()
+
+
+def index_names(engine, table):
+    return {ix["name"] for ix in inspect(engine).get_indexes(table)}
+
+
+def test_upgrade_legacy_schema_to_latest(legacy_engine):
+    assert upgrade(legacy_engine) == latest_version()
+    with legacy_engine.connect() as conn:
+        assert get_schema_version(conn) == latest_version()
+    indexes = index_names(legacy_engine, "orders") | index_names(legacy_engine, "order_items")
+    assert set(MIGRATION_1_INDEXES + MIGRATION_4_INDEXES) - {"ix_orders_status"} <= indexes
+    # Superseded by ix_orders_status_created_at in migration 4
+    assert "ix_orders_status" not in indexes
+
+
+def test_upgrade_is_idempotent_on_fresh_schema():
+    engine = create_engine("sqlite:///:memory:")
+    assert init_schema(engine) == latest_version()
+    # Already up to date: nothing left to apply
+    assert upgrade(engine) == latest_version()
+
+
+def test_query_plans_use_order_indexes(legacy_engine):
+    upgrade(legacy_engine)
+    session = sessionmaker(bind=legacy_engine)()
+
+    # list_orders(user_id=...)
+    assert_uses_index(explain_query_plan(session, session.query(Order).filter(Order.user_id == 1)),
+                      "ix_orders_user_id_created_at")
+    # A user's orders by time
+    plan = explain_query_plan(session, session.query(Order).filter(Order.user_id == 1)
+                              .order_by(Order.created_at))
+    assert_uses_index(plan, "ix_orders_user_id_created_at")
+    assert not any("TEMP B-TREE" in line for line in plan)
+    # Filter by status
+    assert_uses_index(explain_query_plan(session, session.query(Order).filter(Order.status == "new")),
+                      "ix_orders_status_created_at")
+    # Lazy load of Order.items
+    assert_uses_index(explain_query_plan(session, session.query(OrderItem).filter(OrderItem.order_id == 1)),
+                      "ix_order_items_order_id")
+    # FK check on delete_book
+    assert_uses_index(explain_query_plan(session, session.query(OrderItem).filter(OrderItem.book_id == 1)),
+                      "ix_order_items_book_id")
+    session.close()
+
+
+def test_full_text_index_built_for_existing_books(legacy_engine):
+    with legacy_engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO books (code, name, publisher) VALUES ('B001', 'Python Basics', 'Pub')")
+    upgrade(legacy_engine)
+    with legacy_engine.connect() as conn:
+        rows = conn.exec_driver_sql("SELECT rowid FROM books_fts WHERE books_fts MATCH 'python'").fetchall()
+    assert rows == [(1,)]
+
+
+def test_backfill_spreads_shared_order_timestamps(legacy_engine):
+    with legacy_engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO users (id, username, password) VALUES (1, 'u', 'x')")
+        for created_at in ["2025-03-01 08:00:00.000000", "2025-03-01 08:00:00.000000", None,
+                           "2025-03-02 09:30:00.500000", "2025-03-01 08:00:00.000000"]:
+            conn.exec_driver_sql("INSERT INTO orders (user_id, status, created_at) VALUES (1, 'new', ?)", (created_at,))
+    upgrade(legacy_engine)
+
+    with sessionmaker(bind=legacy_engine)() as session:
+        created = [o.created_at for o in session.query(Order).order_by(Order.id)]
+    assert [str(c) for c in created] == ["2025-03-01 08:00:00", "2025-03-01 08:00:00.000001",
+                                         "2025-03-01 08:00:00.000002", "2025-03-02 09:30:00.500000",
+                                         "2025-03-01 08:00:00.000003"]
@@ -0,0 +1,339 @@
+## tests/book_service/integration/test_order_service.py
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event, func
+from sqlalchemy.orm import sessionmaker
+
+from book_service.models import Book, Order, OrderItem, IdempotencyKey
+from book_service.services.book_service import search_books
+from book_service.services.order_service import place_order, place_order_idempotent, get_order, update_order_statuses, list_orders, list_orders_page, OrderFilter, export_orders
+from common.db import create_default_engine
+from common.exceptions import RecordNotFoundError
+from common.migrations import init_schema
+from common.models import User
+from tests.utils.query_plan import explain_query_plan, assert_uses_index
+
+
+@pytest.fixture
+def stocked(db_session):
+    db_session.add(User(id=1, username="buyer", password="x"))
+    db_session.add_all([Book(id=1, code="B001", name="One", quantity=5, sell_price=10.0),
+                        Book(id=2, code="B002", name="Two", quantity=2, sell_price=20.0)])
+    db_session.commit()
+    return db_session
+
+
+class StatementLog(list):
+    def listener(self, conn, cursor, statement, *args):
+        self.append(statement)
+
+
+def count_statements(session):
+    statements = StatementLog()
+    event.listen(session.get_bind(), "before_cursor_execute", statements.listener)
+    return statements
+
+
+def test_place_order_uses_constant_number_of_statements(stocked):
+    statements = count_statements(stocked)
+    order = place_order(stocked, 1, [{"book_id": 1, "quantity": 1}, {"book_id": 2, "quantity": 1},
+                                     {"book_id": 1, "quantity": 2}])
+
+    # books IN select, stock update, order insert, order items insert
+    assert len(statements) == 4
+    assert [(i.book_id, i.quantity, i.price_each) for i in order.items] == [(1, 3, 10.0), (2, 1, 20.0)]
+    assert stocked.get(Book, 1).quantity == 2
+    assert stocked.get(Book, 2).quantity == 1
+
+
+def test_place_order_short_stock_changes_nothing(stocked):
+    with pytest.raises(ValueError, match="Book with id 2 quantity not enough"):
+        place_order(stocked, 1, [{"book_id": 1, "quantity": 1}, {"book_id": 2, "quantity": 2},
+                                 {"book_id": 2, "quantity": 1}])
+
+    assert stocked.get(Book, 1).quantity == 5
+    assert stocked.get(Book, 2).quantity == 2
+    assert stocked.query(Order).count() == 0
+
+
+def test_place_order_short_stock_restocked_concurrently(stocked, monkeypatch):
+    rollback = stocked.rollback
+
+    def rollback_then_restock():
+        # Another request restocks between the failed UPDATE and the stock lookup
+        rollback()
+        stocked.query(Book).update({Book.quantity: 100})
+        stocked.commit()
+
+    monkeypatch.setattr(stocked, "rollback", rollback_then_restock)
+    with pytest.raises(ValueError, match="Book with id 2 quantity not enough"):
+        place_order(stocked, 1, [{"book_id": 2, "quantity": 3}, {"book_id": 1, "quantity": 1}])
+    assert stocked.query(Order).count() == 0
+
+
+def test_place_order_reports_first_missing_book(stocked):
+    with pytest.raises(RecordNotFoundError, match="Book with id 7 not found"):
+        place_order(stocked, 1, [{"book_id": 1, "quantity": 1}, {"book_id": 7, "quantity": 1},
+                                 {"book_id": 8, "quantity": 1}])
+    assert stocked.query(Order).count() == 0
+
+
+def test_get_order_loads_items_and_books_in_one_query(stocked):
+    order_id = place_order(stocked, 1, [{"book_id": 1, "quantity": 1}, {"book_id": 2, "quantity": 2}]).id
+    stocked.expunge_all()
+
+    statements = count_statements(stocked)
+    data = get_order(stocked, order_id, user_id=1).to_dict(with_books=True)
+    assert len(statements) == 1
+    assert [(i["book_code"], i["book_name"], i["quantity"]) for i in data["items"]] == [("B001", "One", 1),
+                                                                                        ("B002", "Two", 2)]
+
+
+def test_search_books_loads_available_stock_in_one_query(stocked):
+    stocked.add_all([Book(id=i, code=f"S{i:03d}", name=f"Searchable {i}", quantity=i, sell_price=1.0)
+                     for i in range(3, 8)])
+    stocked.commit()
+    stocked.expunge_all()
+
+    statements = count_statements(stocked)
+    books, cursor = search_books(stocked, "searchable", 50)
+    data = [book.to_dict() for book in books]
+    assert len(statements) == 1
+    assert cursor is None
+    assert sorted((b["code"], b["available"]) for b in data) == [(f"S{i:03d}", i) for i in range(3, 8)]
+
+
+def test_concurrent_orders_never_oversell(tmp_path):
+    engine = create_default_engine(str(tmp_path / "orders.db"), pragma_profile="performance")
+    init_schema(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as session:
+        session.add_all([User(id=user_id, username=f"buyer{user_id}", password="x") for user_id in range(16)])
+        session.add_all([Book(id=1, code="B001", name="One", quantity=10, sell_price=1.0),
+                         Book(id=2, code="B002", name="Two", quantity=10, sell_price=2.0)])
+        session.commit()
+
+    placed, rejected, failures = [], [], []
+    start = threading.Barrier(16)
+
+    def buyer(user_id):
+        start.wait()
+        with Session() as session:
+            try:
+                place_order(session, user_id, [{"book_id": 1, "quantity": 1}, {"book_id": 2, "quantity": 1}])
+                placed.append(user_id)
+            except ValueError as e:
+                rejected.append(str(e))
+            except Exception as e:
+                failures.append(e)
+
+    threads = [threading.Thread(target=buyer, args=(user_id,)) for user_id in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert failures == []
+    assert len(placed) == 10
+    assert len(rejected) == 6 and all("quantity not enough" in e for e in rejected)
+    with Session() as session:
+        assert [b.quantity for b in session.query(Book).order_by(Book.id)] == [0, 0]
+        assert session.query(func.sum(OrderItem.quantity)).scalar() == 20
+    engine.dispose()
+
+
+@pytest.mark.parametrize("is_admin", [True, False])
+def test_list_orders_statement_count_is_constant(stocked, is_admin):
+    def listed_statements(n_orders):
+        while stocked.query(Order).count() < n_orders:
+            place_order(stocked, 1, [{"book_id": 1, "quantity": 0}, {"book_id": 2, "quantity": 0}])
+        stocked.expire_all()
+        statements = count_statements(stocked)
+        orders = [o.to_dict() for o in list_orders(stocked, user_id=1, is_admin=is_admin)]
+        event.remove(stocked.get_bind(), "before_cursor_execute", statements.listener)
+        assert len(orders) == n_orders and all(len(o["items"]) == 2 for o in orders)
+        return len(statements)
+
+    # orders, then all their items
+    assert listed_statements(2) == 2
+    assert listed_statements(30) == 2
+
+
+def test_placed_orders_get_their_own_timestamps(stocked):
+    before = datetime.now(timezone.utc).replace(tzinfo=None)
+    first = place_order(stocked, 1, [{"book_id": 1, "quantity": 1}])
+    second = place_order(stocked, 1, [{"book_id": 1, "quantity": 1}])
+    assert before <= first.created_at < second.created_at <= datetime.now(timezone.utc).replace(tzinfo=None)
+
+    in_range = OrderFilter(created_from=first.created_at, created_to=second.created_at)
+    assert [o.id for o in list_orders(stocked, is_admin=True, filters=in_range)] == [first.id]
+
+
+def test_order_timestamp_defaults_are_naive_utc(stocked):
+    order = Order(user_id=1)
+    stocked.add(order)
+    stocked.flush()
+    # Same value before and after a round trip through the database
+    assert order.created_at.tzinfo is None
+    created_at = order.created_at
+    stocked.commit()
+    stocked.refresh(order)
+    assert order.created_at == created_at
+
+
+@pytest.fixture
+def order_history(stocked):
+    stocked.add(User(id=2, username="other", password="x"))
+    start = datetime(2026, 1, 1)
+    # 3 orders share each timestamp, so pages also break ties on id
+    for i in range(30):
+        order = Order(user_id=1 + i % 2, status=["new", "processing", "delivered"][i % 3],
+                      created_at=start + timedelta(days=i // 3))
+        order.items = [OrderItem(book_id=1 + i % 4 // 3, quantity=1, price_each=1.0)]
+        stocked.add(order)
+    stocked.commit()
+    return stocked
+
+
+def walk_order_pages(session, filters, limit, user_id=None, is_admin=True):
+    orders, cursor, total = list_orders_page(session, limit, None, user_id, is_admin, filters)
+    while cursor:
+        page, cursor, _ = list_orders_page(session, limit, cursor, user_id, is_admin, filters)
+        orders += page
+    return orders, total
+
+
+@pytest.mark.parametrize("filters", [
+    OrderFilter(),
+    OrderFilter(status="new"),
+    OrderFilter(user_id=2, book_id=2),
+    OrderFilter(created_from=datetime(2026, 1, 3), created_to=datetime(2026, 1, 6, 12)),
+])
+@pytest.mark.parametrize("limit", [1, 4, 7])
+def test_order_pages_match_filtered_list(order_history, filters, limit):
+    expected = [o.id for o in list_orders(order_history, is_admin=True, filters=filters)]
+    orders, total = walk_order_pages(order_history, filters, limit)
+    assert [o.id for o in orders] == expected
+    assert total == len(expected)
+    keys = [(o.created_at, o.id) for o in orders]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_order_pages_scoped_to_user(order_history):
+    orders, total = walk_order_pages(order_history, OrderFilter(status="new"), 2, user_id=2, is_admin=False)
+    assert total == len(orders) == 5
+    assert all(o.user_id == 2 and o.status == "new" for o in orders)
+
+
+@pytest.mark.parametrize("filters, index", [
+    (OrderFilter(), "ix_orders_created_at"),
+    (OrderFilter(status="new"), "ix_orders_status_created_at"),
+    (OrderFilter(user_id=1), "ix_orders_user_id_created_at"),
+    (OrderFilter(created_from=datetime(2026, 1, 3)), "ix_orders_created_at"),
+    (OrderFilter(book_id=2), "ix_order_items_book_id"),
+])
+def test_order_list_queries_use_indexes(order_history, filters, index):
+    plan = explain_query_plan(order_history, filters.apply(order_history.query(Order)).limit(51))
+    assert_uses_index(plan, index)
+    if filters.book_id is None:
+        assert not any("TEMP B-TREE" in line for line in plan)
+
+
+def test_expired_idempotency_key_places_a_new_order(stocked):
+    body, replayed = place_order_idempotent(stocked, 1, [{"book_id": 1, "quantity": 1}], "key")
+    assert not replayed
+    record = stocked.query(IdempotencyKey).one()
+    assert record.response_hash and record.order_id == json.loads(body)["id"]
+    record.expires_at = datetime(2000, 1, 1)
+    stocked.commit()
+
+    again, replayed = place_order_idempotent(stocked, 1, [{"book_id": 1, "quantity": 1}], "key")
+    assert not replayed
+    assert json.loads(again)["id"] != json.loads(body)["id"]
+    assert stocked.query(IdempotencyKey).count() == 1
+
+
+def test_concurrent_idempotent_orders_coalesce(tmp_path):
+    engine = create_default_engine(str(tmp_path / "orders.db"), pragma_profile="performance")
+    init_schema(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as session:
+        session.add(User(id=1, username="buyer", password="x"))
+        session.add(Book(id=1, code="B001", name="One", quantity=10, sell_price=1.0))
+        session.commit()
+
+    responses, failures = [], []
+    start = threading.Barrier(8)
+
+    def retry():
+        start.wait()
+        with Session() as session:
+            try:
+                responses.append(place_order_idempotent(session, 1, [{"book_id": 1, "quantity": 1}], "retry"))
+            except Exception as e:
+                failures.append(e)
+
+    threads = [threading.Thread(target=retry) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert failures == []
+    assert len({body for body, _ in responses}) == 1
+    assert sorted(replayed for _, replayed in responses) == [False] + [True] * 7
+    with Session() as session:
+        assert session.query(Order).count() == 1
+        assert session.get(Book, 1).quantity == 9
+    engine.dispose()
+
+
+def test_update_order_statuses_one_update_per_transition(order_history):
+    orders = order_history.query(Order).all()
+    changes = [{"id": o.id, "status": {"new": "processing", "processing": "shipping", "delivered": "new"}[o.status]}
+               for o in orders]
+    order_history.expire_all()
+
+    statements = count_statements(order_history)
+    results = update_order_statuses(order_history, changes)
+    # current statuses, one UPDATE for each of the 2 allowed transitions
+    assert len(statements) == 3
+    assert sum("error" in r for r in results) == 10
+    assert order_history.query(Order).filter(Order.status == "shipping").count() == 10
+    assert order_history.query(Order).filter(Order.status == "processing").count() == 10
+
+
+def test_bulk_cancel_restocks_with_one_update(stocked):
+    order_ids = [place_order(stocked, 1, [{"book_id": 1, "quantity": 1}, {"book_id": 2, "quantity": 1}]).id
+                 for _ in range(2)]
+    order_ids.append(place_order(stocked, 1, [{"book_id": 1, "quantity": 2}]).id)
+    assert (stocked.get(Book, 1).quantity, stocked.get(Book, 2).quantity) == (1, 0)
+    stocked.expire_all()
+
+    statements = count_statements(stocked)
+    results = update_order_statuses(stocked, [{"id": oid, "status": "canceled"} for oid in order_ids])
+    # current statuses, the status UPDATE, the restock UPDATE ... FROM
+    assert len(statements) == 3
+    assert "FROM (SELECT" in statements[-1]
+    assert all("error" not in r for r in results)
+    assert (stocked.get(Book, 1).quantity, stocked.get(Book, 2).quantity) == (5, 2)
+
+
+def test_export_orders_groups_items_across_batches(order_history):
+    for order in order_history.query(Order).filter(Order.id <= 3):
+        order.items.append(OrderItem(book_id=2, quantity=2, price_each=2.0))
+    order_history.commit()
+
+    chunks = list(export_orders(order_history, batch_size=4))
+    assert len(chunks) > 5
+    orders = [json.loads(line) for chunk in chunks for line in chunk.decode().splitlines()]
+    expected = sorted(order_history.query(Order), key=lambda o: (o.created_at, o.id))
+    assert [o["id"] for o in orders] == [o.id for o in expected]
+    assert [len(o["items"]) for o in orders[:4]] == [2, 2, 2, 1]
+
+    lines = b"".join(export_orders(order_history, OrderFilter(status="new"), "csv", 4)).decode().splitlines()
+    assert lines[0].startswith("order_id,user_id,status,created_at,item_id")
+    assert len(lines) == 1 + 10 + 1
@@ -0,0 +1,120 @@
+## tests/book_service/integration/test_reservation_service.py
+import threading
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from book_service.models import Book, Reservation
+from book_service.services.book_service import delete_book
+from book_service.services.reservation_service import create_reservation, held_quantity, \
+    sweep_expired_reservations, utc_now
+from common.db import create_default_engine
+from common.migrations import init_schema
+from common.models import User
+from tests.utils.query_plan import explain_query_plan, assert_uses_index
+
+
+@pytest.fixture
+def stocked(db_session):
+    db_session.add(User(id=1, username="buyer", password="x"))
+    db_session.add(Book(id=1, code="B001", name="One", quantity=5, sell_price=10.0))
+    db_session.commit()
+    return db_session
+
+
+def available_stock(session, book_ids):
+    return {b.id: b.available for b in session.query(Book).filter(Book.id.in_(book_ids)).populate_existing()}
+
+
+def add_hold(session, quantity, expires_in):
+    session.add(Reservation(user_id=1, book_id=1, quantity=quantity, expires_at=utc_now() + expires_in))
+    session.commit()
+
+
+def test_available_stock_counts_only_active_holds(stocked):
+    add_hold(stocked, 2, timedelta(minutes=5))
+    add_hold(stocked, 3, timedelta(minutes=-5))
+    assert available_stock(stocked, [1, 2]) == {1: 3}
+
+    with pytest.raises(ValueError, match="Book with id 1 quantity not enough"):
+        create_reservation(stocked, 1, {"book_id": 1, "quantity": 4})
+    create_reservation(stocked, 1, {"book_id": 1, "quantity": 3})
+    assert available_stock(stocked, [1]) == {1: 0}
+
+
+def test_sweep_deletes_expired_holds_oldest_first(stocked):
+    for minutes in (-30, -10, -20, 10):
+        add_hold(stocked, 1, timedelta(minutes=minutes))
+
+    assert sweep_expired_reservations(stocked, batch=2) == 2
+    remaining = sorted(r.expires_at - utc_now() > timedelta(0) for r in stocked.query(Reservation))
+    assert remaining == [False, True]
+    assert sweep_expired_reservations(stocked) == 1
+    assert sweep_expired_reservations(stocked) == 0
+    assert stocked.query(Reservation).count() == 1
+
+
+def test_reservation_queries_use_expiry_indexes(stocked):
+    now = utc_now()
+    held = select(held_quantity(Book.id, now)).where(Book.id == 1)
+    assert_uses_index(explain_query_plan(stocked, held), "ix_reservations_book_id_expires_at")
+
+    expired = select(Reservation.id).where(Reservation.expires_at <= now).order_by(Reservation.expires_at).limit(10)
+    plan = explain_query_plan(stocked, delete(Reservation).where(Reservation.id.in_(expired)))
+    assert_uses_index(plan, "ix_reservations_expires_at")
+    assert not any("SCAN reservations" == line for line in plan)
+
+
+def test_concurrent_holds_never_exceed_stock(tmp_path):
+    engine = create_default_engine(str(tmp_path / "holds.db"), pragma_profile="performance")
+    init_schema(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as session:
+        session.add(User(id=1, username="buyer", password="x"))
+        session.add(Book(id=1, code="B001", name="One", quantity=10, sell_price=1.0))
+        session.commit()
+
+    held, rejected, failures = [], [], []
+    start = threading.Barrier(12)
+
+    def hold():
+        start.wait()
+        with Session() as session:
+            try:
+                held.append(create_reservation(session, 1, {"book_id": 1, "quantity": 2}).id)
+            except ValueError:
+                rejected.append(1)
+            except Exception as e:
+                failures.append(e)
+
+    threads = [threading.Thread(target=hold) for _ in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert failures == []
+    assert len(held) == 5 and len(rejected) == 7
+    with Session() as session:
+        assert available_stock(session, [1]) == {1: 0}
+    engine.dispose()
+
+
+def test_delete_book_with_only_expired_holds(stocked):
+    add_hold(stocked, 2, timedelta(minutes=-5))
+    delete_book(stocked, 1)
+    assert stocked.get(Book, 1) is None
+    assert stocked.query(Reservation).count() == 0
+
+
+def test_delete_book_with_active_hold_fails(stocked):
+    add_hold(stocked, 2, timedelta(minutes=5))
+    add_hold(stocked, 1, timedelta(minutes=-5))
+    with pytest.raises(IntegrityError):
+        delete_book(stocked, 1)
+    stocked.rollback()
+    assert stocked.get(Book, 1) is not None
+    assert stocked.query(Reservation).count() == 2
@@ -0,0 +1,59 @@
+## tests/book_service/unit/test_book_cache.py
+import time
+
+from book_service.services.book_service import BookCache
+
+
+def loader_of(books, calls):
+    def load(missed):
+        calls.append(list(missed))
+        return {book_id: books[book_id] for book_id in missed if book_id in books}
+    return load
+
+
+def test_book_cache_loads_only_missed_ids():
+    cache = BookCache(ttl=60)
+    calls = []
+    load = loader_of({1: b"1", 2: b"2", 3: b"3"}, calls)
+    assert cache.get_many([1, 2], load) == {1: b"1", 2: b"2"}
+    assert cache.get_many([2, 3, 9], load) == {2: b"2", 3: b"3"}
+    assert calls == [[1, 2], [3, 9]]
+    assert cache.stats() == {"entries": 3, "hits": 1, "misses": 4, "hit_rate": 0.2}
+
+
+def test_book_cache_invalidate_ids_or_all():
+    cache = BookCache(ttl=60)
+    cache.get_many([1, 2], loader_of({1: b"1", 2: b"2"}, []))
+    cache.invalidate([1])
+    assert cache.get_many([1, 2], loader_of({1: b"new"}, [])) == {1: b"new", 2: b"2"}
+    cache.invalidate()
+    assert cache.stats()["entries"] == 0
+
+
+def test_book_cache_ttl_expiry():
+    cache = BookCache(ttl=0.01)
+    cache.get_many([1], loader_of({1: b"1"}, []))
+    time.sleep(0.02)
+    assert cache.get_many([1], loader_of({1: b"2"}, [])) == {1: b"2"}
+
+
+def test_book_cache_bounded_lru():
+    cache = BookCache(ttl=60, max_entries=2)
+    books = {1: b"1", 2: b"2", 3: b"3"}
+    cache.get_many([1, 2], loader_of(books, []))
+    cache.get_many([1], loader_of(books, []))  # 2 is now least recently used
+    cache.get_many([3], loader_of(books, []))
+    calls = []
+    cache.get_many([1, 2, 3], loader_of(books, calls))
+    assert calls == [[2]]
+
+
+def test_book_cache_skips_books_loaded_during_invalidation():
+    cache = BookCache(ttl=60)
+
+    def stale_loader(missed):
+        cache.invalidate([1])  # a write commits while the read is in flight
+        return {1: b"stale"}
+
+    assert cache.get_many([1], stale_loader) == {1: b"stale"}
+    assert cache.get_many([1], loader_of({1: b"fresh"}, [])) == {1: b"fresh"}
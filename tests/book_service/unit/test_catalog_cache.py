@@ -0,0 +1,66 @@
+## tests/book_service/unit/test_catalog_cache.py
+import time
+
+from book_service.services.book_service import CatalogCache
+
+
+def test_catalog_cache_hit_and_miss():
+    cache = CatalogCache(ttl=60)
+    calls = []
+    loader = lambda: calls.append(1) or b"[]"
+    assert cache.get(("all",), loader) == b"[]"
+    assert cache.get(("all",), loader) == b"[]"
+    assert len(calls) == 1
+    assert cache.stats() == {"version": 0, "entries": 1, "hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_catalog_cache_invalidate_bumps_version_and_drops_entries():
+    cache = CatalogCache(ttl=60)
+    cache.get(("all",), lambda: b"[1]")
+    cache.get(("page", 10, None), lambda: (b"{}", None))
+    cache.invalidate()
+    assert cache.stats()["version"] == 1
+    assert cache.stats()["entries"] == 0
+    assert cache.get(("all",), lambda: b"[2]") == b"[2]"
+
+
+def test_catalog_cache_ttl_expiry():
+    cache = CatalogCache(ttl=0.01)
+    cache.get(("all",), lambda: b"[1]")
+    etag = cache.etag()
+    time.sleep(0.02)
+    assert cache.get(("all",), lambda: b"[2]") == b"[2]"
+    assert cache.misses == 2
+    # Expired version is never reused as a tag
+    assert cache.etag() != etag
+
+
+def test_catalog_cache_etag_changes_on_invalidate():
+    cache = CatalogCache(ttl=60)
+    etag = cache.etag()
+    assert cache.etag() == etag
+    cache.invalidate()
+    assert cache.etag() != etag
+    # Different caches (workers) never share tags
+    assert CatalogCache(ttl=60).etag() != CatalogCache(ttl=60).etag()
+
+
+def test_catalog_cache_bounded_lru():
+    cache = CatalogCache(ttl=60, max_entries=2)
+    cache.get("a", lambda: 1)
+    cache.get("b", lambda: 2)
+    cache.get("a", lambda: 1)  # "b" is now least recently used
+    cache.get("c", lambda: 3)
+    assert cache.get("b", lambda: 20) == 20
+    assert cache.get("a", lambda: 10) == 10  # evicted by "b"
+
+
+def test_catalog_cache_skips_value_loaded_during_invalidation():
+    cache = CatalogCache(ttl=60)
+
+    def stale_loader():
+        cache.invalidate()  # a write commits while the read is in flight
+        return b"stale"
+
+    assert cache.get(("all",), stale_loader) == b"stale"
+    assert cache.get(("all",), lambda: b"fresh") == b"fresh"
@@ -0,0 +1,10 @@
+class FakeClock:
+    """
+    Clock for the stores and caches taking a clock function, advanced by setting now (seconds)
+    """
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
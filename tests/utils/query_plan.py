@@ -0,0 +1,17 @@
+from sqlalchemy import text
+
+
+def explain_query_plan(session, statement):
+    """
+    Return the EXPLAIN QUERY PLAN detail lines of an ORM query, Core statement or SQL string
+    """
+    if hasattr(statement, "statement"):  # ORM Query
+        statement = statement.statement
+    if not isinstance(statement, str):
+        statement = str(statement.compile(session.get_bind(), compile_kwargs={"literal_binds": True}))
+    rows = session.execute(text(f"EXPLAIN QUERY PLAN {statement}")).fetchall()
+    return [row[-1] for row in rows]
+
+
+def assert_uses_index(plan, index_name):
+    assert any(f"INDEX {index_name}" in line for line in plan), f"{index_name} not used: {plan}"
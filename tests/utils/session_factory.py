@@ -1,8 +1,9 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from common.config import DB_PATH, DB_NAME
-from common.models import Base
+from common.db import apply_sqlite_pragmas
+from common.migrations import init_schema
 from test_utils.data_loader import clean_data, initialize_data_from_json
 
 
@@ -14,16 +15,14 @@ def session_factory(session_type="in_memory", json_file=None):
     """
     if session_type == "in_memory":
         engine = create_engine("sqlite:///:memory:", echo=False)
-        with engine.connect() as conn:
-            conn.execute(text("PRAGMA foreign_keys=ON"))
-        Base.metadata.create_all(engine)
+        apply_sqlite_pragmas(engine)
+        init_schema(engine)
         print(f"Database schema created in :memory")
 
     elif session_type == "real":
         engine = create_engine(f"sqlite:///{DB_PATH}")
-        with engine.connect() as conn:
-            conn.execute(text("PRAGMA foreign_keys=ON"))
-        Base.metadata.create_all(engine)
+        apply_sqlite_pragmas(engine)
+        init_schema(engine)
         print(f"Database schema created in {DB_NAME}")
 
     else: